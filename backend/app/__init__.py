@@ -1,5 +1,6 @@
+import hmac
 import os
-from flask import Flask, jsonify
+from flask import Flask, abort, jsonify, request
 from flask_cors import CORS
 from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager, create_access_token
@@ -13,6 +14,8 @@ from app.api.chat import chat_bp
 from app.api.conversations import conversations_bp
 from app.api.prompt_templates import prompt_templates_bp
 from app.utils.rate_limit import rate_limiter
+from app.utils.metrics import metrics
+from app.utils import db_pool  # noqa: F401  (pool check-out metrics)
 from app.api.v1 import register_routes
 from app.config import DevelopmentConfig, TestingConfig, ProductionConfig
 
@@ -48,9 +51,9 @@ def create_app(test_config=None):
          resources={r"/*": {"origins": "http://localhost:3000"}},
          supports_credentials=True,
          allow_headers=["Content-Type", "Authorization",
-                        "X-Requested-With", "Accept", "Origin"],
+                        "X-Requested-With", "Accept", "Origin", "Idempotency-Key"],
          methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-         expose_headers=["Content-Type", "Authorization"]
+         expose_headers=["Content-Type", "Authorization", "Idempotent-Replayed"]
          )
     Migrate(app, db)
     JWTManager(app)
@@ -78,7 +81,7 @@ def create_app(test_config=None):
         response.headers.add('Access-Control-Allow-Origin',
                              'http://localhost:3000')
         response.headers.add('Access-Control-Allow-Headers',
-                             'Content-Type,Authorization,X-Requested-With,Accept,Origin')
+                             'Content-Type,Authorization,X-Requested-With,Accept,Origin,Idempotency-Key')
         response.headers.add('Access-Control-Allow-Methods',
                              'GET,POST,PUT,DELETE,OPTIONS')
         response.headers.add('Access-Control-Allow-Credentials', 'true')
@@ -89,6 +92,18 @@ def create_app(test_config=None):
     def health():
         return {'status': 'ok'}
 
+    # Expose in-process metrics of the worker serving the request, to
+    # scrapers holding METRICS_TOKEN (not found while it is unset)
+    @app.route('/metrics')
+    def metrics_snapshot():
+        token = app.config.get('METRICS_TOKEN')
+        if not token:
+            abort(404)
+        sent = request.headers.get('Authorization', '').encode('utf-8')
+        if not hmac.compare_digest(sent, f'Bearer {token}'.encode('utf-8')):
+            return jsonify({'error': 'Unauthorized'}), 401
+        return jsonify(metrics.snapshot())
+
     # Create an endpoint to get a test token
     @app.route('/test-token')
     def test_token():
@@ -3,15 +3,16 @@ from flask.views import MethodView
 from marshmallow import ValidationError
 
 from app.models.api_key import APIKey
-from app.models.user import User
 from app.schemas.api_key import (
     APIKeyCreateSchema,
     APIKeyResponseSchema,
     APIKeyListSchema,
     APIKeyDeleteSchema
 )
+from app.services.user_identity import user_identity
 from app.utils.security import token_required
 from app.utils.rate_limit import rate_limit
+from app.utils.idempotency import idempotent
 
 api_keys_bp = Blueprint('api_keys', __name__, url_prefix='/api/keys')
 
@@ -35,6 +36,7 @@ class APIKeyResource(MethodView):
 
     @token_required
     @rate_limit(limit=20, period=60, key_prefix='api_keys_create')
+    @idempotent
     def post(self, user_id):
         """Create a new API key for the authenticated user"""
         # Validate request data
@@ -44,9 +46,8 @@ class APIKeyResource(MethodView):
         except ValidationError as err:
             return jsonify({'error': 'Validation error', 'details': err.messages}), 400
 
-        # Check if user exists
-        user = User.query.get(user_id)
-        if not user:
+        # Check if user exists and is active
+        if not user_identity.active(user_id):
             return jsonify({'error': 'User not found'}), 404
 
         # Check if provider already exists for this user
@@ -82,6 +83,7 @@ class APIKeyResource(MethodView):
 
     @token_required
     @rate_limit(limit=20, period=60, key_prefix='api_keys_delete')
+    @idempotent
     def delete(self, user_id):
         """Delete an API key for the authenticated user"""
         # Validate request data
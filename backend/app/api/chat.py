@@ -1,21 +1,41 @@
-from flask import Blueprint, request, jsonify, current_app
+import asyncio
+import json
+import math
+import time
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 from flask.views import MethodView
 from marshmallow import Schema, fields, validate, ValidationError
 from flask_jwt_extended import get_jwt_identity
 from flask_cors import cross_origin
 
 from app.models.api_key import APIKey
-from app.models.user import User
 from app.utils.security import token_required
 from app.utils.rate_limit import rate_limit
-from app.services.llm_service import get_llm_response, LLM_SERVICES
+from app.utils.idempotency import idempotent
+from app.services.api_key_usage import api_key_usage
+from app.services.user_identity import user_identity
+from app.services.chat_queue import FAILED, DONE, chat_queue
+from app.services.llm_service import get_llm_response, stream_llm_response, chunk_text
+from app.services.llm.breaker import circuit_breaker
+from app.services.llm.cache import response_cache
+from app.services.llm.context import context_builder
+from app.services.llm.deadline import request_deadline
+from app.services.llm.errors import LLMProviderError, ProviderUnavailableError
+from app.services.llm.semantic_cache import semantic_cache
+from app.services.llm.summary import conversation_summarizer
+from app.services.llm.engine import async_engine
+from app.services.llm.hedging import hedged_response, rank_by_latency
+from app.services.llm.providers import LLM_PROVIDERS
+from app.services.llm.scheduler import BACKGROUND
 from app.models.conversation import Conversation
 from app.models.message import Message
 from app.utils.logger import logger
+from app.utils.metrics import metrics
 from app.utils.limiter import limiter
 from app.utils.jwt_required import jwt_required
 from app.utils.prompt_template import PromptTemplate
 from app.utils.database import db
+from app.models.database import release_connection
 from datetime import datetime
 
 chat_bp = Blueprint('chat', __name__, url_prefix='/api/chat')
@@ -29,6 +49,27 @@ class ChatMessageSchema(Schema):
     conversation_id = fields.Int(required=False, allow_none=True)
     template_id = fields.Int(required=False, allow_none=True)
     regenerate = fields.Bool(required=False, default=False)
+    hedge = fields.Bool(required=False, allow_none=True)
+    # Queue the request and answer with a job id (see /api/chat/jobs)
+    async_job = fields.Bool(data_key='async', required=False, allow_none=True)
+
+
+class ChatBatchItemSchema(Schema):
+    """One prompt of a batch chat request"""
+    message = fields.Str(required=True)
+    provider = fields.Str(required=True)
+    model = fields.Str(required=True)
+    template_id = fields.Int(required=False, allow_none=True)
+
+
+class ChatBatchSchema(Schema):
+    """Schema for batch chat requests"""
+    items = fields.List(fields.Nested(ChatBatchItemSchema), required=True,
+                        validate=validate.Length(min=1))
+    conversation_id = fields.Int(required=False, allow_none=True)
+    # Lower the provider calls in flight (capped at CHAT_BATCH_CONCURRENCY)
+    concurrency = fields.Int(required=False, allow_none=True,
+                             validate=validate.Range(min=1))
 
 
 class ChatResource(MethodView):
@@ -36,6 +77,7 @@ class ChatResource(MethodView):
 
     @token_required
     @rate_limit(limit=50, period=60, key_prefix='chat_message')
+    @idempotent
     def post(self, user_id):
         """Process a chat message and get a response"""
         # Validate request data
@@ -53,9 +95,8 @@ class ChatResource(MethodView):
         template_id = data.get('template_id')
         regenerate = data.get('regenerate', False)
 
-        # Check if user exists
-        user = User.query.get(user_id)
-        if not user:
+        # Check if user exists and is active
+        if not user_identity.active(user_id):
             return jsonify({'error': 'User not found'}), 404
 
         # Get the API key for the provider
@@ -80,12 +121,12 @@ class ChatResource(MethodView):
                 provider=provider,
                 model=model,
                 api_key=key,
-                message=message
+                message=message,
+                api_key_id=api_key.id
             )
 
-            # Update last_used timestamp for the API key
-            api_key.last_used = 'NOW()'
-            api_key.save()
+            # Count the use (written to api_keys by the usage flusher)
+            api_key_usage.record(api_key.id)
 
             return jsonify({
                 'response': response,
@@ -101,10 +142,589 @@ class ChatResource(MethodView):
             }), 500
 
 
+def _prepare_chat(data, user_id):
+    """
+    Resolve the provider, API key, template and conversation for a chat
+    request and persist the user message.
+
+    Returns:
+        (chat, None) on success, where chat is a dict describing the request,
+        or (None, error_response) if the request cannot be processed
+    """
+    user_message = data['message']
+    provider = data['provider']
+    conversation_id = data.get('conversation_id')
+    template_id = data.get('template_id')
+
+    # Validate provider and model
+    if provider not in LLM_PROVIDERS:
+        return None, (jsonify({"error": f"Provider '{provider}' not supported"}), 400)
+
+    # Get the API key
+    api_key = APIKey.query.filter_by(
+        user_id=user_id, provider=provider, is_active=True).first()
+    if not api_key:
+        if current_app.config.get('LLM_SIMULATION_MODE'):
+            # In simulation mode, proceed without API key
+            logger.warning(
+                f"Simulation mode: Proceeding without API key for {provider}")
+        else:
+            return None, (jsonify({"error": f"No active API key found for provider '{provider}'"}), 403)
+
+    if data.get('fail_fast') and api_key:
+        # Before anything is saved: CircuitOpenError if a breaker is open
+        circuit_breaker.check(provider, api_key.id)
+
+    # Get the prompt template if specified
+    template = None
+    if template_id:
+        template_obj = PromptTemplate.query.get(template_id)
+        if not template_obj:
+            return None, (jsonify({"error": "Template not found"}), 404)
+
+        # Check if user has access to this template
+        if not template_obj.is_system and template_obj.user_id != user_id:
+            return None, (jsonify({"error": "Access denied to this template"}), 403)
+
+        template = template_obj.template
+
+    # Handle conversation context
+    current_conversation = None
+    if conversation_id:
+        current_conversation = Conversation.query.filter_by(
+            id=conversation_id, user_id=user_id).first()
+        if not current_conversation:
+            return None, (jsonify({"error": "Conversation not found"}), 404)
+    else:
+        # Create a new conversation (flushed for its id, committed below)
+        current_conversation = Conversation(
+            user_id=user_id,
+            title=user_message[:50] +
+            ("..." if len(user_message) > 50 else "")
+        )
+        db.session.add(current_conversation)
+        db.session.flush()
+
+    # Create user message; one commit with the new conversation, before the
+    # upstream call so no transaction stays open while waiting on it
+    user_msg = Message(
+        conversation_id=current_conversation.id,
+        content=user_message,
+        sender="user"
+    )
+    db.session.add(user_msg)
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    if data.get('async_job'):
+        # Queue workers resolve the rest (see run_chat_job)
+        return {
+            'user_id': user_id,
+            'api_key': api_key,
+            'template': template,
+            'conversation': current_conversation,
+            'user_message': user_msg
+        }, None
+
+    return _chat_context(data, user_id, api_key, template,
+                         current_conversation, user_msg), None
+
+
+def _chat_context(data, user_id, api_key, template, conversation, user_msg):
+    """Build the chat dict: LLM service, formatted prompt and fallbacks"""
+    user_message = data['message']
+    provider = data['provider']
+    model = data['model']
+
+    # Get the LLM service
+    key = api_key.get_api_key() if api_key else None
+    llm_service = LLM_PROVIDERS[provider](
+        api_key=key, cache=response_cache if response_cache.enabled else None,
+        api_key_id=api_key.id if api_key else None)
+
+    # Format prompt with template if provided
+    formatted_message = user_message
+    if template:
+        # Rolling summary plus the newest history that fits the model's budget
+        context = context_builder.build(
+            conversation, provider, model,
+            template + user_message, exclude_id=user_msg.id)
+        context.update({
+            'user_id': user_id,
+            'conversation_id': conversation.id
+        })
+
+        formatted_message = llm_service.format_prompt(
+            user_message,
+            template=template,
+            context=context
+        )
+
+    # Other providers the user has keys for, to hedge/fail over to
+    fallbacks = []
+    hedge = data.get('hedge')
+    if hedge is None:
+        hedge = current_app.config.get('LLM_HEDGING_ENABLED', False)
+    if hedge and api_key:
+        fallbacks = _hedging_fallbacks(user_id, provider)
+
+    return {
+        'user_id': user_id,
+        'message': user_message,
+        'provider': provider,
+        'model': model,
+        'regenerate': data.get('regenerate', False),
+        'api_key': api_key,
+        'key': key,
+        'conversation': conversation,
+        'user_message': user_msg,
+        'llm_service': llm_service,
+        'template': template,
+        'template_id': data.get('template_id'),
+        'formatted_message': formatted_message,
+        'fallbacks': fallbacks,
+        'served_provider': provider,
+        'served_model': model,
+        'served_api_key': api_key
+    }
+
+
+def _hedging_fallbacks(user_id, provider):
+    """
+    Services for the user's other active API keys, fastest provider first.
+
+    Fallbacks use each provider's default model; providers without one
+    (generic) are skipped.
+    """
+    api_keys = {
+        api_key.provider: api_key for api_key in APIKey.query.filter(
+            APIKey.user_id == user_id,
+            APIKey.is_active == True,  # noqa: E712
+            APIKey.provider != provider
+        ).all()
+        if api_key.provider in LLM_PROVIDERS
+        and LLM_PROVIDERS[api_key.provider].default_model
+    }
+
+    fallbacks = []
+    limit = current_app.config.get('LLM_HEDGING_MAX_FALLBACKS', 2)
+    for name in rank_by_latency(api_keys)[:limit]:
+        service = LLM_PROVIDERS[name](
+            api_key=api_keys[name].get_api_key(),
+            cache=response_cache if response_cache.enabled else None,
+            api_key_id=api_keys[name].id)
+        fallbacks.append({
+            'api_key': api_keys[name],
+            'llm_service': service,
+            'model': service.default_model
+        })
+    return fallbacks
+
+
+def _llm_response(chat):
+    """
+    Await the provider call on the shared async engine, within the
+    LLM_REQUEST_DEADLINE (retries never wait past it).
+
+    With hedging fallbacks, the prompt is also sent to the next provider
+    when the primary is slow or fails; the provider that answered is
+    recorded in chat for the bot message metadata and key usage.
+
+    The session's DB connection goes back to the pool for the wait; saving
+    the reply checks one out again.
+    """
+    release_connection()
+    options = {
+        'template': chat['template'],
+        'template_id': chat['template_id'],
+        'regenerate': chat['regenerate']
+    }
+    with request_deadline(current_app.config.get('LLM_REQUEST_DEADLINE')):
+        if not chat['fallbacks']:
+            return async_engine.run(chat['llm_service'].get_response(
+                chat['formatted_message'], model=chat['model'], options=options))
+
+        candidates = [(chat['llm_service'], chat['model'])] + [
+            (fallback['llm_service'], fallback['model']) for fallback in chat['fallbacks']]
+        response_text, index = async_engine.run(hedged_response(
+            candidates, chat['formatted_message'], options))
+
+    if index > 0:
+        fallback = chat['fallbacks'][index - 1]
+        chat['served_api_key'] = fallback['api_key']
+        chat['served_provider'] = fallback['llm_service'].provider
+        chat['served_model'] = fallback['model']
+    return response_text
+
+
+def _simulated_response(chat):
+    """Mock response used when LLM_SIMULATION_MODE is enabled"""
+    logger.info(
+        f"Simulation mode: Generating mock response for: {chat['message']}")
+    return f"This is a simulated response for '{chat['message']}'. Provider: {chat['provider']}, Model: {chat['model']}"
+
+
+def _use_semantic_cache(chat):
+    """Only plain, first-try chats are served from or added to the semantic cache"""
+    return (semantic_cache.enabled and not chat['template']
+            and not chat['regenerate']
+            and not current_app.config.get('LLM_SIMULATION_MODE'))
+
+
+def _semantic_cache_lookup(chat):
+    """
+    Look up a previous answer to a near-duplicate prompt.
+
+    Returns:
+        The cached answer text, or None on a miss. On a hit, the match is
+        recorded in chat['semantic_cache'] for the bot message metadata.
+    """
+    if not _use_semantic_cache(chat):
+        return None
+
+    match = semantic_cache.lookup(
+        chat['provider'], chat['model'], chat['message'], chat['user_id'])
+    if match is None:
+        return None
+
+    # Only ever serve an answer from the user's own conversations
+    message_id, score = match
+    source = Message.query.join(Conversation).filter(
+        Message.id == message_id, Conversation.user_id == chat['user_id']).first()
+    if source is None:
+        return None
+
+    chat['semantic_cache'] = {
+        'score': round(score, 4),
+        'source_message_id': message_id
+    }
+    return source.content
+
+
+def _save_bot_message(chat, response_text):
+    """Persist the bot reply and update API key usage"""
+    metadata = {
+        "provider": chat['provider'],
+        "model": chat['model'],
+        "regenerated": chat['regenerate'],
+        "template_id": chat['template_id'],
+        "served_provider": chat['served_provider'],
+        "served_model": chat['served_model']
+    }
+    if chat.get('semantic_cache'):
+        metadata['semantic_cache'] = chat['semantic_cache']
+
+    bot_msg = Message(
+        conversation_id=chat['conversation'].id,
+        content=response_text,
+        sender="bot",
+        metadata=metadata
+    )
+    db.session.add(bot_msg)
+
+    # Second and last commit of the chat
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    # Usage is counted apart from the row (no read-modify-write of api_keys),
+    # against the key that answered
+    if chat['served_api_key']:
+        api_key_usage.record(chat['served_api_key'].id)
+
+    if _use_semantic_cache(chat) and not chat.get('semantic_cache'):
+        # Under the provider that answered (a hedging fallback may have)
+        semantic_cache.add(chat['served_provider'], chat['served_model'],
+                           chat['message'], bot_msg.id, chat['user_id'])
+
+    # Only templated prompts carry history, so only they need a summary
+    # (written with the chat's own provider and key, whoever answered)
+    api_key = chat['api_key']
+    if chat['template']:
+        conversation_summarizer.maybe_schedule(
+            chat['conversation'], chat['provider'], chat['model'], chat['key'],
+            api_key.id if api_key else None)
+    return bot_msg
+
+
+def _record_failure(chat, error, kind=None):
+    """
+    Mark the user message of a chat that got no reply.
+
+    The conversation and user message were committed before the upstream
+    call and stay; the failure is recorded in the message metadata
+    (status 'failed' and the kind of error) so clients can offer a retry.
+    """
+    if kind is None:
+        kind = 'provider_unavailable' if isinstance(error, ProviderUnavailableError) \
+            else 'llm_error'
+    metrics.incr('chat_unanswered_total', error=kind)
+    db.session.rollback()
+    user_msg = chat['user_message']
+    metadata = user_msg.get_metadata()
+    metadata.update({'status': 'failed', 'error': kind})
+    user_msg.set_metadata(metadata)
+    try:
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Could not record chat failure: {str(e)}")
+
+
+def _respond(chat):
+    """Get the reply (semantic cache, simulation or LLM) and save it"""
+    response_text = _semantic_cache_lookup(chat)
+    if response_text is not None:
+        logger.info("Serving chat response from the semantic cache")
+    elif current_app.config.get('LLM_SIMULATION_MODE'):
+        # In simulation mode, generate a mock response
+        response_text = _simulated_response(chat)
+    else:
+        try:
+            response_text = _llm_response(chat)
+        except Exception as e:
+            _record_failure(chat, e)
+            raise
+
+    bot_msg = _save_bot_message(chat, response_text)
+    return response_text, bot_msg
+
+
+def _enqueue_chat(data, chat):
+    """Queue a prepared chat and answer 202 with the job"""
+    payload = {
+        'message': data['message'],
+        'provider': data['provider'],
+        'model': data['model'],
+        'template_id': data.get('template_id'),
+        'regenerate': data.get('regenerate', False),
+        'hedge': data.get('hedge'),
+        'conversation_id': chat['conversation'].id,
+        'user_message_id': chat['user_message'].id,
+        'api_key_id': chat['api_key'].id if chat['api_key'] else None
+    }
+    job = chat_queue.enqueue(chat['user_id'], payload)
+    return jsonify({
+        "job_id": job['id'],
+        "status": job['status'],
+        "conversation_id": chat['conversation'].id
+    }), 202, {'Location': f"/api/chat/jobs/{job['id']}"}
+
+
+def run_chat_job(user_id, payload):
+    """
+    Answer a queued chat request (called by the chat queue workers).
+
+    Returns:
+        Job result fields: response, conversation_id, message_id
+    """
+    conversation = Conversation.query.get(payload['conversation_id'])
+    user_msg = Message.query.get(payload['user_message_id'])
+    if conversation is None or user_msg is None:
+        # Deleted after it was queued: nothing left to answer or to mark
+        raise LookupError('Conversation or message no longer exists')
+
+    # The template or API key may also be gone by now
+    api_key = APIKey.query.get(payload['api_key_id']) if payload['api_key_id'] else None
+    if payload['api_key_id'] and api_key is None:
+        error = LookupError('API key no longer exists')
+        _record_failure({'user_message': user_msg}, error, kind='api_key_not_found')
+        raise error
+    template = None
+    if payload['template_id']:
+        template_obj = PromptTemplate.query.get(payload['template_id'])
+        if template_obj is None:
+            error = LookupError('Template not found')
+            _record_failure({'user_message': user_msg}, error, kind='template_not_found')
+            raise error
+        template = template_obj.template
+
+    chat = _chat_context(payload, user_id, api_key, template, conversation, user_msg)
+    response_text, bot_msg = _respond(chat)
+    return {
+        'response': response_text,
+        'conversation_id': conversation.id,
+        'message_id': bot_msg.id
+    }
+
+
+def _prepare_batch(items, user_id, conversation):
+    """
+    Resolve providers, API keys and templates for a batch with one query
+    each, decrypting every provider's key once.
+
+    Returns:
+        One entry per item: a dict with the LLM service and formatted prompt,
+        or a result dict with an error for items that cannot be run
+    """
+    simulation = current_app.config.get('LLM_SIMULATION_MODE')
+    api_keys = {
+        api_key.provider: api_key for api_key in APIKey.query.filter_by(
+            user_id=user_id, is_active=True).all()
+    }
+    template_ids = {item['template_id'] for item in items if item.get('template_id')}
+    templates = {
+        template.id: template for template in PromptTemplate.query.filter(
+            PromptTemplate.id.in_(template_ids)).all()
+    } if template_ids else {}
+
+    services = {}
+    prepared = []
+    for index, item in enumerate(items):
+        provider = item['provider']
+        if provider not in LLM_PROVIDERS:
+            prepared.append({'index': index, 'error': f"Provider '{provider}' not supported"})
+            continue
+        api_key = api_keys.get(provider)
+        if not api_key and not simulation:
+            prepared.append({'index': index,
+                             'error': f"No active API key found for provider '{provider}'"})
+            continue
+
+        template = None
+        if item.get('template_id'):
+            template_obj = templates.get(item['template_id'])
+            if not template_obj:
+                prepared.append({'index': index, 'error': 'Template not found'})
+                continue
+            if not template_obj.is_system and template_obj.user_id != user_id:
+                prepared.append({'index': index, 'error': 'Access denied to this template'})
+                continue
+            template = template_obj.template
+
+        if provider not in services:
+            services[provider] = LLM_PROVIDERS[provider](
+                api_key=api_key.get_api_key() if api_key else None,
+                cache=response_cache if response_cache.enabled else None,
+                api_key_id=api_key.id if api_key else None)
+        llm_service = services[provider]
+
+        formatted_message = item['message']
+        if template:
+            context = {'conversation_summary': '', 'conversation_history': []}
+            if conversation is not None:
+                context = context_builder.build(
+                    conversation, provider, item['model'], template + item['message'])
+            context['user_id'] = user_id
+            context['conversation_id'] = conversation.id if conversation else None
+            formatted_message = llm_service.format_prompt(
+                item['message'], template=template, context=context)
+
+        prepared.append({
+            'index': index,
+            'message': item['message'],
+            'provider': provider,
+            'model': item['model'],
+            'template': template,
+            'template_id': item.get('template_id'),
+            'api_key': api_key,
+            'llm_service': llm_service,
+            'formatted_message': formatted_message
+        })
+    return prepared
+
+
+async def _run_batch(jobs, concurrency):
+    """
+    Send the batch prompts with at most `concurrency` provider calls in
+    flight; each call still goes through the provider's retries, breaker
+    and bulkhead, as background work for the scheduler.
+
+    Returns:
+        One response text or exception per job, in order
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(job):
+        async with semaphore:
+            return await job['llm_service'].get_response(
+                job['formatted_message'], model=job['model'],
+                options={'template': job['template'], 'template_id': job['template_id'],
+                         'priority': BACKGROUND})
+
+    return await asyncio.gather(*(run(job) for job in jobs), return_exceptions=True)
+
+
+def _batch_error(error):
+    """Per-item error result for a failed provider call"""
+    if isinstance(error, ProviderUnavailableError):
+        return {"error": "Provider temporarily unavailable",
+                "retry_after": math.ceil(error.retry_after)}
+    if isinstance(error, LLMProviderError):
+        return {"error": "LLM service error", "status_code": error.status_code}
+    logger.error(f"Error in batch chat item: {str(error)}")
+    return {"error": "An error occurred while processing this item"}
+
+
+def _save_batch(user_id, conversation, answered):
+    """
+    Persist the answered items in one transaction: the conversation (when
+    new), each user/bot message pair and the API key usage.
+    """
+    now = datetime.utcnow()
+    if conversation is None:
+        first = answered[0][0]['message']
+        conversation = Conversation(
+            user_id=user_id,
+            title=first[:50] + ("..." if len(first) > 50 else "")
+        )
+        db.session.add(conversation)
+        db.session.flush()
+
+    messages = []
+    for job, response_text in answered:
+        bot_msg = Message(
+            conversation_id=conversation.id,
+            content=response_text,
+            sender="bot",
+            metadata={
+                "provider": job['provider'],
+                "model": job['model'],
+                "template_id": job['template_id'],
+                "batch": True
+            }
+        )
+        db.session.add(Message(conversation_id=conversation.id,
+                               content=job['message'], sender="user"))
+        db.session.add(bot_msg)
+        messages.append(bot_msg)
+
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    for job, _ in answered:
+        if job['api_key']:
+            api_key_usage.record(job['api_key'].id, used_at=now)
+    return conversation, messages
+
+
+def _unavailable_response(error):
+    """503 telling the client when the provider may be tried again"""
+    response = jsonify({
+        "error": "Provider temporarily unavailable",
+        "retry_after": math.ceil(error.retry_after)
+    })
+    return response, 503, {'Retry-After': str(math.ceil(error.retry_after))}
+
+
+def _sse_event(event, data):
+    """Format a Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
 @chat_bp.route('/message', methods=['POST'])
 @jwt_required()
 @limiter.limit("10 per minute")
 @cross_origin()
+@idempotent
 def send_message():
     """Send a message to the chat LLM."""
     try:
@@ -112,138 +732,257 @@ def send_message():
         schema = ChatMessageSchema()
         data = schema.load(request.json)
 
-        user_message = data['message']
-        provider = data['provider']
-        model = data['model']
-        conversation_id = data.get('conversation_id')
-        template_id = data.get('template_id')
-        regenerate = data.get('regenerate', False)
+        user_id = get_jwt_identity()
+
+        if data.get('async_job') is None:
+            data['async_job'] = current_app.config.get('CHAT_ASYNC_DEFAULT', False)
+
+        chat, error = _prepare_chat(data, user_id)
+        if error:
+            return error
+
+        if data['async_job']:
+            return _enqueue_chat(data, chat)
+
+        response_text, _ = _respond(chat)
+
+        return jsonify({
+            "response": response_text,
+            "conversation_id": chat['conversation'].id
+        }), 200
+
+    except ProviderUnavailableError as e:
+        return _unavailable_response(e)
+    except Exception as e:
+        logger.error(f"Error in chat API: {str(e)}")
+        return jsonify({"error": "An error occurred while processing your request"}), 500
+
+
+@chat_bp.route('/message/stream', methods=['POST'])
+@jwt_required()
+@limiter.limit("10 per minute")
+@cross_origin()
+def stream_message():
+    """
+    Send a message to the chat LLM and stream the reply as Server-Sent Events.
+
+    Emits a `start` event with the conversation id, one `token` event per
+    text delta, then `done` once the bot message has been saved (or `error`).
+    """
+    try:
+        schema = ChatMessageSchema()
+        data = schema.load(request.json)
 
         user_id = get_jwt_identity()
+        data['async_job'] = False
+        # Fail fast before the stream starts if the provider or key is down
+        data['fail_fast'] = not current_app.config.get('LLM_SIMULATION_MODE')
+
+        chat, error = _prepare_chat(data, user_id)
+        if error:
+            return error
+    except ProviderUnavailableError as e:
+        return _unavailable_response(e)
+    except Exception as e:
+        logger.error(f"Error in chat stream API: {str(e)}")
+        return jsonify({"error": "An error occurred while processing your request"}), 500
 
-        # Validate provider and model
-        if provider not in LLM_SERVICES:
-            return jsonify({"error": f"Provider '{provider}' not supported"}), 400
+    def generate():
+        conversation_id = chat['conversation'].id
+        yield _sse_event('start', {'conversation_id': conversation_id})
 
-        # Get the API key
-        api_key = APIKey.query.filter_by(
-            user_id=user_id, provider=provider, is_active=True).first()
-        if not api_key:
-            if current_app.config.get('LLM_SIMULATION_MODE'):
-                # In simulation mode, proceed without API key
-                logger.warning(
-                    f"Simulation mode: Proceeding without API key for {provider}")
+        try:
+            cache_key = None
+            cached = _semantic_cache_lookup(chat)
+            if cached is not None:
+                tokens = chunk_text(cached)
+            elif current_app.config.get('LLM_SIMULATION_MODE'):
+                tokens = chunk_text(_simulated_response(chat))
             else:
-                return jsonify({"error": f"No active API key found for provider '{provider}'"}), 403
-
-        # Get the prompt template if specified
-        template = None
-        if template_id:
-            template_obj = PromptTemplate.query.get(template_id)
-            if not template_obj:
-                return jsonify({"error": "Template not found"}), 404
+                if response_cache.enabled:
+                    cache_key = response_cache.make_key(
+                        chat['provider'], chat['model'], chat['formatted_message'], chat['template'])
+                    if not chat['regenerate']:
+                        cached = response_cache.get(cache_key)
+
+                if cached is not None:
+                    tokens = chunk_text(cached)
+                else:
+                    # No DB connection held while the reply streams
+                    release_connection()
+                    tokens = stream_llm_response(
+                        chat['provider'], chat['model'], chat['key'], chat['formatted_message'],
+                        api_key_id=chat['api_key'].id if chat['api_key'] else None,
+                        template=chat['template'])
+
+            start = time.monotonic()
+            chunks = []
+            for token in tokens:
+                chunks.append(token)
+                yield _sse_event('token', {'token': token})
+
+            response_text = ''.join(chunks).strip()
+            if cache_key is not None and cached is None:
+                response_cache.set(cache_key, response_text,
+                                   time.monotonic() - start)
+
+            bot_msg = _save_bot_message(chat, response_text)
+            yield _sse_event('done', {
+                'conversation_id': conversation_id,
+                'message_id': bot_msg.id
+            })
+        except Exception as e:
+            logger.error(f"Error streaming chat response: {str(e)}")
+            _record_failure(chat, e)
+            yield _sse_event('error', {
+                'error': 'An error occurred while processing your request'
+            })
 
-            # Check if user has access to this template
-            if not template_obj.is_system and template_obj.user_id != user_id:
-                return jsonify({"error": "Access denied to this template"}), 403
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
 
-            template = template_obj.template
 
-        # Handle conversation context
-        current_conversation = None
-        if conversation_id:
-            current_conversation = Conversation.query.filter_by(
-                id=conversation_id, user_id=user_id).first()
-            if not current_conversation:
-                return jsonify({"error": "Conversation not found"}), 404
-        else:
-            # Create a new conversation
-            current_conversation = Conversation(
-                user_id=user_id,
-                title=user_message[:50] +
-                ("..." if len(user_message) > 50 else "")
-            )
-            db.session.add(current_conversation)
-            db.session.commit()
-
-        # Create user message
-        user_msg = Message(
-            conversation_id=current_conversation.id,
-            content=user_message,
-            sender="user"
-        )
-        db.session.add(user_msg)
-        db.session.commit()
+@chat_bp.route('/batch', methods=['POST'])
+@jwt_required()
+@limiter.limit("5 per minute")
+@cross_origin()
+@idempotent
+def send_batch():
+    """
+    Send a list of prompts (optionally to different providers) in one request.
+
+    The prompts run concurrently, at most CHAT_BATCH_CONCURRENCY at a time,
+    within CHAT_BATCH_DEADLINE; answered prompts are saved together in one
+    conversation (new, or conversation_id). Returns one result per item, in
+    order: the response and message id, or the item's error.
+    """
+    try:
+        schema = ChatBatchSchema()
+        data = schema.load(request.json)
+    except ValidationError as err:
+        return jsonify({'error': 'Validation error', 'details': err.messages}), 400
 
-        # Get the LLM service
-        llm_service = LLM_SERVICES[provider](
-            api_key=api_key.get_api_key() if api_key else None)
+    max_items = current_app.config.get('CHAT_BATCH_MAX_ITEMS', 20)
+    if len(data['items']) > max_items:
+        return jsonify({"error": f"A batch may have at most {max_items} items"}), 400
 
-        # Format prompt with template if provided
-        formatted_message = user_message
-        if template:
-            # Get conversation history for context
-            conversation_messages = []
-            if current_conversation:
-                messages = Message.query.filter_by(
-                    conversation_id=current_conversation.id).order_by(Message.created_at).all()
-                for msg in messages:
-                    if msg.id != user_msg.id:  # Skip the message we just added
-                        conversation_messages.append({
-                            'content': msg.content,
-                            'sender': msg.sender
-                        })
+    try:
+        user_id = get_jwt_identity()
+        conversation = None
+        if data.get('conversation_id'):
+            conversation = Conversation.query.filter_by(
+                id=data['conversation_id'], user_id=user_id).first()
+            if not conversation:
+                return jsonify({"error": "Conversation not found"}), 404
 
-            formatted_message = llm_service.format_prompt(
-                user_message,
-                template=template,
-                context={
-                    'user_id': user_id,
-                    'conversation_id': current_conversation.id,
-                    'conversation_history': conversation_messages
-                }
-            )
+        prepared = _prepare_batch(data['items'], user_id, conversation)
+        jobs = [entry for entry in prepared if 'error' not in entry]
 
-        # Get response from the LLM
+        start = time.monotonic()
         if current_app.config.get('LLM_SIMULATION_MODE'):
-            # In simulation mode, generate a mock response
-            logger.info(
-                f"Simulation mode: Generating mock response for: {user_message}")
-            response_text = f"This is a simulated response for '{user_message}'. Provider: {provider}, Model: {model}"
+            outcomes = [_simulated_response(job) for job in jobs]
         else:
-            response_text = llm_service.get_response(
-                formatted_message, model=model)
-
-        # Create bot message
-        bot_msg = Message(
-            conversation_id=current_conversation.id,
-            content=response_text,
-            sender="bot",
-            metadata={
-                "provider": provider,
-                "model": model,
-                "regenerated": regenerate
-            }
-        )
-        db.session.add(bot_msg)
-
-        # Update API key usage
-        if api_key:
-            api_key.last_used = datetime.utcnow()
-            api_key.use_count += 1
+            concurrency = min(data.get('concurrency') or math.inf,
+                              current_app.config.get('CHAT_BATCH_CONCURRENCY', 8))
+            release_connection()
+            with request_deadline(current_app.config.get('CHAT_BATCH_DEADLINE')):
+                outcomes = async_engine.run(_run_batch(jobs, concurrency)) if jobs else []
+        metrics.observe('chat_batch_seconds', time.monotonic() - start)
+        metrics.observe('chat_batch_items', len(prepared))
+
+        results = {entry['index']: entry for entry in prepared if 'error' in entry}
+        answered = []
+        for job, outcome in zip(jobs, outcomes):
+            if isinstance(outcome, BaseException):
+                results[job['index']] = dict(index=job['index'], **_batch_error(outcome))
+            else:
+                answered.append((job, outcome))
+
+        if answered:
+            conversation, messages = _save_batch(user_id, conversation, answered)
+            for (job, response_text), bot_msg in zip(answered, messages):
+                results[job['index']] = {
+                    'index': job['index'],
+                    'response': response_text,
+                    'message_id': bot_msg.id
+                }
 
-        db.session.commit()
+        metrics.incr('chat_batch_items_total', len(answered), result='ok')
+        metrics.incr('chat_batch_items_total', len(prepared) - len(answered), result='error')
 
         return jsonify({
-            "response": response_text,
-            "conversation_id": current_conversation.id
+            "conversation_id": conversation.id if conversation else None,
+            "results": [results[index] for index in range(len(prepared))]
         }), 200
 
     except Exception as e:
-        logger.error(f"Error in chat API: {str(e)}")
+        logger.error(f"Error in chat batch API: {str(e)}")
         return jsonify({"error": "An error occurred while processing your request"}), 500
 
 
+def _user_job(job_id, user_id, wait=0):
+    """The user's job (waiting up to `wait` seconds for it to finish), or None"""
+    if wait > 0:
+        job = chat_queue.store.wait(job_id, wait)
+    else:
+        job = chat_queue.store.get(job_id)
+    if not job or job.get('user_id') != user_id:
+        return None
+    return {name: value for name, value in job.items() if name != 'user_id'}
+
+
+@chat_bp.route('/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+@cross_origin()
+def get_chat_job(job_id):
+    """
+    Status of a queued chat request; the reply once it is done.
+
+    Query params:
+        wait: Long-poll for up to this many seconds (max CHAT_JOB_WAIT_TIMEOUT)
+    """
+    wait = min(request.args.get('wait', 0, type=float),
+               current_app.config.get('CHAT_JOB_WAIT_TIMEOUT', 25))
+    job = _user_job(job_id, get_jwt_identity(), wait)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job), 200
+
+
+@chat_bp.route('/jobs/<job_id>/events', methods=['GET'])
+@jwt_required()
+@cross_origin()
+def chat_job_events(job_id):
+    """
+    Subscribe to a queued chat request as Server-Sent Events.
+
+    Emits `done` or `error` with the job once it finishes, or `pending`
+    after CHAT_JOB_WAIT_TIMEOUT so the client can reconnect.
+    """
+    user_id = get_jwt_identity()
+    if _user_job(job_id, user_id) is None:
+        return jsonify({"error": "Job not found"}), 404
+    timeout = current_app.config.get('CHAT_JOB_WAIT_TIMEOUT', 25)
+
+    def generate():
+        job = _user_job(job_id, user_id, timeout)
+        if job is None:
+            yield _sse_event('error', {'error': 'Job not found'})
+        elif job['status'] == DONE:
+            yield _sse_event('done', job)
+        elif job['status'] == FAILED:
+            yield _sse_event('error', job)
+        else:
+            yield _sse_event('pending', job)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
 @chat_bp.route('/test', methods=['GET', 'POST'])
 @cross_origin()
 def test_endpoint():
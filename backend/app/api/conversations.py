@@ -5,9 +5,10 @@ from flask_cors import cross_origin
 
 from app.models.conversation import Conversation
 from app.models.message import Message
-from app.models.user import User
+from app.services.user_identity import user_identity
 from app.utils.security import token_required
 from app.utils.rate_limit import rate_limit
+from app.utils.idempotency import idempotent
 
 # Inicializar o blueprint
 conversations_bp = Blueprint(
@@ -56,9 +57,8 @@ class ConversationResource(MethodView):
     def get(self, user_id, conversation_id=None):
         """Obter conversas do usuário"""
 
-        # Verificar se o usuário existe
-        user = User.query.get(user_id)
-        if not user:
+        # Verificar se o usuário existe e está ativo
+        if not user_identity.active(user_id):
             return jsonify({'error': 'Usuário não encontrado'}), 404
 
         # Se um ID de conversa for fornecido, retornar conversa específica
@@ -83,12 +83,12 @@ class ConversationResource(MethodView):
 
     @token_required
     @rate_limit(limit=20, period=60, key_prefix='conversations_create')
+    @idempotent
     def post(self, user_id):
         """Criar uma nova conversa"""
 
-        # Verificar se o usuário existe
-        user = User.query.get(user_id)
-        if not user:
+        # Verificar se o usuário existe e está ativo
+        if not user_identity.active(user_id):
             return jsonify({'error': 'Usuário não encontrado'}), 404
 
         # Obter dados da requisição
@@ -106,12 +106,12 @@ class ConversationResource(MethodView):
 
     @token_required
     @rate_limit(limit=20, period=60, key_prefix='conversations_update')
+    @idempotent
     def put(self, user_id, conversation_id):
         """Atualizar título da conversa"""
 
-        # Verificar se o usuário existe
-        user = User.query.get(user_id)
-        if not user:
+        # Verificar se o usuário existe e está ativo
+        if not user_identity.active(user_id):
             return jsonify({'error': 'Usuário não encontrado'}), 404
 
         # Verificar se a conversa existe e pertence ao usuário
@@ -135,12 +135,12 @@ class ConversationResource(MethodView):
 
     @token_required
     @rate_limit(limit=20, period=60, key_prefix='conversations_delete')
+    @idempotent
     def delete(self, user_id, conversation_id):
         """Excluir uma conversa"""
 
-        # Verificar se o usuário existe
-        user = User.query.get(user_id)
-        if not user:
+        # Verificar se o usuário existe e está ativo
+        if not user_identity.active(user_id):
             return jsonify({'error': 'Usuário não encontrado'}), 404
 
         # Verificar se a conversa existe e pertence ao usuário
@@ -171,12 +171,12 @@ class MessageResource(MethodView):
 
     @token_required
     @rate_limit(limit=20, period=60, key_prefix='messages_create')
+    @idempotent
     def post(self, user_id, conversation_id):
         """Adicionar uma nova mensagem à conversa"""
 
-        # Verificar se o usuário existe
-        user = User.query.get(user_id)
-        if not user:
+        # Verificar se o usuário existe e está ativo
+        if not user_identity.active(user_id):
             return jsonify({'error': 'Usuário não encontrado'}), 404
 
         # Verificar se a conversa existe e pertence ao usuário
@@ -214,9 +214,8 @@ class MessageResource(MethodView):
     def get(self, user_id, conversation_id):
         """Obter mensagens de uma conversa"""
 
-        # Verificar se o usuário existe
-        user = User.query.get(user_id)
-        if not user:
+        # Verificar se o usuário existe e está ativo
+        if not user_identity.active(user_id):
             return jsonify({'error': 'Usuário não encontrado'}), 404
 
         # Verificar se a conversa existe e pertence ao usuário
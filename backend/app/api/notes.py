@@ -3,9 +3,10 @@ from flask.views import MethodView
 from marshmallow import Schema, fields, validate, ValidationError
 
 from app.models.note import Note
-from app.models.user import User
+from app.services.user_identity import user_identity
 from app.utils.security import token_required
 from app.utils.rate_limit import rate_limit
+from app.utils.idempotency import idempotent
 
 notes_bp = Blueprint('notes', __name__, url_prefix='/api/notes')
 
@@ -52,6 +53,7 @@ class NoteResource(MethodView):
 
     @token_required
     @rate_limit(limit=20, period=60, key_prefix='notes_create')
+    @idempotent
     def post(self, user_id):
         """Create a new note for the authenticated user"""
         # Validate request data
@@ -61,9 +63,8 @@ class NoteResource(MethodView):
         except ValidationError as err:
             return jsonify({'error': 'Validation error', 'details': err.messages}), 400
 
-        # Check if user exists
-        user = User.query.get(user_id)
-        if not user:
+        # Check if user exists and is active
+        if not user_identity.active(user_id):
             return jsonify({'error': 'User not found'}), 404
 
         # Create note
@@ -83,6 +84,7 @@ class NoteResource(MethodView):
 
     @token_required
     @rate_limit(limit=20, period=60, key_prefix='notes_update')
+    @idempotent
     def put(self, user_id, note_id):
         """Update a note for the authenticated user"""
         # Validate request data
@@ -115,6 +117,7 @@ class NoteResource(MethodView):
 
     @token_required
     @rate_limit(limit=20, period=60, key_prefix='notes_delete')
+    @idempotent
     def delete(self, user_id, note_id):
         """Delete a note for the authenticated user"""
         # Get note
@@ -4,8 +4,9 @@ from marshmallow import Schema, fields, validate, ValidationError
 from flask_cors import cross_origin
 from app.models.prompt_template import PromptTemplate
 from app.models.database import db
-from app.models.user import User
+from app.services.user_identity import user_identity
 from app.utils.limiter import limiter
+from app.utils.idempotency import idempotent
 from app.utils.logger import logger
 
 # Blueprint definition
@@ -87,6 +88,7 @@ def get_template(template_id):
 @jwt_required()
 @limiter.limit("10 per minute")
 @cross_origin()
+@idempotent
 def create_template():
     """Create a new prompt template"""
     user_id = get_jwt_identity()
@@ -121,6 +123,7 @@ def create_template():
 @jwt_required()
 @limiter.limit("10 per minute")
 @cross_origin()
+@idempotent
 def update_template(template_id):
     """Update an existing prompt template"""
     user_id = get_jwt_identity()
@@ -164,6 +167,7 @@ def update_template(template_id):
 @jwt_required()
 @limiter.limit("10 per minute")
 @cross_origin()
+@idempotent
 def delete_template(template_id):
     """Delete a prompt template"""
     user_id = get_jwt_identity()
@@ -197,13 +201,14 @@ def delete_template(template_id):
 @jwt_required()
 @limiter.limit("5 per minute")
 @cross_origin()
+@idempotent
 def create_system_template():
     """Create a new system template (admin only)"""
     user_id = get_jwt_identity()
 
     # Check if user is admin
-    user = User.query.get(user_id)
-    if not user or not user.is_admin:
+    identity = user_identity.active(user_id)
+    if not identity or not identity.is_admin:
         return jsonify({'error': 'Admin access required'}), 403
 
     # Parse and validate the request
@@ -2,6 +2,7 @@ from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models import Note, db
 from app.schemas.note import NoteSchema
+from app.utils.idempotency import idempotent
 from datetime import date
 
 notes_bp = Blueprint('notes', __name__, url_prefix='/notes')
@@ -43,6 +44,7 @@ def get_note(note_id):
 
 @notes_bp.route('', methods=['POST'])
 @jwt_required()
+@idempotent
 def create_note():
     """Create a new note"""
     user_id = get_jwt_identity()
@@ -68,6 +70,7 @@ def create_note():
 
 @notes_bp.route('/<int:note_id>', methods=['PUT'])
 @jwt_required()
+@idempotent
 def update_note(note_id):
     """Update an existing note"""
     user_id = get_jwt_identity()
@@ -98,6 +101,7 @@ def update_note(note_id):
 
 @notes_bp.route('/<int:note_id>', methods=['DELETE'])
 @jwt_required()
+@idempotent
 def delete_note(note_id):
     """Delete a note"""
     user_id = get_jwt_identity()
@@ -1,4 +1,5 @@
 import os
+import json
 from datetime import timedelta
 from cryptography.fernet import Fernet
 
@@ -18,6 +19,9 @@ class Config:
     # CORS configuration
     CORS_ORIGINS = os.environ.get('CORS_ORIGINS', '*')
 
+    # Bearer token for /metrics; the endpoint is disabled (404) without one
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
     # Redis configuration
     REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
 
@@ -27,11 +31,212 @@ class Config:
     # API Encryption (AES-256)
     API_ENCRYPTION_KEY = os.environ.get(
         'API_ENCRYPTION_KEY', Fernet.generate_key().decode())
+    # APIKey.use_count/last_used are counted apart (Redis or in-process) and
+    # added to api_keys in one batch this often
+    API_KEY_USAGE_FLUSH_INTERVAL = float(os.environ.get('API_KEY_USAGE_FLUSH_INTERVAL', 5))
+    # Existence/is_active/is_admin of users for the route handlers: per
+    # worker (0 disables) and shared in Redis
+    USER_IDENTITY_CACHE_TTL = float(os.environ.get('USER_IDENTITY_CACHE_TTL', 10))
+    USER_IDENTITY_CACHE_SIZE = int(os.environ.get('USER_IDENTITY_CACHE_SIZE', 10000))
+    USER_IDENTITY_REDIS_TTL = int(os.environ.get('USER_IDENTITY_REDIS_TTL', 300))
+
+    # Asynchronous chat jobs ("async": true on /api/chat/message): queue
+    # backend 'rabbitmq' (consumed by chat_worker.py) or 'local' threads
+    CHAT_QUEUE_BACKEND = os.environ.get('CHAT_QUEUE_BACKEND', 'rabbitmq')
+    CHAT_QUEUE_NAME = os.environ.get('CHAT_QUEUE_NAME', 'chat.jobs')
+    CHAT_ASYNC_DEFAULT = os.environ.get(
+        'CHAT_ASYNC_DEFAULT', 'False').lower() == 'true'
+    # Jobs run concurrently per worker process, and unacknowledged messages
+    # taken from the broker per process
+    CHAT_WORKER_CONCURRENCY = int(os.environ.get('CHAT_WORKER_CONCURRENCY', 8))
+    CHAT_WORKER_PREFETCH = int(os.environ.get('CHAT_WORKER_PREFETCH', 8))
+    CHAT_JOB_TTL = int(os.environ.get('CHAT_JOB_TTL', 3600))
+    # Max long-poll/subscribe wait on a job
+    CHAT_JOB_WAIT_TIMEOUT = float(os.environ.get('CHAT_JOB_WAIT_TIMEOUT', 25))
+
+    # Batch chat (/api/chat/batch): max prompts per request, provider calls
+    # in flight per batch, and the deadline shared by the whole batch
+    CHAT_BATCH_MAX_ITEMS = int(os.environ.get('CHAT_BATCH_MAX_ITEMS', 20))
+    CHAT_BATCH_CONCURRENCY = int(os.environ.get('CHAT_BATCH_CONCURRENCY', 8))
+    CHAT_BATCH_DEADLINE = float(os.environ.get('CHAT_BATCH_DEADLINE', 60))
+
+    # Idempotency-Key on write endpoints: how long responses are replayed,
+    # how long a claim outlives a crashed request (above the longest
+    # deadline), and how long a concurrent duplicate waits for the first
+    IDEMPOTENCY_ENABLED = os.environ.get(
+        'IDEMPOTENCY_ENABLED', 'True').lower() == 'true'
+    IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', 86400))
+    IDEMPOTENCY_LOCK_TTL = int(os.environ.get('IDEMPOTENCY_LOCK_TTL', 90))
+    IDEMPOTENCY_WAIT_TIMEOUT = float(os.environ.get('IDEMPOTENCY_WAIT_TIMEOUT', 40))
+    IDEMPOTENCY_POLL_INTERVAL = float(os.environ.get('IDEMPOTENCY_POLL_INTERVAL', 0.1))
+    # Without Redis: stored responses kept per worker (oldest dropped first)
+    IDEMPOTENCY_LOCAL_MAX_ENTRIES = int(os.environ.get('IDEMPOTENCY_LOCAL_MAX_ENTRIES', 10000))
+
+    # Daily messages generated ahead of time by the worker processes (one
+    # leader at a time): days ahead, past days to backfill, run interval
+    DAILY_MESSAGE_SCHEDULER_ENABLED = os.environ.get(
+        'DAILY_MESSAGE_SCHEDULER_ENABLED', 'True').lower() == 'true'
+    DAILY_MESSAGE_DAYS_AHEAD = int(os.environ.get('DAILY_MESSAGE_DAYS_AHEAD', 7))
+    DAILY_MESSAGE_BACKFILL_DAYS = int(os.environ.get('DAILY_MESSAGE_BACKFILL_DAYS', 7))
+    DAILY_MESSAGE_INTERVAL = int(os.environ.get('DAILY_MESSAGE_INTERVAL', 600))
+    # Leadership lease; another node takes over this long after the leader dies
+    DAILY_MESSAGE_LEADER_TTL = int(os.environ.get('DAILY_MESSAGE_LEADER_TTL', 1800))
+    # Provider, model and API key used to write the messages; without a key
+    # the scheduler does not start (unless USE_MOCK_LLM)
+    DAILY_MESSAGE_PROVIDER = os.environ.get('DAILY_MESSAGE_PROVIDER', 'openai')
+    DAILY_MESSAGE_MODEL = os.environ.get('DAILY_MESSAGE_MODEL', 'gpt-3.5-turbo')
+    DAILY_MESSAGE_API_KEY = os.environ.get('DAILY_MESSAGE_API_KEY')
+    DAILY_MESSAGE_MAX_WORDS = int(os.environ.get('DAILY_MESSAGE_MAX_WORDS', 120))
 
     # Elastic Stack configuration
     ELASTICSEARCH_URL = os.environ.get(
         'ELASTICSEARCH_URL', 'http://localhost:9200')
 
+    # Provider base URL overrides, e.g. benchmarks/standin_server.py for load
+    # tests: LLM_BASE_URL for every provider, LLM_PROVIDER_BASE_URLS
+    # ({"openai": "http://..."}) per provider
+    LLM_BASE_URL = os.environ.get('LLM_BASE_URL')
+    LLM_PROVIDER_BASE_URLS = json.loads(
+        os.environ.get('LLM_PROVIDER_BASE_URLS', '{}'))
+
+    # LLM provider HTTP clients (one pooled session per provider per worker)
+    LLM_HTTP_POOL_SIZE = int(os.environ.get('LLM_HTTP_POOL_SIZE', 10))
+    LLM_HTTP_CONNECT_TIMEOUT = float(
+        os.environ.get('LLM_HTTP_CONNECT_TIMEOUT', 5))
+    LLM_HTTP_READ_TIMEOUT = float(os.environ.get('LLM_HTTP_READ_TIMEOUT', 30))
+    LLM_HTTP_KEEPALIVE_IDLE = int(
+        os.environ.get('LLM_HTTP_KEEPALIVE_IDLE', 60))
+    # Max in-flight upstream calls on the per-worker async engine
+    LLM_ASYNC_MAX_CONNECTIONS = int(
+        os.environ.get('LLM_ASYNC_MAX_CONNECTIONS', 200))
+
+    # Exact-match LLM response cache (in-process LRU + Redis)
+    LLM_CACHE_ENABLED = os.environ.get(
+        'LLM_CACHE_ENABLED', 'True').lower() == 'true'
+    LLM_CACHE_MAX_ENTRIES = int(os.environ.get('LLM_CACHE_MAX_ENTRIES', 1024))
+    LLM_CACHE_LOCAL_TTL = int(os.environ.get('LLM_CACHE_LOCAL_TTL', 300))
+    LLM_CACHE_TTL = int(os.environ.get('LLM_CACHE_TTL', 3600))
+
+    # Coalescing of identical concurrent LLM calls (in-process + Redis lock)
+    LLM_SINGLEFLIGHT_ENABLED = os.environ.get(
+        'LLM_SINGLEFLIGHT_ENABLED', 'True').lower() == 'true'
+    # Max time a follower waits on the leader before calling upstream itself
+    LLM_SINGLEFLIGHT_TIMEOUT = float(
+        os.environ.get('LLM_SINGLEFLIGHT_TIMEOUT', 35))
+    LLM_SINGLEFLIGHT_LOCK_TTL = float(
+        os.environ.get('LLM_SINGLEFLIGHT_LOCK_TTL', 35))
+    LLM_SINGLEFLIGHT_RESULT_TTL = int(
+        os.environ.get('LLM_SINGLEFLIGHT_RESULT_TTL', 10))
+    # How often a cross-worker follower re-checks the leader's lock
+    LLM_SINGLEFLIGHT_POLL_INTERVAL = float(
+        os.environ.get('LLM_SINGLEFLIGHT_POLL_INTERVAL', 1.0))
+
+    # Hedging/failover to the user's other providers (opt-in, or per request
+    # with "hedge": true). The hedge fires after the primary's latency
+    # percentile, or after the default delay until enough samples exist.
+    LLM_HEDGING_ENABLED = os.environ.get(
+        'LLM_HEDGING_ENABLED', 'False').lower() == 'true'
+    LLM_HEDGING_PERCENTILE = float(os.environ.get('LLM_HEDGING_PERCENTILE', 95))
+    LLM_HEDGING_MIN_SAMPLES = int(os.environ.get('LLM_HEDGING_MIN_SAMPLES', 20))
+    LLM_HEDGING_DEFAULT_DELAY = float(
+        os.environ.get('LLM_HEDGING_DEFAULT_DELAY', 5))
+    LLM_HEDGING_MIN_DELAY = float(os.environ.get('LLM_HEDGING_MIN_DELAY', 0.5))
+    LLM_HEDGING_MAX_FALLBACKS = int(
+        os.environ.get('LLM_HEDGING_MAX_FALLBACKS', 2))
+
+    # Circuit breakers per provider and per API key (state shared via Redis)
+    LLM_BREAKER_ENABLED = os.environ.get(
+        'LLM_BREAKER_ENABLED', 'True').lower() == 'true'
+    LLM_BREAKER_FAILURE_THRESHOLD = int(
+        os.environ.get('LLM_BREAKER_FAILURE_THRESHOLD', 5))
+    LLM_BREAKER_WINDOW = int(os.environ.get('LLM_BREAKER_WINDOW', 30))
+    LLM_BREAKER_RESET_TIMEOUT = float(
+        os.environ.get('LLM_BREAKER_RESET_TIMEOUT', 30))
+    # Max time one half-open probe call may take before another is allowed
+    LLM_BREAKER_PROBE_TIMEOUT = float(
+        os.environ.get('LLM_BREAKER_PROBE_TIMEOUT', 35))
+
+    # Cluster-wide concurrency limits (bulkheads) per provider:model, as JSON,
+    # e.g. {"openai": 50, "openai:gpt-4": 10}; a provider entry applies to
+    # each of its models. 0 disables the limit.
+    LLM_CONCURRENCY_LIMITS = json.loads(
+        os.environ.get('LLM_CONCURRENCY_LIMITS', '{}'))
+    LLM_CONCURRENCY_DEFAULT_LIMIT = int(
+        os.environ.get('LLM_CONCURRENCY_DEFAULT_LIMIT', 50))
+    # Max time a call queues for a slot before failing with 503
+    LLM_CONCURRENCY_QUEUE_TIMEOUT = float(
+        os.environ.get('LLM_CONCURRENCY_QUEUE_TIMEOUT', 5))
+    # Leases of crashed holders expire after this long
+    LLM_CONCURRENCY_LEASE_TTL = int(
+        os.environ.get('LLM_CONCURRENCY_LEASE_TTL', 60))
+
+    # Priority scheduler in front of the providers (per worker process):
+    # total provider calls in flight (0 = unlimited), limits per priority
+    # class as JSON, and slots only interactive calls may take
+    LLM_SCHEDULER_ENABLED = os.environ.get(
+        'LLM_SCHEDULER_ENABLED', 'True').lower() == 'true'
+    LLM_SCHEDULER_CAPACITY = int(os.environ.get('LLM_SCHEDULER_CAPACITY', 64))
+    LLM_SCHEDULER_LIMITS = json.loads(os.environ.get(
+        'LLM_SCHEDULER_LIMITS', '{"interactive": 0, "background": 16}'))
+    LLM_SCHEDULER_INTERACTIVE_RESERVE = int(
+        os.environ.get('LLM_SCHEDULER_INTERACTIVE_RESERVE', 16))
+    # Background calls queued this long jump ahead of interactive ones
+    LLM_SCHEDULER_STARVATION_AGE = float(
+        os.environ.get('LLM_SCHEDULER_STARVATION_AGE', 10))
+    # Max queueing per class before failing with 503 (also bounded by the
+    # request deadline)
+    LLM_SCHEDULER_QUEUE_TIMEOUTS = json.loads(os.environ.get(
+        'LLM_SCHEDULER_QUEUE_TIMEOUTS', '{"interactive": 5, "background": 60}'))
+
+    # Time budget for answering one chat request, retries included
+    LLM_REQUEST_DEADLINE = float(os.environ.get('LLM_REQUEST_DEADLINE', 30))
+    # Retries of 408/429/5xx and connection errors: exponential backoff with
+    # full jitter (at least the provider's Retry-After), capped per process
+    # to LLM_RETRY_BUDGET_RATIO of calls (+ MIN_RETRIES) over 10 s
+    LLM_RETRY_MAX_ATTEMPTS = int(os.environ.get('LLM_RETRY_MAX_ATTEMPTS', 3))
+    LLM_RETRY_BASE_DELAY = float(os.environ.get('LLM_RETRY_BASE_DELAY', 0.25))
+    LLM_RETRY_MAX_DELAY = float(os.environ.get('LLM_RETRY_MAX_DELAY', 8))
+    LLM_RETRY_BUDGET_RATIO = float(
+        os.environ.get('LLM_RETRY_BUDGET_RATIO', 0.1))
+    LLM_RETRY_BUDGET_MIN_RETRIES = int(
+        os.environ.get('LLM_RETRY_BUDGET_MIN_RETRIES', 10))
+
+    # Semantic (near-duplicate) cache for template-less prompts, opt-in. A
+    # user is only served answers to their own earlier prompts; the
+    # threshold keeps near misses ("meu pai" / "minha mãe" ...) apart
+    LLM_SEMANTIC_CACHE_ENABLED = os.environ.get(
+        'LLM_SEMANTIC_CACHE_ENABLED', 'False').lower() == 'true'
+    LLM_SEMANTIC_CACHE_DIM = int(os.environ.get('LLM_SEMANTIC_CACHE_DIM', 256))
+    LLM_SEMANTIC_CACHE_THRESHOLD = float(
+        os.environ.get('LLM_SEMANTIC_CACHE_THRESHOLD', 0.92))
+    LLM_SEMANTIC_CACHE_MAX_ENTRIES = int(
+        os.environ.get('LLM_SEMANTIC_CACHE_MAX_ENTRIES', 100000))
+
+    # Conversation history sent with templated prompts, in estimated tokens:
+    # context window per 'provider:model' or 'provider' (JSON), minus a
+    # reserve for the response
+    LLM_CONTEXT_WINDOWS = json.loads(
+        os.environ.get('LLM_CONTEXT_WINDOWS', '{}'))
+    LLM_CONTEXT_DEFAULT_WINDOW = int(
+        os.environ.get('LLM_CONTEXT_DEFAULT_WINDOW', 4096))
+    LLM_CONTEXT_RESPONSE_RESERVE = int(
+        os.environ.get('LLM_CONTEXT_RESPONSE_RESERVE', 800))
+    # Upper bound on the rows read per prompt
+    LLM_CONTEXT_MAX_MESSAGES = int(
+        os.environ.get('LLM_CONTEXT_MAX_MESSAGES', 50))
+
+    # Rolling conversation summaries, updated in background threads once
+    # EVERY messages past the summary are older than the KEEP_RECENT newest
+    LLM_SUMMARY_ENABLED = os.environ.get(
+        'LLM_SUMMARY_ENABLED', 'True').lower() == 'true'
+    LLM_SUMMARY_EVERY = int(os.environ.get('LLM_SUMMARY_EVERY', 20))
+    LLM_SUMMARY_KEEP_RECENT = int(os.environ.get('LLM_SUMMARY_KEEP_RECENT', 10))
+    LLM_SUMMARY_MAX_INPUT_TOKENS = int(
+        os.environ.get('LLM_SUMMARY_MAX_INPUT_TOKENS', 3000))
+    LLM_SUMMARY_MAX_WORDS = int(os.environ.get('LLM_SUMMARY_MAX_WORDS', 250))
+    LLM_SUMMARY_WORKERS = int(os.environ.get('LLM_SUMMARY_WORKERS', 2))
+    LLM_SUMMARY_LOCK_TTL = int(os.environ.get('LLM_SUMMARY_LOCK_TTL', 120))
+
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -10,6 +10,10 @@ class Conversation(db.Model, BaseModel):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     title = db.Column(db.String(255), nullable=True)
+    # Rolling summary of the messages up to summary_message_id (inclusive);
+    # later messages are sent verbatim
+    summary = db.Column(db.Text, nullable=True)
+    summary_message_id = db.Column(db.Integer, nullable=True)
 
     # Relationships
     user = relationship("User", back_populates="conversations")
@@ -7,6 +7,23 @@ from sqlalchemy.ext.declarative import declared_attr
 db = SQLAlchemy()
 
 
+def release_connection():
+    """
+    Give the session's pooled connection back before a long wait (e.g. an
+    upstream LLM call); the next query checks one out again.
+
+    Loaded objects stay attached and are not expired, so they can be used
+    after the wait without reloading. Call it only once the session's
+    writes are committed: the open transaction is closed, not committed.
+    """
+    session = db.session()
+    if session.new or session.dirty or session.deleted:
+        raise RuntimeError('release_connection() called with uncommitted changes')
+    transaction = session.get_transaction()
+    if transaction is not None:
+        transaction.close()
+
+
 class BaseModel:
     """Base model class that includes common functionality for all models"""
 
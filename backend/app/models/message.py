@@ -6,6 +6,10 @@ import json
 class Message(db.Model, BaseModel):
     """Model for storing individual chat messages"""
     __tablename__ = 'messages'
+    # Serves the newest-first history window of a conversation
+    __table_args__ = (
+        db.Index('ix_messages_conversation_created', 'conversation_id', 'created_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     conversation_id = db.Column(db.Integer, db.ForeignKey(
@@ -0,0 +1,237 @@
+import atexit
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+import redis
+from flask import current_app, has_app_context
+from sqlalchemy import bindparam, case, func
+
+from app.models.api_key import APIKey
+from app.models.database import db
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+
+# Counters accumulated since the last flush
+_COUNTS = 'api_key_usage:counts'
+_LAST_USED = 'api_key_usage:last_used'
+# Counters taken by a flush, deleted only once written to the database
+_FLUSHING_COUNTS = 'api_key_usage:flushing:counts'
+_FLUSHING_LAST_USED = 'api_key_usage:flushing:last_used'
+_FLUSH_LOCK = 'api_key_usage:flush_lock'
+
+# Compare-and-delete, so a flusher never releases a lock it no longer owns
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Keep the newest last_used of the interval
+_RECORD_SCRIPT = """
+redis.call('hincrby', KEYS[1], ARGV[1], ARGV[2])
+local last = tonumber(redis.call('hget', KEYS[2], ARGV[1]) or '0')
+if tonumber(ARGV[3]) > last then
+    redis.call('hset', KEYS[2], ARGV[1], ARGV[3])
+end
+return 1
+"""
+
+# Take the pending counters unless a previous flush left its own behind
+_TAKE_SCRIPT = """
+if redis.call('exists', KEYS[3]) == 0 and redis.call('exists', KEYS[1]) == 1 then
+    redis.call('rename', KEYS[1], KEYS[3])
+    if redis.call('exists', KEYS[2]) == 1 then
+        redis.call('rename', KEYS[2], KEYS[4])
+    end
+end
+return redis.call('exists', KEYS[3])
+"""
+
+_UPDATE = APIKey.__table__.update() \
+    .where(APIKey.__table__.c.id == bindparam('key_id')) \
+    .values(
+        use_count=func.coalesce(APIKey.__table__.c.use_count, 0) + bindparam('count'),
+        last_used=case(
+            (APIKey.__table__.c.last_used.is_(None), bindparam('used_at')),
+            (APIKey.__table__.c.last_used < bindparam('used_at'), bindparam('used_at')),
+            else_=APIKey.__table__.c.last_used))
+
+
+class APIKeyUsage:
+    """
+    Write-behind usage counters for APIKey.use_count and last_used.
+
+    Requests only record a use: an atomic Redis HINCRBY (or an in-process
+    accumulator without Redis), never a read-modify-write of the api_keys
+    row. Every API_KEY_USAGE_FLUSH_INTERVAL seconds the counters are added
+    to api_keys in one batched UPDATE, so the columns lag by at most one
+    interval.
+
+    With Redis a flush first renames the counters to a "flushing" hash,
+    writes them and only then deletes it; if the process dies in between,
+    the next flush (any worker) writes the leftover hash before taking new
+    counters. Uses are never lost; a crash right after the commit and
+    before the delete counts that batch twice. The in-process accumulator
+    is flushed on exit, but a hard crash loses up to one interval.
+    """
+
+    def __init__(self, redis_client=None):
+        self.redis = redis_client
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._app = None
+        self._thread = None
+        self._pid = None
+
+    def _config(self, name, default):
+        if has_app_context():
+            return current_app.config.get(name, default)
+        return default
+
+    def _get_redis(self):
+        """Get Redis client from app or use existing one"""
+        if self.redis:
+            return self.redis
+        if has_app_context():
+            return current_app.extensions.get('redis')
+        return None
+
+    def record(self, api_key_id, count=1, used_at=None):
+        """Count a use of an API key (written to api_keys on the next flush)"""
+        if api_key_id is None:
+            return
+        used_at = used_at or datetime.utcnow()
+        self._ensure_flusher()
+
+        redis_client = self._get_redis()
+        if redis_client:
+            try:
+                redis_client.eval(_RECORD_SCRIPT, 2, _COUNTS, _LAST_USED,
+                                  api_key_id, count,
+                                  used_at.replace(tzinfo=timezone.utc).timestamp())
+                return
+            except redis.exceptions.RedisError as e:
+                logger.warning(f"Redis API key usage error: {str(e)}")
+
+        with self._lock:
+            pending_count, last = self._pending.get(api_key_id, (0, used_at))
+            self._pending[api_key_id] = (pending_count + count, max(last, used_at))
+
+    def flush(self):
+        """
+        Write the accumulated counters to api_keys.
+
+        Returns:
+            Number of API keys updated
+        """
+        updated = self._flush_local()
+        redis_client = self._get_redis()
+        if redis_client:
+            try:
+                updated += self._flush_redis(redis_client)
+            except redis.exceptions.RedisError as e:
+                logger.warning(f"Redis API key usage flush error: {str(e)}")
+        return updated
+
+    def _flush_local(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            self._write(pending)
+        except Exception:
+            # Put them back for the next flush
+            with self._lock:
+                for key_id, (count, used_at) in pending.items():
+                    current_count, last = self._pending.get(key_id, (0, used_at))
+                    self._pending[key_id] = (current_count + count, max(last, used_at))
+            raise
+        return len(pending)
+
+    def _flush_redis(self, redis_client):
+        interval = self._config('API_KEY_USAGE_FLUSH_INTERVAL', 5)
+        # One flusher at a time across workers
+        token = uuid.uuid4().hex
+        if not redis_client.set(_FLUSH_LOCK, token, nx=True, ex=max(int(interval * 6), 30)):
+            return 0
+        try:
+            if not redis_client.eval(_TAKE_SCRIPT, 4, _COUNTS, _LAST_USED,
+                                     _FLUSHING_COUNTS, _FLUSHING_LAST_USED):
+                return 0
+            counts = redis_client.hgetall(_FLUSHING_COUNTS)
+            last_used = redis_client.hgetall(_FLUSHING_LAST_USED)
+            usage = {}
+            for key_id, count in counts.items():
+                stamp = float(last_used.get(key_id, 0)) or time.time()
+                usage[int(key_id)] = (int(count), datetime.utcfromtimestamp(stamp))
+            self._write(usage)
+            redis_client.delete(_FLUSHING_COUNTS, _FLUSHING_LAST_USED)
+            return len(usage)
+        finally:
+            redis_client.eval(_RELEASE_SCRIPT, 1, _FLUSH_LOCK, token)
+
+    def _write(self, usage):
+        """Add the counters to api_keys in one transaction"""
+        if not usage:
+            return
+        try:
+            db.session.execute(_UPDATE, [
+                {'key_id': key_id, 'count': count, 'used_at': used_at}
+                for key_id, (count, used_at) in sorted(usage.items())])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        metrics.incr('api_key_usage_flushed_total', sum(count for count, _ in usage.values()))
+
+    def _ensure_flusher(self):
+        """Start the flush thread of this process on first use"""
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        # Tests run many apps in one process and flush explicitly
+        if not has_app_context() or current_app.testing:
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # Forked: the parent flushes what it had accumulated
+                self._pending = {}
+            self._app = current_app._get_current_object()
+            self._thread = threading.Thread(target=self._loop, name='api-key-usage', daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+            atexit.register(self.close)
+
+    def _loop(self):
+        while True:
+            time.sleep(self._app.config.get('API_KEY_USAGE_FLUSH_INTERVAL', 5))
+            self._flush_in_app()
+
+    def _flush_in_app(self):
+        with self._app.app_context():
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"API key usage flush failed: {str(e)}")
+            finally:
+                db.session.remove()
+
+    def reset(self):
+        """Drop the in-process counters - FOR TESTING ONLY"""
+        with self._lock:
+            self._pending = {}
+
+    def close(self):
+        """Flush what this process accumulated (on worker exit)"""
+        if self._app is not None and self._pid == os.getpid():
+            self._flush_in_app()
+
+
+# Singleton counters shared by the request handlers in this process
+api_key_usage = APIKeyUsage()
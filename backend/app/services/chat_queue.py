@@ -0,0 +1,327 @@
+import json
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pika
+from flask import current_app, has_app_context
+
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+
+# Job states; a job ends in DONE or FAILED
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class JobStore:
+    """
+    Status and result of chat jobs, shared by web and queue workers.
+
+    Jobs are JSON documents in Redis under chat:job:{id} (expiring after
+    CHAT_JOB_TTL); finishing a job publishes it on the same channel name
+    so waiting clients wake up. Without Redis, a per-process dict is used,
+    which only works with the local queue backend.
+    """
+
+    KEY_PREFIX = 'chat:job:'
+
+    def __init__(self, redis_client=None):
+        self.redis = redis_client
+        self._jobs = {}
+        self._changed = threading.Condition()
+
+    def _config(self, name, default):
+        if has_app_context():
+            return current_app.config.get(name, default)
+        return default
+
+    def _get_redis(self):
+        """Get Redis client from app or use existing one"""
+        if self.redis:
+            return self.redis
+        if has_app_context():
+            return current_app.extensions.get('redis')
+        return None
+
+    def get(self, job_id):
+        redis_client = self._get_redis()
+        if redis_client:
+            try:
+                raw = redis_client.get(self.KEY_PREFIX + job_id)
+                return json.loads(raw) if raw else None
+            except Exception as e:
+                logger.warning(f"Redis job store error: {str(e)}")
+        with self._changed:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def save(self, job):
+        """Store a job document, waking waiters when it is finished"""
+        job['updated_at'] = time.time()
+        redis_client = self._get_redis()
+        if redis_client:
+            try:
+                key = self.KEY_PREFIX + job['id']
+                data = json.dumps(job)
+                pipe = redis_client.pipeline()
+                pipe.set(key, data, ex=int(self._config('CHAT_JOB_TTL', 3600)))
+                if job['status'] in (DONE, FAILED):
+                    pipe.publish(key, data)
+                pipe.execute()
+                return
+            except Exception as e:
+                logger.warning(f"Redis job store error: {str(e)}")
+        with self._changed:
+            self._jobs[job['id']] = dict(job)
+            self._changed.notify_all()
+
+    def update(self, job_id, **fields):
+        job = self.get(job_id) or {'id': job_id}
+        job.update(fields)
+        self.save(job)
+        return job
+
+    def wait(self, job_id, timeout):
+        """The job once finished, or its current state after `timeout` seconds"""
+        redis_client = self._get_redis()
+        if redis_client:
+            try:
+                return self._wait_redis(redis_client, job_id, timeout)
+            except Exception as e:
+                logger.warning(f"Redis job store error: {str(e)}")
+
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while True:
+                job = self._jobs.get(job_id)
+                remaining = deadline - time.monotonic()
+                if job is None or job['status'] in (DONE, FAILED) or remaining <= 0:
+                    return dict(job) if job else None
+                self._changed.wait(remaining)
+
+    def _wait_redis(self, redis_client, job_id, timeout):
+        pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        try:
+            # Subscribe before reading, so a finish in between is not missed
+            pubsub.subscribe(self.KEY_PREFIX + job_id)
+            job = self.get(job_id)
+            deadline = time.monotonic() + timeout
+            while job is not None and job['status'] not in (DONE, FAILED):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                message = pubsub.get_message(timeout=min(remaining, 1.0))
+                if message:
+                    job = json.loads(message['data'])
+            return job
+        finally:
+            pubsub.close()
+
+    def reset(self):
+        """Drop local jobs - FOR TESTING ONLY"""
+        with self._changed:
+            self._jobs.clear()
+
+
+class LocalTransport:
+    """In-process queue drained by worker threads (development and tests)"""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self._queue = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def publish(self, body):
+        self._ensure_workers()
+        self._queue.put((current_app._get_current_object(), body))
+
+    def _ensure_workers(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(current_app.config.get('CHAT_WORKER_CONCURRENCY', 8)):
+                thread = threading.Thread(target=self._consume,
+                                          name=f'chat-job-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _consume(self):
+        while True:
+            app, body = self._queue.get()
+            try:
+                self.handler(app, body)
+            except Exception as e:
+                logger.error(f"Chat job handler error: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    def join(self):
+        """Wait until every queued job was handled - FOR TESTING ONLY"""
+        self._queue.join()
+
+
+class RabbitMQTransport:
+    """
+    Durable RabbitMQ queue (pika).
+
+    Publishing uses one blocking connection per thread, reopened after
+    errors. Consuming happens in chat_worker.py (see ChatJobQueue.consume).
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _channel(self, url, queue_name):
+        channel = getattr(self._local, 'channel', None)
+        if channel is None or channel.is_closed:
+            connection = pika.BlockingConnection(pika.URLParameters(url))
+            channel = connection.channel()
+            channel.queue_declare(queue=queue_name, durable=True)
+            self._local.connection = connection
+            self._local.channel = channel
+        return channel
+
+    def publish(self, body):
+        url = current_app.config['RABBITMQ_URL']
+        queue_name = current_app.config.get('CHAT_QUEUE_NAME', 'chat.jobs')
+        properties = pika.BasicProperties(
+            content_type='application/json', delivery_mode=2)
+        try:
+            self._channel(url, queue_name).basic_publish(
+                exchange='', routing_key=queue_name, body=body, properties=properties)
+        except pika.exceptions.AMQPError:
+            # Stale connection (broker restart, idle timeout): reopen once
+            self._local.channel = None
+            self._channel(url, queue_name).basic_publish(
+                exchange='', routing_key=queue_name, body=body, properties=properties)
+
+
+class ChatJobQueue:
+    """
+    Asynchronous chat jobs.
+
+    The web worker validates the request, persists the user message and
+    enqueues a job (never the decrypted API key); it answers with the job
+    id right away. Queue workers run the LLM call, save the bot Message
+    and finish the job in the JobStore, where clients poll or wait for it.
+    CHAT_QUEUE_BACKEND picks RabbitMQ or an in-process queue.
+    """
+
+    def __init__(self, store=None):
+        self.store = store or JobStore()
+        self._transports = {}
+        self._lock = threading.Lock()
+
+    def _transport(self):
+        backend = current_app.config.get('CHAT_QUEUE_BACKEND', 'rabbitmq')
+        with self._lock:
+            if backend not in self._transports:
+                self._transports[backend] = LocalTransport(self._handle) \
+                    if backend == 'local' else RabbitMQTransport()
+            return self._transports[backend]
+
+    def enqueue(self, user_id, payload):
+        """
+        Queue a chat job.
+
+        Returns:
+            The job document (status queued)
+        """
+        job_id = uuid.uuid4().hex
+        job = self.store.update(job_id, user_id=user_id, status=QUEUED,
+                                conversation_id=payload.get('conversation_id'),
+                                enqueued_at=time.time())
+        try:
+            self._transport().publish(json.dumps(
+                {'id': job_id, 'user_id': user_id, 'payload': payload}))
+        except Exception:
+            self.store.update(job_id, status=FAILED, error='Queue unavailable')
+            raise
+        metrics.incr('chat_jobs_enqueued_total')
+        return job
+
+    def _handle(self, app, body):
+        """Run one job in an app context; returns when it is finished"""
+        job = json.loads(body)
+        with app.app_context():
+            self.process(job)
+
+    def process(self, job):
+        """Execute a job unless a previous delivery already finished it"""
+        job_id = job['id']
+        current = self.store.get(job_id) or {}
+        if current.get('status') in (DONE, FAILED):
+            return current
+
+        if current.get('enqueued_at'):
+            metrics.observe('chat_job_queue_seconds', time.time() - current['enqueued_at'])
+        self.store.update(job_id, status=RUNNING)
+
+        # Imported here: the chat API imports this module to enqueue
+        from app.api.chat import run_chat_job
+
+        start = time.monotonic()
+        try:
+            result = run_chat_job(job['user_id'], job['payload'])
+        except Exception as e:
+            logger.error(f"Chat job {job_id} failed: {str(e)}")
+            metrics.incr('chat_jobs_total', status=FAILED)
+            return self.store.update(job_id, status=FAILED, error=str(e),
+                                     retry_after=getattr(e, 'retry_after', None))
+        finally:
+            metrics.observe('chat_job_seconds', time.monotonic() - start)
+
+        metrics.incr('chat_jobs_total', status=DONE)
+        return self.store.update(job_id, status=DONE, **result)
+
+    def consume(self, app):
+        """
+        Consume jobs from RabbitMQ until interrupted (see chat_worker.py).
+
+        CHAT_WORKER_PREFETCH unacknowledged messages are taken from the
+        broker and run on CHAT_WORKER_CONCURRENCY threads; each message is
+        acknowledged once its job is finished, so jobs of a crashed worker
+        are redelivered.
+        """
+        config = app.config
+        queue_name = config.get('CHAT_QUEUE_NAME', 'chat.jobs')
+        concurrency = config.get('CHAT_WORKER_CONCURRENCY', 8)
+        executor = ThreadPoolExecutor(max_workers=concurrency,
+                                      thread_name_prefix='chat-job')
+
+        connection = pika.BlockingConnection(pika.URLParameters(config['RABBITMQ_URL']))
+        channel = connection.channel()
+        channel.queue_declare(queue=queue_name, durable=True)
+        channel.basic_qos(prefetch_count=config.get('CHAT_WORKER_PREFETCH', concurrency))
+
+        def run(delivery_tag, body):
+            try:
+                self._handle(app, body)
+            except Exception as e:
+                logger.error(f"Chat job handler error: {str(e)}")
+            # pika channels are not thread-safe: ack from the connection's thread
+            connection.add_callback_threadsafe(
+                lambda: channel.basic_ack(delivery_tag=delivery_tag))
+
+        def on_message(channel, method, properties, body):
+            executor.submit(run, method.delivery_tag, body)
+
+        channel.basic_consume(queue=queue_name, on_message_callback=on_message)
+        logger.info(f"Consuming chat jobs from '{queue_name}' with {concurrency} threads")
+        try:
+            channel.start_consuming()
+        except KeyboardInterrupt:
+            channel.stop_consuming()
+        finally:
+            executor.shutdown(wait=True)
+            connection.close()
+
+
+# Singleton chat job queue
+chat_queue = ChatJobQueue()
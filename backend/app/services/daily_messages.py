@@ -0,0 +1,225 @@
+import os
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+
+from flask import current_app, has_app_context
+from sqlalchemy.exc import IntegrityError
+
+from app.models.bible_verse import BibleVerse
+from app.models.daily_message import DailyMessage
+from app.models.database import db, release_connection
+from app.services.llm.adapters import use_mock_llm
+from app.services.llm.deadline import request_deadline
+from app.services.llm.engine import async_engine
+from app.services.llm.providers import LLM_PROVIDERS
+from app.services.llm.scheduler import BACKGROUND
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+
+# Instructions first and unchanged between dates: the provider caches them
+DAILY_MESSAGE_PROMPT = """Você é um assistente espiritual cristão. Escreva a mensagem do dia
+em português, inspirada no versículo abaixo. Use um tom acolhedor e esperançoso, fale
+diretamente ao leitor e não repita o versículo. Responda apenas com a mensagem, com no
+máximo {words} palavras.
+
+DATA: {day}
+
+VERSÍCULO ({reference}):
+{verse}
+"""
+
+# Keep the leadership only while this node still holds it
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+class DailyMessageGenerator:
+    """
+    Generates DailyMessage rows ahead of time, so /daily-messages/today is
+    always served from a precomputed row.
+
+    Every DAILY_MESSAGE_INTERVAL the leader fills each date without a
+    message from DAILY_MESSAGE_BACKFILL_DAYS ago to DAILY_MESSAGE_DAYS_AHEAD
+    days ahead: a verse from bible_verses (picked by date) and a message
+    written by the LLM as background work. Dates that fail are retried on
+    the next run.
+
+    Any number of nodes may run the scheduler; leadership is a Redis key
+    held with a DAILY_MESSAGE_LEADER_TTL lease and renewed on every run, so
+    another node takes over when the leader dies. The unique date column
+    keeps generation idempotent even if two nodes overlap.
+    """
+
+    LEADER_KEY = 'daily_messages:leader'
+
+    def __init__(self, redis_client=None):
+        self.redis = redis_client
+        self.node_id = uuid.uuid4().hex
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _config(self, name, default):
+        if has_app_context():
+            return current_app.config.get(name, default)
+        return default
+
+    def _get_redis(self):
+        """Get Redis client from app or use existing one"""
+        if self.redis:
+            return self.redis
+        if has_app_context():
+            return current_app.extensions.get('redis')
+        return None
+
+    def is_leader(self):
+        """Take or renew the leadership; nodes without Redis always lead"""
+        redis_client = self._get_redis()
+        if not redis_client:
+            return True
+        ttl = int(self._config('DAILY_MESSAGE_LEADER_TTL', 1800))
+        try:
+            if redis_client.set(self.LEADER_KEY, self.node_id, nx=True, ex=ttl):
+                logger.info(f"Node {self.node_id} is the daily message leader")
+                return True
+            return bool(redis_client.eval(_RENEW_SCRIPT, 1, self.LEADER_KEY, self.node_id, ttl))
+        except Exception as e:
+            # Skipping a run is safe: the next one backfills
+            logger.warning(f"Redis daily message leader error: {str(e)}")
+            return False
+
+    def missing_dates(self, today=None):
+        """Dates in the generation window without a DailyMessage, oldest first"""
+        today = today or date.today()
+        first = today - timedelta(days=self._config('DAILY_MESSAGE_BACKFILL_DAYS', 7))
+        last = today + timedelta(days=self._config('DAILY_MESSAGE_DAYS_AHEAD', 7))
+        existing = {row.date for row in db.session.query(DailyMessage.date).filter(
+            DailyMessage.date >= first, DailyMessage.date <= last)}
+        return [first + timedelta(days=i) for i in range((last - first).days + 1)
+                if first + timedelta(days=i) not in existing]
+
+    def pick_verse(self, day, used=()):
+        """
+        The verse for a date: stable for the date, skipping references
+        already used by recent messages.
+        """
+        count = BibleVerse.query.count()
+        if not count:
+            return None
+        query = BibleVerse.query.order_by(BibleVerse.id)
+        verse = None
+        for step in range(min(count, 10)):
+            verse = query.offset((day.toordinal() + step) % count).first()
+            if verse.to_dict()['reference'] not in used:
+                break
+        return verse
+
+    def _service(self):
+        provider = self._config('DAILY_MESSAGE_PROVIDER', 'openai')
+        return LLM_PROVIDERS[provider](api_key=self._config('DAILY_MESSAGE_API_KEY', None))
+
+    def generate(self, day, used=()):
+        """
+        Create the DailyMessage for a date unless one exists.
+
+        Returns:
+            The new DailyMessage, or None if the date already had one
+        """
+        verse = self.pick_verse(day, used)
+        if verse is None:
+            raise ValueError('No verses in bible_verses to build a daily message from')
+        reference = verse.to_dict()['reference']
+
+        prompt = DAILY_MESSAGE_PROMPT.format(
+            day=day.strftime('%d/%m/%Y'), reference=reference, verse=verse.text,
+            words=self._config('DAILY_MESSAGE_MAX_WORDS', 120))
+        release_connection()
+        with request_deadline(self._config('LLM_REQUEST_DEADLINE', 30)):
+            text = async_engine.run(self._service().get_response(
+                prompt, self._config('DAILY_MESSAGE_MODEL', None),
+                {'raw_prompt': True, 'priority': BACKGROUND,
+                 'template': DAILY_MESSAGE_PROMPT, 'template_id': 'daily_message'}))
+
+        message = DailyMessage(message=text.strip(), bible_verse=verse.text[:255],
+                               bible_reference=reference, date=day)
+        db.session.add(message)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another node generated this date meanwhile
+            db.session.rollback()
+            return None
+        return message
+
+    def run_once(self, today=None):
+        """
+        Fill the missing dates if this node is the leader.
+
+        Returns:
+            Number of messages created
+        """
+        if not self.is_leader():
+            return 0
+
+        missing = self.missing_dates(today)
+        metrics.set_gauge('daily_messages_missing', len(missing))
+        if not missing:
+            return 0
+        used = {row.bible_reference for row in db.session.query(DailyMessage.bible_reference)
+                .order_by(DailyMessage.date.desc()).limit(60)}
+
+        created = 0
+        for day in missing:
+            try:
+                message = self.generate(day, used)
+            except Exception as e:
+                db.session.rollback()
+                metrics.incr('daily_messages_generated_total', result='error')
+                logger.error(f"Daily message for {day} failed: {str(e)}")
+                continue
+            if message is not None:
+                created += 1
+                used.add(message.bible_reference)
+                metrics.incr('daily_messages_generated_total', result='created')
+        logger.info(f"Generated {created} of {len(missing)} missing daily messages")
+        return created
+
+    def start(self, app):
+        """Run the scheduler in a daemon thread (once per process)"""
+        if not app.config.get('DAILY_MESSAGE_SCHEDULER_ENABLED', True):
+            return None
+        with app.app_context():
+            mock = use_mock_llm()
+        if not app.config.get('DAILY_MESSAGE_API_KEY') and not mock:
+            logger.warning("Daily message scheduler not started: DAILY_MESSAGE_API_KEY is not set")
+            return None
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return self._thread
+            self._thread = threading.Thread(target=self._loop, args=(app,),
+                                            name='daily-messages', daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+            return self._thread
+
+    def _loop(self, app):
+        while True:
+            with app.app_context():
+                try:
+                    self.run_once()
+                except Exception as e:
+                    logger.error(f"Daily message scheduler error: {str(e)}")
+                finally:
+                    db.session.remove()
+                interval = app.config.get('DAILY_MESSAGE_INTERVAL', 600)
+            time.sleep(interval)
+
+
+# Singleton generator, started by the worker processes
+daily_message_generator = DailyMessageGenerator()
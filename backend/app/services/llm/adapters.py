@@ -0,0 +1,345 @@
+import hashlib
+import json
+from functools import lru_cache
+from string import Formatter
+
+from flask import current_app, has_app_context
+
+# Prompt wrapped around every user message
+DEFAULT_PROMPT_TEMPLATE = """
+Você é um assistente espiritual baseado em ensinamentos bíblicos. Seu objetivo é fornecer
+orientação, conforto e sabedoria inspirada na Bíblia. Por favor, responda à seguinte
+mensagem com uma perspectiva bíblica, citando versículos relevantes quando apropriado:
+
+MENSAGEM DO USUÁRIO: {message}
+"""
+
+SYSTEM_PROMPT = "Você é um assistente espiritual que oferece orientação baseada na Bíblia."
+
+# Capabilities an adapter can declare
+STREAMING = 'streaming'
+BATCHING = 'batching'
+PROMPT_CACHING = 'prompt_caching'
+
+_PROMPT_PREFIX, _PROMPT_SUFFIX = DEFAULT_PROMPT_TEMPLATE.split('{message}')
+
+
+def build_prompt(message):
+    """DEFAULT_PROMPT_TEMPLATE.format(message=message), without re-parsing it"""
+    return _PROMPT_PREFIX + message + _PROMPT_SUFFIX
+
+
+@lru_cache(maxsize=256)
+def template_prefix(template):
+    """Literal text of a template before its first placeholder (same in every prompt)"""
+    prefix = ''
+    try:
+        for literal, field, _, _ in Formatter().parse(template or ''):
+            prefix += literal
+            if field is not None:
+                break
+    except ValueError:
+        return ''
+    return prefix
+
+
+def split_prompt(message, raw=False, cache_prefix=''):
+    """
+    Split the prompt sent for `message` into (stable prefix, variable suffix).
+
+    The prefix is DEFAULT_PROMPT_TEMPLATE's preamble (unless raw) followed
+    by `cache_prefix` (see template_prefix) when the message starts with it;
+    prefix + suffix is exactly the prompt that build_prompt sends.
+    """
+    if cache_prefix and not message.startswith(cache_prefix):
+        cache_prefix = ''
+    if raw:
+        return cache_prefix, message[len(cache_prefix):]
+    return _PROMPT_PREFIX + cache_prefix, message[len(cache_prefix):] + _PROMPT_SUFFIX
+
+
+def _prefix_key(prefix):
+    return hashlib.sha256(prefix.encode('utf-8')).hexdigest()[:32]
+
+
+def configured_base_url(provider):
+    """Base URL override from LLM_PROVIDER_BASE_URLS or LLM_BASE_URL, if any"""
+    if not has_app_context():
+        return None
+    config = current_app.config
+    return (config.get('LLM_PROVIDER_BASE_URLS') or {}).get(provider) or \
+        config.get('LLM_BASE_URL')
+
+
+def use_mock_llm():
+    """Whether development mock responses are enabled"""
+    if not has_app_context():
+        return False
+    config = current_app.config
+    return config.get('ENV') == 'development' and config.get('USE_MOCK_LLM', False)
+
+
+class ProviderAdapter:
+    """
+    Wire format of one LLM provider.
+
+    Adapters are stateless and built once: static headers and the payload
+    skeleton are computed up front, so a call only adds the API key, model
+    and prompt. They are shared by the async services (BaseLLMService) and
+    the blocking helpers in llm_service.py.
+    """
+
+    name = None
+    default_model = None
+    # Endpoint is base_url + path; base_url can be overridden through config
+    base_url = None
+    path = None
+    capabilities = frozenset()
+    # Canned development answer (see use_mock_llm)
+    mock_reply = None
+
+    def __init__(self, name=None, base_url=None):
+        if name:
+            self.name = name
+        if base_url:
+            self.base_url = base_url
+        self.url = self.base_url + self.path
+        self.headers = self.static_headers()
+        self.skeleton = self.payload_skeleton()
+
+    def supports(self, capability):
+        return capability in self.capabilities
+
+    def endpoint(self):
+        """Provider URL, honouring a configured base URL"""
+        base_url = configured_base_url(self.name)
+        return base_url.rstrip('/') + self.path if base_url else self.url
+
+    def static_headers(self):
+        """Headers that are the same for every call"""
+        return {"Content-Type": "application/json"}
+
+    def payload_skeleton(self):
+        """Payload fields that are the same for every call"""
+        return {}
+
+    def build_request(self, api_key, model, message, stream=False, url=None, raw=False,
+                      cache_prefix=''):
+        """
+        Return (url, headers, payload) for one call.
+
+        Prompts are sent as a stable prefix then the variable suffix (see
+        split_prompt); adapters with PROMPT_CACHING mark the prefix for the
+        provider's prompt cache.
+
+        Args:
+            url: Endpoint override for this call; defaults to endpoint()
+            raw: Send `message` as the whole prompt, without
+                DEFAULT_PROMPT_TEMPLATE (e.g. internal summarization)
+            cache_prefix: Start of `message` that is the same on every call,
+                e.g. the template_prefix of the template it was formatted with
+        """
+        raise NotImplementedError("Adapters must implement 'build_request'")
+
+    def parse_response(self, result):
+        """Extract the response text from the decoded provider payload"""
+        raise NotImplementedError("Adapters must implement 'parse_response'")
+
+    def prompt_usage(self, result):
+        """(prompt tokens, prompt tokens served from the provider cache), or None"""
+        return None
+
+    def extract_delta(self, event):
+        """Extract the text delta from one decoded streaming event, or None"""
+        raise NotImplementedError("Adapters must implement 'extract_delta'")
+
+    def mock_response(self, message):
+        return f"Resposta simulada para: '{message}'\n\n{self.mock_reply}"
+
+
+class OpenAIAdapter(ProviderAdapter):
+    """OpenAI chat completions"""
+    name = 'openai'
+    default_model = 'gpt-3.5-turbo'
+    base_url = "https://api.openai.com"
+    path = "/v1/chat/completions"
+    capabilities = frozenset([STREAMING, BATCHING, PROMPT_CACHING])
+    mock_reply = "Como diz em João 3:16, 'Porque Deus amou o mundo de tal maneira que deu o seu Filho unigênito, para que todo aquele que nele crê não pereça, mas tenha a vida eterna.'"
+
+    def payload_skeleton(self):
+        return {"temperature": 0.7, "max_tokens": 800}
+
+    def build_request(self, api_key, model, message, stream=False, url=None, raw=False,
+                      cache_prefix=''):
+        headers = dict(self.headers)
+        headers["Authorization"] = f"Bearer {api_key}"
+        data = dict(self.skeleton)
+        data["model"] = model
+        prefix, suffix = split_prompt(message, raw, cache_prefix)
+        data["messages"] = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prefix + suffix}
+        ]
+        if prefix and self.supports(PROMPT_CACHING):
+            # Prefix caching is automatic; the key routes calls sharing the
+            # prefix to the same cache
+            data["prompt_cache_key"] = _prefix_key(SYSTEM_PROMPT + prefix)
+        if stream:
+            data["stream"] = True
+        return url or self.endpoint(), headers, data
+
+    def parse_response(self, result):
+        return result["choices"][0]["message"]["content"].strip()
+
+    def prompt_usage(self, result):
+        usage = result.get("usage") or {}
+        if "prompt_tokens" not in usage:
+            return None
+        details = usage.get("prompt_tokens_details") or {}
+        return usage["prompt_tokens"], details.get("cached_tokens") or 0
+
+    def extract_delta(self, event):
+        choices = event.get("choices") or []
+        if choices:
+            return (choices[0].get("delta") or {}).get("content")
+        return None
+
+
+class AnthropicAdapter(ProviderAdapter):
+    """Anthropic Claude messages"""
+    name = 'anthropic'
+    default_model = 'claude-3-haiku-20240307'
+    base_url = "https://api.anthropic.com"
+    path = "/v1/messages"
+    capabilities = frozenset([STREAMING, BATCHING, PROMPT_CACHING])
+    mock_reply = "Como diz em Salmos 23:1, 'O Senhor é o meu pastor, nada me faltará.'"
+
+    def static_headers(self):
+        return {
+            "Content-Type": "application/json",
+            "anthropic-version": "2023-06-01"
+        }
+
+    def payload_skeleton(self):
+        return {"max_tokens": 800}
+
+    def build_request(self, api_key, model, message, stream=False, url=None, raw=False,
+                      cache_prefix=''):
+        headers = dict(self.headers)
+        headers["x-api-key"] = api_key
+        data = dict(self.skeleton)
+        data["model"] = model
+        prefix, suffix = split_prompt(message, raw, cache_prefix)
+        if prefix:
+            # Cache breakpoint after the stable prefix
+            content = [
+                {"type": "text", "text": prefix, "cache_control": {"type": "ephemeral"}},
+                {"type": "text", "text": suffix}
+            ]
+        else:
+            content = suffix
+        data["messages"] = [{"role": "user", "content": content}]
+        if stream:
+            data["stream"] = True
+        return url or self.endpoint(), headers, data
+
+    def parse_response(self, result):
+        return result["content"][0]["text"].strip()
+
+    def prompt_usage(self, result):
+        usage = result.get("usage") or {}
+        if "input_tokens" not in usage:
+            return None
+        # input_tokens only counts what came after the last cache breakpoint
+        cached = usage.get("cache_read_input_tokens") or 0
+        written = usage.get("cache_creation_input_tokens") or 0
+        return usage["input_tokens"] + cached + written, cached
+
+    def extract_delta(self, event):
+        if event.get("type") == "content_block_delta":
+            return (event.get("delta") or {}).get("text")
+        return None
+
+
+class GoogleAdapter(ProviderAdapter):
+    """Google Gemini generateContent"""
+    name = 'google'
+    default_model = 'gemini-pro'
+    base_url = "https://generativelanguage.googleapis.com"
+    path = "/v1beta/models"
+    capabilities = frozenset([STREAMING, BATCHING, PROMPT_CACHING])
+    mock_reply = "Como diz em Provérbios 3:5-6, 'Confia no Senhor de todo o teu coração e não te estribes no teu próprio entendimento. Reconhece-o em todos os teus caminhos, e ele endireitará as tuas veredas.'"
+
+    def payload_skeleton(self):
+        return {"generationConfig": {"temperature": 0.7, "maxOutputTokens": 800}}
+
+    def build_request(self, api_key, model, message, stream=False, url=None, raw=False,
+                      cache_prefix=''):
+        method = "streamGenerateContent?alt=sse&" if stream else "generateContent?"
+        data = dict(self.skeleton)
+        # Implicit caching matches on the prefix: stable part first
+        prefix, suffix = split_prompt(message, raw, cache_prefix)
+        parts = [{"text": prefix}, {"text": suffix}] if prefix else [{"text": suffix}]
+        data["contents"] = [{"role": "user", "parts": parts}]
+        return f"{url or self.endpoint()}/{model}:{method}key={api_key}", self.headers, data
+
+    def parse_response(self, result):
+        return result["candidates"][0]["content"]["parts"][0]["text"].strip()
+
+    def prompt_usage(self, result):
+        usage = result.get("usageMetadata") or {}
+        if "promptTokenCount" not in usage:
+            return None
+        return usage["promptTokenCount"], usage.get("cachedContentTokenCount") or 0
+
+    def extract_delta(self, event):
+        candidates = event.get("candidates") or []
+        if candidates:
+            parts = (candidates[0].get("content") or {}).get("parts") or []
+            return "".join(part.get("text", "") for part in parts)
+        return None
+
+
+class MistralAdapter(OpenAIAdapter):
+    """Mistral AI chat completions (OpenAI-compatible format)"""
+    name = 'mistral'
+    default_model = 'mistral-medium'
+    base_url = "https://api.mistral.ai"
+    capabilities = frozenset([STREAMING, BATCHING])
+    mock_reply = "Como diz em Mateus 11:28, 'Vinde a mim, todos os que estais cansados e oprimidos, e eu vos aliviarei.'"
+
+
+class GenericAdapter(OpenAIAdapter):
+    """Fallback for other providers, assuming the OpenAI format"""
+    name = 'generic'
+    default_model = None
+    capabilities = frozenset([STREAMING])
+    mock_reply = "Como diz em Filipenses 4:13, 'Posso todas as coisas naquele que me fortalece.'"
+
+    def __init__(self, name=None, base_url=None):
+        name = name or self.name
+        super().__init__(name=name, base_url=base_url or f"https://api.{name}.com")
+
+    def parse_response(self, result):
+        choices = result.get("choices") or []
+        if choices and "message" in choices[0]:
+            return choices[0]["message"]["content"].strip()
+
+        # Fallback to returning the entire response as string
+        return json.dumps(result)
+
+
+# Registry of adapters by provider name
+ADAPTERS = {
+    adapter.name: adapter for adapter in (
+        OpenAIAdapter(), AnthropicAdapter(), GoogleAdapter(),
+        MistralAdapter(), GenericAdapter())
+}
+
+
+def get_adapter(provider):
+    """Adapter for a provider; unknown providers get a cached generic one"""
+    adapter = ADAPTERS.get(provider)
+    if adapter is None:
+        adapter = ADAPTERS.setdefault(provider, GenericAdapter(provider))
+    return adapter
@@ -1,18 +1,140 @@
+import time
+
+from app.services.llm.adapters import get_adapter, template_prefix, use_mock_llm
+from app.services.llm.breaker import circuit_breaker
+from app.services.llm.bulkhead import bulkhead
+from app.services.llm.cache import ResponseCache
+from app.services.llm.engine import async_engine
+from app.services.llm.hedging import provider_latency
+from app.services.llm.retry import retry_policy
+from app.services.llm.scheduler import INTERACTIVE, llm_scheduler
+from app.services.llm.singleflight import single_flight
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+
+
 class BaseLLMService:
     """Base class for all LLM service implementations."""
 
-    def __init__(self, api_key=None, cache=None):
+    # Provider name and model used when the caller does not pick one
+    provider = None
+    default_model = None
+    # Endpoint override; None uses the adapter's URL
+    url = None
+
+    def __init__(self, api_key=None, cache=None, api_key_id=None):
         self.api_key = api_key
         self.cache = cache
+        # Wire format, shared by every service of the same provider
+        self.adapter = get_adapter(self.provider)
+        # APIKey.id, used to key the per-key circuit breaker
+        self.api_key_id = api_key_id
         self._initialize()
 
     def _initialize(self):
         """Initialize the service. Should be implemented by subclasses."""
         pass
 
-    def get_response(self, message, model=None, options=None):
-        """Get a response from the LLM."""
-        raise NotImplementedError("Subclasses must implement 'get_response'")
+    async def get_response(self, message, model=None, options=None):
+        """
+        Get a response from the LLM.
+
+        The HTTP call runs on the shared async engine, so awaiting it does not
+        hold a thread or a socket per in-flight request.
+
+        Options:
+            template: Template text, part of the cache key; its literal head is
+                sent as the provider-cached prompt prefix
+            template_id: Label of the template in the prompt cache metrics
+            regenerate: Skip the cache lookup and request coalescing (the new
+                answer is still stored)
+            raw_prompt: Send the message as is, without the default template
+            priority: Scheduler class, 'interactive' (default) or 'background'
+        """
+        options = options or {}
+        model = model or self.default_model
+        mock = self.mock_response(message, model)
+        if mock is not None:
+            return mock
+
+        # Serve identical prompts from the response cache unless regenerating
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(
+                self.provider, model, message, options.get('template'))
+            if not options.get('regenerate'):
+                cached = await self.cache.aget(cache_key)
+                if cached is not None:
+                    return cached
+
+        async def attempt(url, headers, data):
+            ticket = await circuit_breaker.abefore_call(self.provider, self.api_key_id)
+            try:
+                async with llm_scheduler.acquire(options.get('priority', INTERACTIVE)), \
+                        bulkhead.acquire(self.provider, model):
+                    # Latency is measured from the moment a slot is held, so
+                    # scheduler and bulkhead queueing is not counted as upstream latency
+                    start = time.monotonic()
+                    try:
+                        result = await async_engine.post_json(self.provider, url, headers, data)
+                    except Exception as e:
+                        await circuit_breaker.aafter_call(
+                            ticket, self.provider, self.api_key_id, error=e)
+                        raise
+            except BaseException:
+                # No slot, cancelled while queued or in flight (hedge loser,
+                # deadline), or an error that settles no probe: free the probes
+                circuit_breaker.release(ticket)
+                raise
+            await circuit_breaker.aafter_call(ticket, self.provider, self.api_key_id)
+            latency = time.monotonic() - start
+            provider_latency.record(self.provider, latency)
+            return result, latency
+
+        async def call():
+            url, headers, data = self.build_request(message, model, options)
+            result, latency = await retry_policy.acall(
+                self.provider, lambda: attempt(url, headers, data))
+            response = self.parse_response(result)
+            self._record_prompt_usage(result, options)
+
+            if cache_key is not None:
+                await self.cache.aset(cache_key, response, latency)
+            return response
+
+        # Identical concurrent prompts share one upstream call
+        if options.get('regenerate') or not single_flight.enabled:
+            return await call()
+        return await single_flight.do(cache_key or ResponseCache.make_key(
+            self.provider, model, message, options.get('template')), call)
+
+    def build_request(self, message, model, options=None):
+        """Return (url, headers, payload) for a provider call."""
+        options = options or {}
+        return self.adapter.build_request(
+            self.api_key, model, message, url=self.url,
+            raw=options.get('raw_prompt', False),
+            cache_prefix=template_prefix(options.get('template')))
+
+    def _record_prompt_usage(self, result, options):
+        """Count prompt tokens, and those the provider served from its cache, per template"""
+        usage = self.adapter.prompt_usage(result)
+        if usage is None:
+            return
+        prompt_tokens, cached_tokens = usage
+        template = str(options.get('template_id') or 'default')
+        metrics.incr('llm_prompt_tokens_total', prompt_tokens,
+                     provider=self.provider, template=template)
+        metrics.incr('llm_prompt_cached_tokens_total', cached_tokens,
+                     provider=self.provider, template=template)
+
+    def parse_response(self, result):
+        """Extract the response text from the decoded provider payload."""
+        return self.adapter.parse_response(result)
+
+    def mock_response(self, message, model):
+        """Canned response for development mode, or None to call the API."""
+        return self.adapter.mock_response(message) if use_mock_llm() else None
 
     def format_prompt(self, message, template=None, context=None):
         """
@@ -0,0 +1,310 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from functools import partial
+
+import redis
+from flask import current_app, has_app_context
+
+from app.services.llm.errors import (
+    CircuitOpenError, LLMProviderError, ProviderUnavailableError)
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Statuses that only say something about the API key, not the provider
+_KEY_ONLY_STATUSES = (401, 403, 429)
+
+
+class _LocalStore:
+    """In-process breaker state, used without Redis or when it is down"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._failures = {}
+        self._open_until = {}
+        self._tripped = set()
+        self._probe_until = {}
+
+    def state(self, name):
+        """Return (state, seconds until the open circuit may be probed)"""
+        with self._lock:
+            remaining = self._open_until.get(name, 0) - time.monotonic()
+            if remaining > 0:
+                return OPEN, remaining
+            return (HALF_OPEN if name in self._tripped else CLOSED), 0
+
+    def try_probe(self, name, ttl):
+        now = time.monotonic()
+        with self._lock:
+            if self._probe_until.get(name, 0) > now:
+                return False
+            self._probe_until[name] = now + ttl
+            return True
+
+    def release_probe(self, name):
+        with self._lock:
+            self._probe_until.pop(name, None)
+
+    def add_failure(self, name, window):
+        now = time.monotonic()
+        with self._lock:
+            failures = self._failures.setdefault(name, deque())
+            failures.append(now)
+            while failures and failures[0] < now - window:
+                failures.popleft()
+            return len(failures)
+
+    def open(self, name, reset_timeout):
+        """Open the circuit; return False if it was already open"""
+        now = time.monotonic()
+        with self._lock:
+            was_open = self._open_until.get(name, 0) > now
+            self._open_until[name] = now + reset_timeout
+            self._tripped.add(name)
+            self._failures.pop(name, None)
+            self._probe_until.pop(name, None)
+            return not was_open
+
+    def close(self, name):
+        with self._lock:
+            self._open_until.pop(name, None)
+            self._tripped.discard(name)
+            self._failures.pop(name, None)
+            self._probe_until.pop(name, None)
+
+
+class _RedisStore:
+    """
+    Breaker state shared by all workers.
+
+    `open` holds the circuit open until its TTL expires; `tripped` survives
+    it, so an expired `open` key means half-open. Failures are counted in a
+    key that expires once no failure was seen for a whole window.
+    """
+
+    KEY_PREFIX = 'llm:breaker:'
+
+    def __init__(self, client):
+        self.client = client
+
+    def _key(self, name, part):
+        return f"{self.KEY_PREFIX}{name}:{part}"
+
+    def state(self, name):
+        pipe = self.client.pipeline()
+        pipe.pttl(self._key(name, 'open'))
+        pipe.exists(self._key(name, 'tripped'))
+        open_ttl, tripped = pipe.execute()
+        if open_ttl and open_ttl > 0:
+            return OPEN, open_ttl / 1000
+        return (HALF_OPEN if tripped else CLOSED), 0
+
+    def try_probe(self, name, ttl):
+        return bool(self.client.set(self._key(name, 'probe'), 1,
+                                    nx=True, px=int(ttl * 1000)))
+
+    def release_probe(self, name):
+        self.client.delete(self._key(name, 'probe'))
+
+    def add_failure(self, name, window):
+        pipe = self.client.pipeline()
+        pipe.incr(self._key(name, 'failures'))
+        pipe.expire(self._key(name, 'failures'), int(window))
+        return pipe.execute()[0]
+
+    def open(self, name, reset_timeout):
+        pipe = self.client.pipeline()
+        pipe.set(self._key(name, 'open'), 1, px=int(reset_timeout * 1000))
+        pipe.getset(self._key(name, 'tripped'), 1)
+        pipe.expire(self._key(name, 'tripped'), 86400)
+        pipe.delete(self._key(name, 'failures'), self._key(name, 'probe'))
+        results = pipe.execute()
+        # Only the worker that tripped a closed circuit reports the transition
+        return results[1] is None
+
+    def close(self, name):
+        self.client.delete(*[self._key(name, part) for part in
+                             ('open', 'tripped', 'failures', 'probe')])
+
+
+class CircuitBreaker:
+    """
+    Circuit breakers per provider and per API key.
+
+    Every upstream call passes two breakers: the provider's (outages) and
+    the API key's (revoked, exhausted or rate-limited keys). After
+    LLM_BREAKER_FAILURE_THRESHOLD failures within LLM_BREAKER_WINDOW a
+    breaker opens and calls fail fast with CircuitOpenError for
+    LLM_BREAKER_RESET_TIMEOUT seconds. Then one probe call is let through
+    (half-open): success closes the circuit, failure opens it again.
+
+    State lives in Redis so all workers see an outage at once; if Redis is
+    unavailable the in-process state is used instead.
+    """
+
+    def __init__(self, redis_client=None):
+        self.redis = redis_client
+        self._local = _LocalStore()
+
+    def _get_redis(self):
+        """Get Redis client from app or use existing one"""
+        if self.redis:
+            return self.redis
+        if has_app_context():
+            return current_app.extensions.get('redis')
+        return None
+
+    def settings(self):
+        """Snapshot of the breaker config (usable off the request thread)"""
+        config = current_app.config if has_app_context() else {}
+        return {
+            'enabled': config.get('LLM_BREAKER_ENABLED', True),
+            'failure_threshold': config.get('LLM_BREAKER_FAILURE_THRESHOLD', 5),
+            'window': config.get('LLM_BREAKER_WINDOW', 30),
+            'reset_timeout': config.get('LLM_BREAKER_RESET_TIMEOUT', 30),
+            'probe_timeout': config.get('LLM_BREAKER_PROBE_TIMEOUT', 35),
+            'redis': self._get_redis()
+        }
+
+    @staticmethod
+    def names(provider, api_key_id=None):
+        """Breakers guarding a call: the provider's, then the API key's"""
+        names = [provider]
+        if api_key_id is not None:
+            names.append(f"{provider}:key:{api_key_id}")
+        return names
+
+    def _run(self, settings, operation, name, *args):
+        """Run a store operation on Redis, falling back to the local state"""
+        client = settings['redis']
+        if client:
+            try:
+                return getattr(_RedisStore(client), operation)(name, *args)
+            except redis.exceptions.RedisError as e:
+                logger.warning(f"Circuit breaker Redis error, using local state: {str(e)}")
+        return getattr(self._local, operation)(name, *args)
+
+    def _transition(self, name, old, new):
+        logger.warning(f"Circuit breaker {name}: {old} -> {new}")
+        metrics.incr('llm_breaker_transitions_total',
+                     breaker=name, **{'from': old, 'to': new})
+        metrics.set_gauge('llm_breaker_state', _STATE_VALUES[new], breaker=name)
+
+    def before_call(self, provider, api_key_id=None, settings=None):
+        """
+        Check the breakers before an upstream call.
+
+        Returns:
+            Ticket to pass to after_call, recording which breakers are probing
+
+        Raises:
+            CircuitOpenError: a breaker is open (or half-open with a probe
+                already in flight)
+        """
+        settings = settings or self.settings()
+        ticket = {'settings': settings, 'probes': []}
+        if not settings['enabled']:
+            return ticket
+
+        for name in self.names(provider, api_key_id):
+            state, retry_after = self._run(settings, 'state', name)
+            if state == HALF_OPEN and \
+                    not self._run(settings, 'try_probe', name, settings['probe_timeout']):
+                state, retry_after = OPEN, settings['probe_timeout']
+            if state == OPEN:
+                # The key's breaker refused: give back the provider probe taken
+                self.release(ticket)
+                metrics.incr('llm_breaker_rejected_total', breaker=name)
+                raise CircuitOpenError(name, retry_after)
+            if state == HALF_OPEN:
+                self._transition(name, OPEN, HALF_OPEN)
+                ticket['probes'].append(name)
+        return ticket
+
+    def check(self, provider, api_key_id=None):
+        """Raise CircuitOpenError if a breaker is open, without probing"""
+        settings = self.settings()
+        if not settings['enabled']:
+            return
+        for name in self.names(provider, api_key_id):
+            state, retry_after = self._run(settings, 'state', name)
+            if state == OPEN:
+                raise CircuitOpenError(name, retry_after)
+
+    def after_call(self, ticket, provider, api_key_id=None, error=None):
+        """Record the outcome of a call admitted by before_call"""
+        settings = ticket['settings']
+        if not settings['enabled']:
+            return
+
+        if error is None:
+            for name in ticket['probes']:
+                self._run(settings, 'close', name)
+                self._transition(name, HALF_OPEN, CLOSED)
+            return
+
+        for name in self._failed_breakers(provider, api_key_id, error):
+            if name in ticket['probes']:
+                self._run(settings, 'open', name, settings['reset_timeout'])
+                self._transition(name, HALF_OPEN, OPEN)
+                continue
+            failures = self._run(settings, 'add_failure', name, settings['window'])
+            if failures >= settings['failure_threshold'] and \
+                    self._run(settings, 'open', name, settings['reset_timeout']):
+                self._transition(name, CLOSED, OPEN)
+
+    def release(self, ticket):
+        """
+        Give back the probe slots of a call that ended without an outcome
+        (client gone, task cancelled), so the next call can probe at once
+        instead of waiting for LLM_BREAKER_PROBE_TIMEOUT.
+        """
+        settings = ticket['settings']
+        for name in ticket['probes']:
+            self._run(settings, 'release_probe', name)
+
+    def _failed_breakers(self, provider, api_key_id, error):
+        """Breakers an error counts against (client errors count for none)"""
+        if isinstance(error, ProviderUnavailableError) or not isinstance(error, LLMProviderError):
+            return []
+        names = self.names(provider, api_key_id)
+        status = error.status_code
+        if status is None or status >= 500:
+            return names
+        if status in _KEY_ONLY_STATUSES:
+            return names[1:]
+        return []
+
+    async def abefore_call(self, provider, api_key_id=None):
+        """before_call for coroutines; Redis round trips run off the loop"""
+        settings = self.settings()
+        if not settings['redis']:
+            return self.before_call(provider, api_key_id, settings)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, partial(
+            self.before_call, provider, api_key_id, settings))
+
+    async def aafter_call(self, ticket, provider, api_key_id=None, error=None):
+        """after_call for coroutines; Redis round trips run off the loop"""
+        if error is None and not ticket['probes']:
+            return
+        if not ticket['settings']['redis']:
+            return self.after_call(ticket, provider, api_key_id, error)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, partial(
+            self.after_call, ticket, provider, api_key_id, error))
+
+    def reset(self):
+        """Clear the in-process state - FOR TESTING ONLY"""
+        self._local = _LocalStore()
+
+
+# Singleton breaker registry shared by all provider calls in this process
+circuit_breaker = CircuitBreaker()
@@ -0,0 +1,246 @@
+import asyncio
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from functools import partial
+
+import redis
+from flask import current_app, has_app_context
+
+from app.services.llm.deadline import remaining_time
+from app.services.llm.errors import BulkheadFullError
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+
+# Drop expired leases (crashed holders), then take a slot if one is free
+_ACQUIRE_SCRIPT = """
+redis.call('zremrangebyscore', KEYS[1], '-inf', ARGV[1])
+if redis.call('zcard', KEYS[1]) < tonumber(ARGV[2]) then
+    redis.call('zadd', KEYS[1], ARGV[3], ARGV[4])
+    redis.call('pexpire', KEYS[1], ARGV[5])
+    return 1
+end
+return 0
+"""
+
+# Polling interval bounds while queued for a slot
+_MIN_POLL = 0.01
+_MAX_POLL = 0.1
+
+
+class _Lease:
+    """A held slot; `redis` is None for slots taken from the local semaphore"""
+
+    def __init__(self, name, token, redis_client, ttl):
+        self.name = name
+        self.token = token
+        self.redis = redis_client
+        self.ttl = ttl
+        self.renewed_at = time.monotonic()
+
+    def renew(self):
+        """Push the lease expiry back (long streams); cheap to call often"""
+        if self.redis is None or time.monotonic() - self.renewed_at < self.ttl / 2:
+            return
+        try:
+            self.redis.zadd(Bulkhead.KEY_PREFIX + self.name,
+                            {self.token: time.time() + self.ttl}, xx=True)
+            self.renewed_at = time.monotonic()
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Bulkhead lease renewal failed: {str(e)}")
+
+
+class Bulkhead:
+    """
+    Cluster-wide concurrency limits per provider and model.
+
+    Each provider:model has a semaphore of LLM_CONCURRENCY_LIMITS slots
+    (falling back to the provider's entry, then LLM_CONCURRENCY_DEFAULT_LIMIT).
+    Slots are leases in a Redis sorted set scored by expiry, so a worker that
+    dies while holding one frees it after LLM_CONCURRENCY_LEASE_TTL.
+
+    Calls over the limit queue for up to LLM_CONCURRENCY_QUEUE_TIMEOUT and
+    then fail with BulkheadFullError. While this worker alone already holds
+    `limit` slots, waiters do not ask Redis (local fast path); without Redis
+    the limit is enforced per worker.
+    """
+
+    KEY_PREFIX = 'llm:bulkhead:'
+
+    def __init__(self, redis_client=None):
+        self.redis = redis_client
+        self._local = {}
+        self._lock = threading.Lock()
+
+    def _get_redis(self):
+        """Get Redis client from app or use existing one"""
+        if self.redis:
+            return self.redis
+        if has_app_context():
+            return current_app.extensions.get('redis')
+        return None
+
+    def settings(self, provider, model):
+        """Resolve the limit and timeouts for a provider/model"""
+        config = current_app.config if has_app_context() else {}
+        limits = config.get('LLM_CONCURRENCY_LIMITS') or {}
+        limit = limits.get(f"{provider}:{model}", limits.get(
+            provider, config.get('LLM_CONCURRENCY_DEFAULT_LIMIT', 0)))
+        return {
+            'name': f"{provider}:{model}",
+            'limit': int(limit or 0),
+            'lease_ttl': config.get('LLM_CONCURRENCY_LEASE_TTL', 60),
+            'queue_timeout': config.get('LLM_CONCURRENCY_QUEUE_TIMEOUT', 5),
+            'redis': self._get_redis()
+        }
+
+    def in_flight(self, name):
+        """Slots held by this worker"""
+        with self._lock:
+            return len(self._local.get(name, ()))
+
+    def _try_acquire(self, settings):
+        """One attempt at a slot; returns a _Lease or None"""
+        name, limit = settings['name'], settings['limit']
+        token = uuid.uuid4().hex
+        with self._lock:
+            holders = self._local.setdefault(name, set())
+            if len(holders) >= limit:
+                return None
+            # Reserve locally first, so concurrent local attempts cannot overshoot
+            holders.add(token)
+
+        client = settings['redis']
+        if client:
+            try:
+                ttl = settings['lease_ttl']
+                now = time.time()
+                if client.eval(_ACQUIRE_SCRIPT, 1, self.KEY_PREFIX + name, now, limit,
+                               now + ttl, token, int(ttl * 1000) * 2):
+                    return self._taken(name, _Lease(name, token, client, ttl))
+            except redis.exceptions.RedisError as e:
+                logger.warning(f"Bulkhead Redis error, using local limit: {str(e)}")
+                return self._taken(name, _Lease(name, token, None, None))
+            self._discard(name, token)
+            return None
+        return self._taken(name, _Lease(name, token, None, None))
+
+    def _taken(self, name, lease):
+        metrics.set_gauge('llm_bulkhead_in_flight', self.in_flight(name), bulkhead=name)
+        return lease
+
+    def _discard(self, name, token):
+        with self._lock:
+            self._local.get(name, set()).discard(token)
+
+    def _release(self, lease):
+        self._discard(lease.name, lease.token)
+        metrics.set_gauge('llm_bulkhead_in_flight', self.in_flight(lease.name),
+                          bulkhead=lease.name)
+        if lease.redis is not None:
+            try:
+                lease.redis.zrem(self.KEY_PREFIX + lease.name, lease.token)
+            except redis.exceptions.RedisError as e:
+                # The lease expires on its own
+                logger.warning(f"Bulkhead release failed: {str(e)}")
+
+    def _timeout(self, settings):
+        """Seconds a call may queue: the queue timeout, within the request deadline"""
+        timeout = settings['queue_timeout']
+        remaining = remaining_time()
+        if remaining is not None:
+            timeout = min(timeout, max(remaining, 0.0))
+        return timeout
+
+    def _queued(self, settings, waited, lease):
+        """Record the queue wait (separate from upstream latency)"""
+        metrics.observe('llm_bulkhead_queue_wait_seconds', waited,
+                        bulkhead=settings['name'])
+        if lease is None:
+            metrics.incr('llm_bulkhead_rejected_total', bulkhead=settings['name'])
+            raise BulkheadFullError(settings['name'], settings['queue_timeout'])
+        return lease
+
+    @contextmanager
+    def hold(self, provider, model):
+        """Hold a slot around a blocking upstream call"""
+        settings = self.settings(provider, model)
+        if settings['limit'] <= 0:
+            yield None
+            return
+
+        start = time.monotonic()
+        deadline = start + self._timeout(settings)
+        poll = _MIN_POLL
+        lease = self._try_acquire(settings)
+        while lease is None and time.monotonic() + poll < deadline:
+            time.sleep(poll)
+            poll = min(poll * 2, _MAX_POLL)
+            lease = self._try_acquire(settings)
+        lease = self._queued(settings, time.monotonic() - start, lease)
+
+        try:
+            yield lease
+        finally:
+            self._release(lease)
+
+    @asynccontextmanager
+    async def acquire(self, provider, model):
+        """Hold a slot around an awaited upstream call"""
+        settings = self.settings(provider, model)
+        if settings['limit'] <= 0:
+            yield None
+            return
+
+        loop = asyncio.get_running_loop()
+        run = loop.run_in_executor if settings['redis'] else _run_inline
+        start = time.monotonic()
+        deadline = start + self._timeout(settings)
+        poll = _MIN_POLL
+        lease = await self._attempt(loop, settings)
+        while lease is None and time.monotonic() + poll < deadline:
+            await asyncio.sleep(poll)
+            poll = min(poll * 2, _MAX_POLL)
+            lease = await self._attempt(loop, settings)
+        lease = self._queued(settings, time.monotonic() - start, lease)
+
+        try:
+            yield lease
+        finally:
+            await run(None, self._release, lease)
+
+    async def _attempt(self, loop, settings):
+        """
+        _try_acquire, off the loop when it talks to Redis. The attempt is
+        shielded: if the caller is cancelled (hedge loser, deadline) while it
+        runs, a slot it still gets is released instead of leaking.
+        """
+        if not settings['redis']:
+            return self._try_acquire(settings)
+        attempt = loop.run_in_executor(None, self._try_acquire, settings)
+        try:
+            return await asyncio.shield(attempt)
+        except asyncio.CancelledError:
+            attempt.add_done_callback(partial(self._release_abandoned, loop))
+            raise
+
+    def _release_abandoned(self, loop, attempt):
+        if attempt.cancelled() or attempt.exception() is not None:
+            return
+        lease = attempt.result()
+        if lease is not None:
+            loop.run_in_executor(None, self._release, lease)
+
+    def reset(self):
+        """Forget local slots - FOR TESTING ONLY"""
+        with self._lock:
+            self._local.clear()
+
+
+async def _run_inline(executor, func, *args):
+    return func(*args)
+
+
+# Singleton bulkhead registry shared by all provider calls in this process
+bulkhead = Bulkhead()
@@ -0,0 +1,173 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import redis
+from flask import current_app, has_app_context
+
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+
+
+def normalize_prompt(prompt):
+    """Normalize a prompt so trivially different spellings share a cache key"""
+    prompt = unicodedata.normalize('NFKC', prompt or '')
+    return ' '.join(prompt.split()).lower()
+
+
+class ResponseCache:
+    """
+    Exact-match LLM response cache.
+
+    Two tiers: a bounded in-process LRU and a shared Redis tier
+    (app.extensions['redis']). Entries remember how long the upstream call
+    took, so each hit can be counted as latency saved.
+    """
+
+    KEY_PREFIX = 'llm:cache:'
+
+    def __init__(self, redis_client=None):
+        self.redis = redis_client
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _config(self, name, default):
+        if has_app_context():
+            return current_app.config.get(name, default)
+        return default
+
+    def _get_redis(self):
+        """Get Redis client from app or use existing one"""
+        if self.redis:
+            return self.redis
+        if has_app_context():
+            return current_app.extensions.get('redis')
+        return None
+
+    @property
+    def enabled(self):
+        return self._config('LLM_CACHE_ENABLED', True)
+
+    @staticmethod
+    def make_key(provider, model, prompt, template=None):
+        """Build the cache key from provider, model, prompt and template"""
+        template_hash = hashlib.sha256(
+            (template or '').encode('utf-8')).hexdigest()
+        raw = '\x1f'.join([
+            (provider or '').lower(),
+            model or '',
+            normalize_prompt(prompt),
+            template_hash
+        ])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Look a response up in the local tier, then in Redis"""
+        entry = self._get_local(key)
+        tier = 'local'
+        if entry is None:
+            entry = self._get_redis_entry(key, self._get_redis())
+            tier = 'redis'
+            if entry is not None:
+                self._set_local(key, entry)
+
+        return self._record_lookup(entry, tier)
+
+    async def aget(self, key):
+        """Async lookup; the Redis round trip runs off the event loop"""
+        entry = self._get_local(key)
+        tier = 'local'
+        if entry is None:
+            loop = asyncio.get_running_loop()
+            entry = await loop.run_in_executor(
+                None, self._get_redis_entry, key, self._get_redis())
+            tier = 'redis'
+            if entry is not None:
+                self._set_local(key, entry)
+
+        return self._record_lookup(entry, tier)
+
+    def set(self, key, response, latency):
+        """Store a response and the upstream latency it took to produce"""
+        entry = {'response': response, 'latency': latency}
+        self._set_local(key, entry)
+        self._set_redis_entry(key, entry, self._get_redis(),
+                              self._config('LLM_CACHE_TTL', 3600))
+
+    async def aset(self, key, response, latency):
+        """Async store; the Redis write runs off the event loop"""
+        entry = {'response': response, 'latency': latency}
+        self._set_local(key, entry)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._set_redis_entry, key, entry,
+                                   self._get_redis(), self._config('LLM_CACHE_TTL', 3600))
+
+    def clear(self):
+        """Clear the local tier"""
+        with self._lock:
+            self._local.clear()
+
+    def _record_lookup(self, entry, tier):
+        if entry is None:
+            metrics.incr('llm_cache_misses_total')
+            return None
+
+        metrics.incr('llm_cache_hits_total', tier=tier)
+        metrics.incr('llm_cache_latency_saved_seconds_total',
+                     entry.get('latency', 0))
+        return entry['response']
+
+    def _get_local(self, key):
+        with self._lock:
+            item = self._local.get(key)
+            if item is None:
+                return None
+            expires_at, entry = item
+            if expires_at < time.monotonic():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            return entry
+
+    def _set_local(self, key, entry):
+        ttl = self._config('LLM_CACHE_LOCAL_TTL', 300)
+        max_entries = self._config('LLM_CACHE_MAX_ENTRIES', 1024)
+        with self._lock:
+            self._local[key] = (time.monotonic() + ttl, entry)
+            self._local.move_to_end(key)
+            while len(self._local) > max_entries:
+                self._local.popitem(last=False)
+
+    def _get_redis_entry(self, key, redis_client):
+        if not redis_client:
+            return None
+        try:
+            value = redis_client.get(self.KEY_PREFIX + key)
+            return json.loads(value) if value else None
+        except (redis.exceptions.RedisError, ValueError) as e:
+            logger.warning(f"LLM cache Redis read failed: {str(e)}")
+            return None
+
+    def _set_redis_entry(self, key, entry, redis_client, ttl):
+        if not redis_client:
+            return
+        try:
+            redis_client.setex(self.KEY_PREFIX + key, ttl, json.dumps(entry))
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"LLM cache Redis write failed: {str(e)}")
+
+
+def _cache_hit_ratio():
+    hits = metrics.counter('llm_cache_hits_total', tier='local') + \
+        metrics.counter('llm_cache_hits_total', tier='redis')
+    lookups = hits + metrics.counter('llm_cache_misses_total')
+    return {'llm_cache_hit_ratio': hits / lookups if lookups else 0.0}
+
+
+# Singleton cache shared by the chat path in this process
+response_cache = ResponseCache()
+metrics.register_collector(_cache_hit_ratio)
@@ -0,0 +1,134 @@
+import atexit
+import os
+import socket
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from flask import current_app, has_app_context
+
+from app.utils.logger import logger
+
+
+class KeepAliveAdapter(HTTPAdapter):
+    """HTTPAdapter that enables TCP keep-alive on pooled upstream sockets"""
+
+    def __init__(self, keepalive_idle=None, **kwargs):
+        self.keepalive_idle = keepalive_idle
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        if self.keepalive_idle:
+            options = list(HTTPConnection.default_socket_options)
+            options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+            if hasattr(socket, 'TCP_KEEPIDLE'):
+                options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE,
+                                int(self.keepalive_idle)))
+            kwargs['socket_options'] = options
+        super().init_poolmanager(*args, **kwargs)
+
+
+class ProviderClientRegistry:
+    """
+    One long-lived pooled HTTP session per LLM provider per worker process.
+
+    Sessions are created lazily from the app config and dropped when the
+    process forks, so a gunicorn worker never reuses sockets inherited
+    from the master.
+    """
+
+    def __init__(self):
+        self._sessions = {}
+        self._settings = None
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _load_settings(self):
+        """Read pool and timeout settings from the current app config"""
+        config = current_app.config if has_app_context() else {}
+        return {
+            'pool_size': int(config.get('LLM_HTTP_POOL_SIZE', 10)),
+            'connect_timeout': float(config.get('LLM_HTTP_CONNECT_TIMEOUT', 5)),
+            'read_timeout': float(config.get('LLM_HTTP_READ_TIMEOUT', 30)),
+            'keepalive_idle': config.get('LLM_HTTP_KEEPALIVE_IDLE', 60)
+        }
+
+    def _check_pid(self):
+        """Forget sessions inherited from a parent process"""
+        if self._pid != os.getpid():
+            self._sessions = {}
+            self._settings = None
+            self._lock = threading.Lock()
+            self._pid = os.getpid()
+
+    @property
+    def settings(self):
+        self._check_pid()
+        if self._settings is None:
+            self._settings = self._load_settings()
+        return self._settings
+
+    @property
+    def timeout(self):
+        """(connect, read) timeout tuple for requests"""
+        settings = self.settings
+        return (settings['connect_timeout'], settings['read_timeout'])
+
+    def get_session(self, provider):
+        """Get the pooled session for a provider, creating it on first use"""
+        self._check_pid()
+        session = self._sessions.get(provider)
+        if session is not None:
+            return session
+
+        with self._lock:
+            session = self._sessions.get(provider)
+            if session is None:
+                session = self._create_session()
+                self._sessions[provider] = session
+                logger.info(f"Created pooled HTTP session for {provider}")
+        return session
+
+    def _create_session(self):
+        settings = self.settings
+        adapter = KeepAliveAdapter(
+            keepalive_idle=settings['keepalive_idle'],
+            pool_connections=1,
+            pool_maxsize=settings['pool_size'],
+            pool_block=False,
+            max_retries=0
+        )
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({'Connection': 'keep-alive'})
+        return session
+
+    def close_all(self):
+        """Close every session owned by this process"""
+        if self._pid != os.getpid():
+            # Sockets belong to the parent, just forget them
+            self._check_pid()
+            return
+
+        with self._lock:
+            sessions, self._sessions = self._sessions, {}
+            self._settings = None
+        for session in sessions.values():
+            try:
+                session.close()
+            except Exception as e:
+                logger.warning(f"Error closing HTTP session: {str(e)}")
+
+    def reset_after_fork(self):
+        """Drop inherited sessions in a freshly forked worker"""
+        self._check_pid()
+
+
+# Singleton registry shared by all provider handlers in this process
+provider_clients = ProviderClientRegistry()
+
+atexit.register(provider_clients.close_all)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=provider_clients.reset_after_fork)
@@ -0,0 +1,101 @@
+import math
+
+from flask import current_app, has_app_context
+
+from app.models.database import db
+from app.models.message import Message
+from app.utils.metrics import metrics
+
+
+def estimate_tokens(text):
+    """
+    Fast local token estimate, no tokenizer needed.
+
+    BPE tokenizers average ~4 characters per token on Portuguese/English
+    prose, and short words rarely merge, so the larger of chars/4 and the
+    word count is a safe upper-ish bound.
+    """
+    if not text:
+        return 0
+    return max(math.ceil(len(text) / 4), len(text.split()))
+
+
+class ContextBuilder:
+    """
+    Conversation history for a prompt, within the model's token budget.
+
+    The budget is the model's context window (LLM_CONTEXT_WINDOWS by
+    'provider:model', then 'provider', else LLM_CONTEXT_DEFAULT_WINDOW)
+    minus LLM_CONTEXT_RESPONSE_RESERVE for the answer and the tokens of
+    the prompt itself and of the conversation's rolling summary (see
+    summary.py). Messages after the summary's high-water mark are read
+    newest first with a bounded query (at most LLM_CONTEXT_MAX_MESSAGES
+    rows) and kept while they fit.
+    """
+
+    def settings(self, provider, model):
+        config = current_app.config if has_app_context() else {}
+        windows = config.get('LLM_CONTEXT_WINDOWS') or {}
+        window = windows.get(f"{provider}:{model}", windows.get(
+            provider, config.get('LLM_CONTEXT_DEFAULT_WINDOW', 4096)))
+        return {
+            'window': window,
+            'reserve': config.get('LLM_CONTEXT_RESPONSE_RESERVE', 800),
+            'max_messages': config.get('LLM_CONTEXT_MAX_MESSAGES', 50)
+        }
+
+    def recent_messages(self, conversation_id, budget, exclude_id=None, limit=50, after_id=None):
+        """
+        Newest messages fitting in `budget` tokens, oldest first.
+
+        Args:
+            exclude_id: Message to leave out (the one being answered)
+            after_id: Only consider messages with a greater id
+        """
+        query = db.session.query(Message.id, Message.content, Message.sender) \
+            .filter(Message.conversation_id == conversation_id)
+        if exclude_id is not None:
+            query = query.filter(Message.id != exclude_id)
+        if after_id is not None:
+            query = query.filter(Message.id > after_id)
+        rows = query.order_by(Message.created_at.desc(), Message.id.desc()) \
+            .limit(limit).all()
+
+        history = []
+        used = 0
+        for row in rows:
+            tokens = estimate_tokens(row.content)
+            if used + tokens > budget:
+                break
+            used += tokens
+            history.append({'content': row.content, 'sender': row.sender})
+        history.reverse()
+
+        metrics.observe('llm_context_tokens', used)
+        metrics.observe('llm_context_messages', len(history))
+        return history
+
+    def build(self, conversation, provider, model, prompt, exclude_id=None):
+        """
+        Context variables for a prompt template: conversation_summary and
+        conversation_history.
+
+        Args:
+            prompt: Template and user message, counted against the budget
+        """
+        settings = self.settings(provider, model)
+        summary = conversation.summary or ''
+        # Tokens left for history once the prompt, summary and reply are counted
+        budget = max(0, settings['window'] - settings['reserve'] -
+                     estimate_tokens(prompt) - estimate_tokens(summary))
+        return {
+            'conversation_summary': summary,
+            'conversation_history': self.recent_messages(
+                conversation.id, budget, exclude_id=exclude_id,
+                limit=settings['max_messages'],
+                after_id=conversation.summary_message_id)
+        }
+
+
+# Singleton context builder shared by the chat endpoints
+context_builder = ContextBuilder()
@@ -0,0 +1,34 @@
+import contextvars
+import time
+from contextlib import contextmanager
+
+# Absolute time.monotonic() by which the current request must be answered
+_deadline = contextvars.ContextVar('llm_request_deadline', default=None)
+
+
+@contextmanager
+def request_deadline(seconds):
+    """Bound every LLM call made inside the block by a shared deadline"""
+    token = _deadline.set(time.monotonic() + seconds if seconds else None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def current_deadline():
+    """The absolute deadline of the current context, to hand to another thread"""
+    return _deadline.get()
+
+
+def set_deadline(deadline):
+    """Adopt a deadline captured with current_deadline() (e.g. in a new task)"""
+    _deadline.set(deadline)
+
+
+def remaining_time():
+    """Seconds left before the current deadline, or None without one"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
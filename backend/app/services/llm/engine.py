@@ -0,0 +1,169 @@
+import asyncio
+import atexit
+import os
+import threading
+
+import httpx
+from flask import current_app, has_app_context
+
+from app.services.llm.deadline import current_deadline, remaining_time, set_deadline
+from app.services.llm.errors import LLMProviderError
+from app.utils.logger import logger
+
+
+class AsyncLLMEngine:
+    """
+    Per-worker asyncio loop that owns the async HTTP client for LLM calls.
+
+    Request threads hand coroutines to the engine and wait on the result, so
+    hundreds of in-flight upstream calls share one event loop and one
+    connection pool instead of one blocked socket per worker.
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._thread = None
+        self._client = None
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _load_settings(self):
+        """Read client limits and timeouts from the current app config"""
+        config = current_app.config if has_app_context() else {}
+        return {
+            'max_connections': int(config.get('LLM_ASYNC_MAX_CONNECTIONS', 200)),
+            'keepalive_connections': int(config.get('LLM_HTTP_POOL_SIZE', 10)),
+            'keepalive_expiry': float(config.get('LLM_HTTP_KEEPALIVE_IDLE', 60)),
+            'connect_timeout': float(config.get('LLM_HTTP_CONNECT_TIMEOUT', 5)),
+            'read_timeout': float(config.get('LLM_HTTP_READ_TIMEOUT', 30))
+        }
+
+    def _check_pid(self):
+        """Forget the loop inherited from a parent process"""
+        if self._pid != os.getpid():
+            self._loop = None
+            self._thread = None
+            self._client = None
+            self._lock = threading.Lock()
+            self._pid = os.getpid()
+
+    def _ensure_started(self):
+        self._check_pid()
+        if self._loop is not None:
+            return self._loop
+
+        with self._lock:
+            if self._loop is None:
+                settings = self._load_settings()
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever, name='llm-engine', daemon=True)
+                thread.start()
+                self._client = httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=settings['max_connections'],
+                        max_keepalive_connections=settings['keepalive_connections'],
+                        keepalive_expiry=settings['keepalive_expiry']
+                    ),
+                    timeout=httpx.Timeout(
+                        settings['read_timeout'],
+                        connect=settings['connect_timeout']
+                    )
+                )
+                self._thread = thread
+                self._loop = loop
+                logger.info("Started async LLM engine")
+        return self._loop
+
+    def submit(self, coro):
+        """
+        Schedule a coroutine on the engine loop and return a Future.
+
+        The caller's app context is pushed inside the task, so provider code
+        can keep reading current_app.config, and the caller's request
+        deadline carries over.
+        """
+        loop = self._ensure_started()
+        app = current_app._get_current_object() if has_app_context() else None
+        return asyncio.run_coroutine_threadsafe(
+            _in_caller_context(app, current_deadline(), coro), loop)
+
+    def run(self, coro, timeout=None):
+        """Run a coroutine on the engine loop and wait for its result"""
+        return self.submit(coro).result(timeout)
+
+    async def post_json(self, provider, url, headers, data):
+        """
+        POST a JSON payload through the shared async client.
+
+        Can be awaited from the engine loop or from any other event loop; in
+        the latter case the request is forwarded to the engine loop.
+        """
+        loop = self._ensure_started()
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+
+        if running is not loop:
+            return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(
+                self._post_json(provider, url, headers, data), loop))
+        return await self._post_json(provider, url, headers, data)
+
+    async def _post_json(self, provider, url, headers, data):
+        response = None
+        timeout = httpx.USE_CLIENT_DEFAULT
+        remaining = remaining_time()
+        if remaining is not None:
+            # Never wait on the provider past the caller's deadline
+            timeout = httpx.Timeout(max(remaining, 0.001),
+                                    connect=self._client.timeout.connect)
+        try:
+            response = await self._client.post(url, headers=headers, json=data,
+                                               timeout=timeout)
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPError as e:
+            logger.error(f"{provider} API error: {str(e)}")
+            if response is not None and response.text:
+                logger.error(f"Response: {response.text}")
+            raise LLMProviderError.from_response(f"Error calling {provider} API: {str(e)}", response)
+
+    def close(self):
+        """Close the client and stop the loop owned by this process"""
+        if self._pid != os.getpid():
+            self._check_pid()
+            return
+
+        with self._lock:
+            loop, client = self._loop, self._client
+            self._loop = self._thread = self._client = None
+        if loop is None:
+            return
+
+        try:
+            asyncio.run_coroutine_threadsafe(
+                client.aclose(), loop).result(5)
+        except Exception as e:
+            logger.warning(f"Error closing async LLM client: {str(e)}")
+        loop.call_soon_threadsafe(loop.stop)
+
+    def reset_after_fork(self):
+        """Drop the loop inherited from the master in a forked worker"""
+        self._check_pid()
+
+
+async def _in_caller_context(app, deadline, coro):
+    set_deadline(deadline)
+    if app is None:
+        return await coro
+    with app.app_context():
+        return await coro
+
+
+# Singleton engine shared by all async provider services in this process
+async_engine = AsyncLLMEngine()
+
+atexit.register(async_engine.close)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=async_engine.reset_after_fork)
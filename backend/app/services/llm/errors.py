@@ -0,0 +1,78 @@
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+
+def parse_retry_after(value):
+    """Seconds from a Retry-After header (delta-seconds or HTTP date), or None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class LLMProviderError(Exception):
+    """
+    An upstream LLM call failed.
+
+    status_code is the provider's HTTP status, or None when no response was
+    received (connection error, timeout); retry_after is the provider's
+    Retry-After in seconds, if it sent one.
+    """
+
+    def __init__(self, message, status_code=None, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @classmethod
+    def from_response(cls, message, response):
+        """Build the error from a requests/httpx response (or None)"""
+        if response is None:
+            return cls(message)
+        return cls(message, status_code=response.status_code,
+                   retry_after=parse_retry_after(response.headers.get('Retry-After')))
+
+
+class ProviderUnavailableError(LLMProviderError):
+    """
+    The call was not attempted; the client may retry after `retry_after`
+    seconds (the chat API answers 503 with a Retry-After header).
+    """
+
+    def __init__(self, message, retry_after, status_code=503):
+        super().__init__(message, status_code=status_code, retry_after=retry_after)
+
+
+class CircuitOpenError(ProviderUnavailableError):
+    """The call was not attempted because the provider's circuit is open"""
+
+    def __init__(self, breaker, retry_after):
+        super().__init__(
+            f"Circuit open for {breaker}, retry in {retry_after:.0f}s", retry_after)
+        self.breaker = breaker
+
+
+class BulkheadFullError(ProviderUnavailableError):
+    """No concurrency slot for the provider/model freed up before the deadline"""
+
+    def __init__(self, bulkhead, retry_after):
+        super().__init__(f"Too many concurrent calls to {bulkhead}", retry_after)
+        self.bulkhead = bulkhead
+
+
+class SchedulerBusyError(ProviderUnavailableError):
+    """No scheduler slot for the priority class freed up before its queue timeout"""
+
+    def __init__(self, priority, retry_after):
+        super().__init__(
+            f"Too many queued {priority} LLM calls", retry_after, status_code=429)
+        self.priority = priority
@@ -0,0 +1,140 @@
+import asyncio
+import threading
+from collections import deque
+
+from flask import current_app, has_app_context
+
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+
+
+class ProviderLatencyTracker:
+    """
+    Sliding window of recent upstream latencies per provider.
+
+    Fed by BaseLLMService after every successful upstream call; the hedging
+    delay is a percentile of the primary provider's window.
+    """
+
+    def __init__(self, window=200):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, provider, seconds):
+        with self._lock:
+            samples = self._samples.get(provider)
+            if samples is None:
+                samples = self._samples[provider] = deque(maxlen=self.window)
+            samples.append(seconds)
+        metrics.observe('llm_upstream_latency_seconds',
+                        seconds, provider=provider)
+
+    def percentile(self, provider, percent, min_samples=1):
+        """Latency percentile for a provider, or None without enough samples"""
+        with self._lock:
+            samples = sorted(self._samples.get(provider, ()))
+        if not samples or len(samples) < min_samples:
+            return None
+        index = min(len(samples) - 1, int(len(samples) * percent / 100))
+        return samples[index]
+
+    def reset(self):
+        """Forget all samples - FOR TESTING ONLY"""
+        with self._lock:
+            self._samples.clear()
+
+
+def _config(name, default):
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+
+def hedge_delay(provider):
+    """How long to wait on `provider` before hedging to the next one"""
+    delay = provider_latency.percentile(
+        provider, _config('LLM_HEDGING_PERCENTILE', 95),
+        min_samples=_config('LLM_HEDGING_MIN_SAMPLES', 20))
+    if delay is None:
+        return _config('LLM_HEDGING_DEFAULT_DELAY', 5.0)
+    return max(delay, _config('LLM_HEDGING_MIN_DELAY', 0.5))
+
+
+def rank_by_latency(providers):
+    """Order fallback providers by their median latency (unknown last)"""
+    def median(provider):
+        value = provider_latency.percentile(provider, 50)
+        return value if value is not None else float('inf')
+    return sorted(providers, key=median)
+
+
+async def hedged_response(candidates, message, options=None):
+    """
+    Ask the first candidate, hedging to the next ones when it is slow or fails.
+
+    The next candidate is started when the newest in-flight call has not
+    answered within its provider's hedge_delay(), or immediately when a
+    call fails. The first successful answer wins and the other calls are
+    cancelled.
+
+    Args:
+        candidates: List of (service, model) pairs, primary first
+        message: Prompt text sent to every candidate
+        options: Options passed to BaseLLMService.get_response
+
+    Returns:
+        (response, index) where index is the candidate that answered
+    """
+    pending = {}
+    last_error = None
+    next_index = 0
+
+    def launch():
+        nonlocal next_index
+        service, model = candidates[next_index]
+        task = asyncio.ensure_future(
+            service.get_response(message, model=model, options=options))
+        pending[task] = next_index
+        next_index += 1
+        if pending[task] > 0:
+            metrics.incr('llm_hedged_requests_total',
+                         primary=candidates[0][0].provider, secondary=service.provider)
+        return service.provider
+
+    newest = launch()
+    try:
+        while pending:
+            timeout = hedge_delay(newest) if next_index < len(candidates) else None
+            done, _ = await asyncio.wait(
+                pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+            if not done:
+                # Slowest acceptable latency exceeded: hedge
+                newest = launch()
+                continue
+
+            failed = False
+            for task in done:
+                index = pending.pop(task)
+                if task.exception() is None:
+                    if index > 0:
+                        metrics.incr('llm_hedged_wins_total',
+                                     provider=candidates[index][0].provider)
+                    return task.result(), index
+                failed, last_error = True, task.exception()
+                logger.warning(
+                    f"{candidates[index][0].provider} failed, trying next provider: {str(last_error)}")
+
+            if failed and next_index < len(candidates):
+                # Failover
+                newest = launch()
+    finally:
+        for task in pending:
+            task.cancel()
+
+    raise last_error
+
+
+# Singleton latency tracker shared by the provider services in this process
+provider_latency = ProviderLatencyTracker()
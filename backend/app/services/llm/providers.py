@@ -0,0 +1,46 @@
+from app.services.llm.adapters import ADAPTERS
+from app.services.llm.base import BaseLLMService
+
+
+class OpenAIProvider(BaseLLMService):
+    """Async OpenAI chat completions"""
+    provider = 'openai'
+    default_model = ADAPTERS['openai'].default_model
+
+
+class AnthropicProvider(BaseLLMService):
+    """Async Anthropic Claude messages"""
+    provider = 'anthropic'
+    default_model = ADAPTERS['anthropic'].default_model
+
+
+class GoogleProvider(BaseLLMService):
+    """Async Google Gemini generateContent"""
+    provider = 'google'
+    default_model = ADAPTERS['google'].default_model
+
+
+class MistralProvider(BaseLLMService):
+    """Async Mistral AI chat completions (OpenAI-compatible format)"""
+    provider = 'mistral'
+    default_model = ADAPTERS['mistral'].default_model
+
+
+class GenericProvider(BaseLLMService):
+    """Fallback for other providers, assuming the OpenAI format"""
+    provider = 'generic'
+    default_model = None
+
+    def __init__(self, api_key=None, provider="generic", cache=None, api_key_id=None):
+        self.provider = provider
+        super().__init__(api_key=api_key, cache=cache, api_key_id=api_key_id)
+
+
+# Map of provider names to async service classes
+LLM_PROVIDERS = {
+    'openai': OpenAIProvider,
+    'anthropic': AnthropicProvider,
+    'google': GoogleProvider,
+    'mistral': MistralProvider,
+    'generic': GenericProvider
+}
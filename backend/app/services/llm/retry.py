@@ -0,0 +1,156 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+
+from flask import current_app, has_app_context
+
+from app.services.llm.deadline import remaining_time
+from app.services.llm.errors import LLMProviderError, ProviderUnavailableError
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+
+# Statuses worth retrying; None means no response (connection error, timeout)
+RETRYABLE_STATUSES = frozenset([None, 408, 429, 500, 502, 503, 504])
+
+
+class RetryBudget:
+    """
+    Process-wide cap on retries as a fraction of recent calls.
+
+    Over the last `window` seconds, retries may add up to `ratio` of the
+    calls made, plus `min_retries` so quiet periods can still retry. When
+    a provider is down everywhere this stops retries from multiplying the
+    load on it.
+    """
+
+    def __init__(self, window=10):
+        self.window = window
+        self._calls = deque()
+        self._retries = deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, events, now):
+        while events and events[0] < now - self.window:
+            events.popleft()
+
+    def record_call(self):
+        now = time.monotonic()
+        with self._lock:
+            self._calls.append(now)
+            self._trim(self._calls, now)
+
+    def try_spend(self, ratio, min_retries):
+        """Take one retry from the budget; False when it is exhausted"""
+        now = time.monotonic()
+        with self._lock:
+            self._trim(self._calls, now)
+            self._trim(self._retries, now)
+            if len(self._retries) >= min_retries + ratio * len(self._calls):
+                return False
+            self._retries.append(now)
+            return True
+
+    def reset(self):
+        """Clear the window - FOR TESTING ONLY"""
+        with self._lock:
+            self._calls.clear()
+            self._retries.clear()
+
+
+class RetryPolicy:
+    """
+    Shared retry layer for upstream LLM calls.
+
+    Retries LLMProviderErrors with a retryable status up to
+    LLM_RETRY_MAX_ATTEMPTS in total, sleeping with exponential backoff and
+    full jitter, or for the provider's Retry-After when it is longer. A
+    retry is skipped when the wait would overrun the request deadline or
+    the process-wide RetryBudget is spent.
+    """
+
+    def __init__(self):
+        self.budget = RetryBudget()
+
+    def settings(self):
+        config = current_app.config if has_app_context() else {}
+        return {
+            'max_attempts': config.get('LLM_RETRY_MAX_ATTEMPTS', 3),
+            'base_delay': config.get('LLM_RETRY_BASE_DELAY', 0.25),
+            'max_delay': config.get('LLM_RETRY_MAX_DELAY', 8),
+            'budget_ratio': config.get('LLM_RETRY_BUDGET_RATIO', 0.1),
+            'budget_min_retries': config.get('LLM_RETRY_BUDGET_MIN_RETRIES', 10)
+        }
+
+    def backoff(self, attempt, error, settings):
+        """Full-jitter exponential backoff, at least the provider's Retry-After"""
+        delay = random.uniform(0, min(settings['max_delay'],
+                                      settings['base_delay'] * 2 ** attempt))
+        return max(delay, error.retry_after or 0)
+
+    def next_delay(self, provider, attempt, error, settings):
+        """
+        Decide whether a failed attempt is retried.
+
+        Returns:
+            Seconds to sleep before the next attempt, or None to give up
+        """
+        if isinstance(error, ProviderUnavailableError) or \
+                not isinstance(error, LLMProviderError) or \
+                error.status_code not in RETRYABLE_STATUSES:
+            return None
+
+        if attempt + 1 >= settings['max_attempts']:
+            metrics.incr('llm_retry_giveups_total', provider=provider, reason='attempts')
+            return None
+
+        delay = self.backoff(attempt, error, settings)
+        remaining = remaining_time()
+        if remaining is not None and delay >= remaining:
+            metrics.incr('llm_retry_giveups_total', provider=provider, reason='deadline')
+            return None
+
+        if not self.budget.try_spend(settings['budget_ratio'], settings['budget_min_retries']):
+            metrics.incr('llm_retry_giveups_total', provider=provider, reason='budget')
+            return None
+
+        metrics.incr('llm_retries_total', provider=provider,
+                     status=error.status_code or 'none')
+        logger.warning(
+            f"Retrying {provider} in {delay:.2f}s after: {str(error)}")
+        return delay
+
+    def call(self, provider, attempt_call):
+        """Run a blocking zero-argument call with retries"""
+        settings = self.settings()
+        self.budget.record_call()
+        attempt = 0
+        while True:
+            try:
+                return attempt_call()
+            except Exception as e:
+                delay = self.next_delay(provider, attempt, e, settings)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+            attempt += 1
+
+    async def acall(self, provider, attempt_call):
+        """Await a zero-argument coroutine function with retries"""
+        settings = self.settings()
+        self.budget.record_call()
+        attempt = 0
+        while True:
+            try:
+                return await attempt_call()
+            except Exception as e:
+                delay = self.next_delay(provider, attempt, e, settings)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+# Singleton retry policy (and its budget) shared by all provider calls
+retry_policy = RetryPolicy()
@@ -0,0 +1,269 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+from flask import current_app, has_app_context
+
+from app.services.llm.deadline import remaining_time
+from app.services.llm.errors import SchedulerBusyError
+from app.utils.metrics import metrics
+
+# Priority classes: live chat, and work nobody is waiting on (summaries,
+# batches, daily message generation)
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+PRIORITIES = (INTERACTIVE, BACKGROUND)
+
+
+class _Waiter:
+    """A queued call; woken from any thread once it is granted a slot"""
+
+    def __init__(self, priority, loop=None):
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+        self.promoted = False
+        self.loop = loop
+        self.event = asyncio.Event() if loop else threading.Event()
+
+    def wake(self):
+        if self.loop:
+            self.loop.call_soon_threadsafe(self.event.set)
+        else:
+            self.event.set()
+
+
+class PriorityScheduler:
+    """
+    Admission of provider calls by priority class, per worker process.
+
+    At most LLM_SCHEDULER_CAPACITY calls are in flight, and each class at
+    most its LLM_SCHEDULER_LIMITS entry. Interactive calls are served
+    first; background calls only start while no interactive call is queued
+    and more than LLM_SCHEDULER_INTERACTIVE_RESERVE slots are free, so a
+    burst of background work never makes live chat wait.
+
+    Starvation protection: a background call queued for
+    LLM_SCHEDULER_STARVATION_AGE is promoted and takes the next slot its
+    class limit allows, reserve or not. Calls queued past their class's
+    LLM_SCHEDULER_QUEUE_TIMEOUTS (or the request deadline) fail with
+    SchedulerBusyError. Queue depth, in-flight calls and wait time per
+    class are exported to /metrics.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queues = {priority: deque() for priority in PRIORITIES}
+        self._in_flight = {priority: 0 for priority in PRIORITIES}
+        self._settings = None
+
+    def settings(self):
+        config = current_app.config if has_app_context() else {}
+        limits = config.get('LLM_SCHEDULER_LIMITS') or {}
+        timeouts = config.get('LLM_SCHEDULER_QUEUE_TIMEOUTS') or {}
+        return {
+            'enabled': config.get('LLM_SCHEDULER_ENABLED', False),
+            'capacity': int(config.get('LLM_SCHEDULER_CAPACITY', 0) or 0),
+            'limits': {priority: int(limits.get(priority, 0) or 0) for priority in PRIORITIES},
+            'reserve': int(config.get('LLM_SCHEDULER_INTERACTIVE_RESERVE', 0) or 0),
+            'starvation_age': float(config.get('LLM_SCHEDULER_STARVATION_AGE', 10)),
+            'timeouts': {priority: float(timeouts.get(priority, 5)) for priority in PRIORITIES}
+        }
+
+    def _admissible(self, priority, promoted, settings):
+        """Whether a call of `priority` may start now; holds self._lock"""
+        limit = settings['limits'][priority]
+        if limit and self._in_flight[priority] >= limit:
+            return False
+        capacity = settings['capacity']
+        total = sum(self._in_flight.values())
+        if capacity and total >= capacity:
+            return False
+        if priority == BACKGROUND and not promoted:
+            if self._queues[INTERACTIVE]:
+                return False
+            if capacity and capacity - total <= settings['reserve']:
+                return False
+        return True
+
+    def _dispatch(self, settings):
+        """Grant free slots to queued calls in priority order; holds self._lock"""
+        granted = []
+        now = time.monotonic()
+        while True:
+            background = self._queues[BACKGROUND]
+            if background and not background[0].promoted and \
+                    now - background[0].enqueued_at >= settings['starvation_age']:
+                background[0].promoted = True
+                metrics.incr('llm_scheduler_promoted_total')
+
+            order = (BACKGROUND, INTERACTIVE) if background and background[0].promoted \
+                else (INTERACTIVE, BACKGROUND)
+            waiter = None
+            for priority in order:
+                queue = self._queues[priority]
+                if queue and self._admissible(priority, queue[0].promoted, settings):
+                    waiter = queue.popleft()
+                    break
+            if waiter is None:
+                return granted
+
+            self._in_flight[waiter.priority] += 1
+            waiter.granted = True
+            granted.append(waiter)
+
+    def _enqueue(self, waiter, settings):
+        with self._lock:
+            self._settings = settings
+            self._queues[waiter.priority].append(waiter)
+            granted = self._dispatch(settings)
+        for other in granted:
+            other.wake()
+
+    def _poll(self, settings):
+        """Re-run admission (promotions happen with time, not only on release)"""
+        with self._lock:
+            granted = self._dispatch(settings)
+        for waiter in granted:
+            waiter.wake()
+
+    def _abandon(self, waiter):
+        """Leave the queue; returns True if the slot was granted meanwhile"""
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._queues[waiter.priority].remove(waiter)
+            return False
+
+    def _release(self, priority):
+        with self._lock:
+            self._in_flight[priority] -= 1
+            granted = self._dispatch(self._settings)
+        for waiter in granted:
+            waiter.wake()
+
+    def _timeout(self, priority, settings):
+        """Seconds a call may queue: its class timeout, within the request deadline"""
+        timeout = settings['timeouts'][priority]
+        remaining = remaining_time()
+        if remaining is not None:
+            timeout = min(timeout, max(remaining, 0.0))
+        return timeout
+
+    def _step(self, waiter, settings, deadline):
+        """Time to sleep before re-checking; background waiters wake to be promoted"""
+        now = time.monotonic()
+        step = deadline - now
+        if waiter.priority == BACKGROUND and not waiter.promoted:
+            step = min(step, max(waiter.enqueued_at + settings['starvation_age'] - now, 0.01))
+        return max(step, 0.0)
+
+    def _admitted(self, waiter, timeout):
+        """Record the queue wait; fail if no slot was granted"""
+        waited = time.monotonic() - waiter.enqueued_at
+        metrics.observe('llm_scheduler_wait_seconds', waited, priority=waiter.priority)
+        if not waiter.granted:
+            metrics.incr('llm_scheduler_rejected_total', priority=waiter.priority)
+            raise SchedulerBusyError(waiter.priority, timeout)
+
+    @contextmanager
+    def hold(self, priority=INTERACTIVE):
+        """Hold a slot around a blocking provider call"""
+        settings = self.settings()
+        if not settings['enabled']:
+            yield
+            return
+
+        waiter = _Waiter(priority)
+        timeout = self._timeout(priority, settings)
+        deadline = waiter.enqueued_at + timeout
+        self._enqueue(waiter, settings)
+        try:
+            while not waiter.granted and time.monotonic() < deadline:
+                waiter.event.wait(self._step(waiter, settings, deadline))
+                if not waiter.granted:
+                    self._poll(settings)
+        except BaseException:
+            if self._abandon(waiter):
+                self._release(priority)
+            raise
+        if not waiter.granted:
+            self._abandon(waiter)
+        self._admitted(waiter, timeout)
+
+        try:
+            yield
+        finally:
+            self._release(priority)
+
+    @asynccontextmanager
+    async def acquire(self, priority=INTERACTIVE):
+        """Hold a slot around an awaited provider call"""
+        settings = self.settings()
+        if not settings['enabled']:
+            yield
+            return
+
+        waiter = _Waiter(priority, asyncio.get_running_loop())
+        timeout = self._timeout(priority, settings)
+        deadline = waiter.enqueued_at + timeout
+        self._enqueue(waiter, settings)
+        try:
+            while not waiter.granted and time.monotonic() < deadline:
+                try:
+                    await asyncio.wait_for(waiter.event.wait(),
+                                           self._step(waiter, settings, deadline))
+                except asyncio.TimeoutError:
+                    pass
+                if not waiter.granted:
+                    self._poll(settings)
+        except BaseException:
+            if self._abandon(waiter):
+                self._release(priority)
+            raise
+        if not waiter.granted:
+            self._abandon(waiter)
+        self._admitted(waiter, timeout)
+
+        try:
+            yield
+        finally:
+            self._release(priority)
+
+    def stats(self):
+        """Queue depth, in-flight calls and oldest wait per class"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                priority: {
+                    'queued': len(self._queues[priority]),
+                    'in_flight': self._in_flight[priority],
+                    'oldest_wait': now - self._queues[priority][0].enqueued_at
+                    if self._queues[priority] else 0.0
+                }
+                for priority in PRIORITIES
+            }
+
+    def reset(self):
+        """Forget queued and in-flight calls - FOR TESTING ONLY"""
+        with self._lock:
+            for priority in PRIORITIES:
+                self._queues[priority].clear()
+                self._in_flight[priority] = 0
+
+
+def _scheduler_gauges():
+    gauges = {}
+    for priority, stats in llm_scheduler.stats().items():
+        gauges[f"llm_scheduler_queue_depth{{priority={priority}}}"] = stats['queued']
+        gauges[f"llm_scheduler_in_flight{{priority={priority}}}"] = stats['in_flight']
+        gauges[f"llm_scheduler_oldest_wait_seconds{{priority={priority}}}"] = \
+            round(stats['oldest_wait'], 3)
+    return gauges
+
+
+# Singleton scheduler shared by all provider calls in this process
+llm_scheduler = PriorityScheduler()
+metrics.register_collector(_scheduler_gauges)
@@ -0,0 +1,383 @@
+import re
+import threading
+import time
+import unicodedata
+import zlib
+
+import numpy as np
+from flask import current_app, has_app_context
+
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+
+
+# Palavras funcionais ignoradas na comparação (sem acentos)
+STOPWORDS = frozenset("""
+a o as os e de da do das dos que com como um uma uns umas em no na nos nas
+por para pra sobre se eu me meu minha mim voce e ser diz fala posso pode
+muito mais mesmo ao aos
+""".split())
+
+
+def _strip_accents(text):
+    text = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+
+class HashedNgramVectorizer:
+    """
+    Embed text locally with hashed character n-grams.
+
+    Text is lower-cased and stripped of accents, punctuation and stopwords.
+    Each n-gram is hashed (crc32, stable across processes) into one of `dim`
+    buckets with a hash-derived sign; the vector is L2-normalised so a dot
+    product is the cosine similarity.
+    """
+
+    def __init__(self, dim=256, ngram_range=(3, 5)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+
+    @staticmethod
+    def normalize(text):
+        text = re.sub(r'[^\w\s]', ' ', _strip_accents((text or '').lower()))
+        return ' '.join(w for w in text.split() if w not in STOPWORDS)
+
+    def transform(self, text):
+        text = f" {self.normalize(text)} "
+        buckets = []
+        signs = []
+        low, high = self.ngram_range
+        for n in range(low, high + 1):
+            for i in range(len(text) - n + 1):
+                h = zlib.crc32(text[i:i + n].encode('utf-8'))
+                buckets.append(h % self.dim)
+                signs.append(1.0 if h & 0x80000000 else -1.0)
+
+        vector = np.bincount(buckets, weights=signs,
+                             minlength=self.dim).astype(np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class SemanticIndex:
+    """
+    Array-backed nearest-neighbour index of prompt vectors.
+
+    Vectors are stored as contiguous float32 rows in one growable matrix,
+    next to int64 arrays of the bot message ids holding the answers and of
+    the users who asked, so one entry costs dim * 4 + 16 bytes and a lookup
+    is a single matrix-vector product (about 100ms for 1M entries at dim 256).
+
+    Readers use an immutable (vectors, message_ids, user_ids, size) view
+    published after each change, so they never see arrays and size from
+    different versions.
+    """
+
+    def __init__(self, dim, capacity=1024):
+        self.dim = dim
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.message_ids = np.zeros(capacity, dtype=np.int64)
+        self.user_ids = np.zeros(capacity, dtype=np.int64)
+        self.size = 0
+        self._view = (self.vectors, self.message_ids, self.user_ids, 0)
+        self._lock = threading.Lock()
+
+    def add(self, vector, message_id, user_id=0):
+        with self._lock:
+            if self.size == len(self.message_ids):
+                self._grow()
+            self.vectors[self.size] = vector
+            self.message_ids[self.size] = message_id
+            self.user_ids[self.size] = user_id
+            self.size += 1
+            self._publish()
+
+    def add_batch(self, vectors, message_ids, user_ids=None):
+        with self._lock:
+            while self.size + len(message_ids) > len(self.message_ids):
+                self._grow()
+            end = self.size + len(message_ids)
+            self.vectors[self.size:end] = vectors
+            self.message_ids[self.size:end] = message_ids
+            self.user_ids[self.size:end] = 0 if user_ids is None else user_ids
+            self.size = end
+            self._publish()
+
+    def drop_older(self, message_id):
+        """
+        Drop the entries answered by messages up to message_id (the oldest).
+
+        Returns:
+            Number of entries dropped
+        """
+        with self._lock:
+            keep = self.message_ids[:self.size] > message_id
+            kept = int(keep.sum())
+            dropped = self.size - kept
+            if dropped:
+                capacity = max(1024, len(self.message_ids))
+                vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+                vectors[:kept] = self.vectors[:self.size][keep]
+                message_ids = np.zeros(capacity, dtype=np.int64)
+                message_ids[:kept] = self.message_ids[:self.size][keep]
+                user_ids = np.zeros(capacity, dtype=np.int64)
+                user_ids[:kept] = self.user_ids[:self.size][keep]
+                self.vectors, self.message_ids, self.user_ids = vectors, message_ids, user_ids
+                self.size = kept
+                self._publish()
+            return dropped
+
+    def _grow(self):
+        capacity = max(1024, len(self.message_ids) * 2)
+        vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        vectors[:self.size] = self.vectors[:self.size]
+        message_ids = np.zeros(capacity, dtype=np.int64)
+        message_ids[:self.size] = self.message_ids[:self.size]
+        user_ids = np.zeros(capacity, dtype=np.int64)
+        user_ids[:self.size] = self.user_ids[:self.size]
+        # Readers keep using the old arrays until they take a new snapshot
+        self.vectors, self.message_ids, self.user_ids = vectors, message_ids, user_ids
+
+    def _publish(self):
+        self._view = (self.vectors, self.message_ids, self.user_ids, self.size)
+
+    def message_id_array(self):
+        """Message ids of the current entries"""
+        _, message_ids, _, size = self._view
+        return message_ids[:size]
+
+    def nearest(self, vector, user_id=None):
+        """
+        Return (score, message_id) of the most similar entry, or None.
+
+        With user_id, only that user's entries are compared.
+        """
+        vectors, message_ids, user_ids, size = self._view
+        if size == 0:
+            return None
+
+        if user_id is None:
+            scores = vectors[:size] @ vector
+            best = int(np.argmax(scores))
+            return float(scores[best]), int(message_ids[best])
+
+        rows = np.flatnonzero(user_ids[:size] == user_id)
+        if len(rows) == 0:
+            return None
+        scores = vectors[rows] @ vector
+        best = int(np.argmax(scores))
+        return float(scores[best]), int(message_ids[rows[best]])
+
+
+class SemanticCache:
+    """
+    Near-duplicate response cache for template-less chat prompts.
+
+    Prompts are embedded locally (no external embedding service) and
+    compared against one SemanticIndex per provider/model. A user is only
+    ever served answers to prompts they sent themselves: entries carry the
+    user id and lookups compare that user's entries only. When the nearest
+    one is above LLM_SEMANTIC_CACHE_THRESHOLD, the stored bot answer is
+    served without calling the provider.
+
+    The index lives in memory, holds at most LLM_SEMANTIC_CACHE_MAX_ENTRIES
+    (the oldest answers are dropped first) and is rebuilt from the messages
+    table when a worker starts; entries added during the rebuild are
+    replayed into the new index.
+    """
+
+    def __init__(self):
+        self._indexes = {}
+        self._vectorizer = None
+        self._lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+        self._loaded = False
+        self._loading = False
+        # Entries added while a rebuild runs, None otherwise
+        self._added_during_rebuild = None
+
+    def _config(self, name, default):
+        if has_app_context():
+            return current_app.config.get(name, default)
+        return default
+
+    @property
+    def enabled(self):
+        return self._config('LLM_SEMANTIC_CACHE_ENABLED', False)
+
+    @property
+    def vectorizer(self):
+        if self._vectorizer is None:
+            self._vectorizer = HashedNgramVectorizer(
+                dim=self._config('LLM_SEMANTIC_CACHE_DIM', 256))
+        return self._vectorizer
+
+    def _index(self, provider, model):
+        return self._indexes.get((provider, model))
+
+    @property
+    def size(self):
+        return sum(index.size for index in list(self._indexes.values()))
+
+    def lookup(self, provider, model, prompt, user_id):
+        """
+        Find a cached answer to a near-duplicate of a prompt of this user.
+
+        Returns:
+            (message_id, score) of the cached bot message, or None on a miss
+        """
+        self.ensure_loaded()
+        index = self._index(provider, model)
+        if index is None:
+            metrics.incr('llm_semantic_cache_misses_total')
+            return None
+
+        start = time.perf_counter()
+        match = index.nearest(self.vectorizer.transform(prompt), int(user_id))
+        metrics.observe('llm_semantic_cache_lookup_seconds',
+                        time.perf_counter() - start)
+
+        threshold = self._config('LLM_SEMANTIC_CACHE_THRESHOLD', 0.92)
+        if match is None or match[0] < threshold:
+            metrics.incr('llm_semantic_cache_misses_total')
+            return None
+
+        metrics.incr('llm_semantic_cache_hits_total')
+        score, message_id = match
+        return message_id, score
+
+    def add(self, provider, model, prompt, message_id, user_id):
+        """Index a user's prompt and the bot message that answered it"""
+        vector = self.vectorizer.transform(prompt)
+        user_id = int(user_id)
+        index = self._index(provider, model)
+        # Skip near-duplicates of prompts that are already indexed
+        match = index.nearest(vector, user_id) if index else None
+        if match and match[0] >= self._config('LLM_SEMANTIC_CACHE_THRESHOLD', 0.92):
+            return
+        key = (provider, model)
+        with self._lock:
+            # Under the lock, so a rebuild swapping the indexes can't lose it
+            if self._added_during_rebuild is not None:
+                self._added_during_rebuild.append((key, vector, message_id, user_id))
+            index = self._indexes.get(key)
+            if index is None:
+                index = self._indexes[key] = SemanticIndex(self.vectorizer.dim)
+            index.add(vector, message_id, user_id)
+        self._evict()
+
+    def _evict(self):
+        """Drop the oldest answers above LLM_SEMANTIC_CACHE_MAX_ENTRIES"""
+        limit = self._config('LLM_SEMANTIC_CACHE_MAX_ENTRIES', 100000)
+        if self.size <= limit or not self._evict_lock.acquire(blocking=False):
+            return
+        try:
+            indexes = list(self._indexes.values())
+            message_ids = np.concatenate([index.message_id_array() for index in indexes])
+            # Drop a tenth of the cap at a time, so the copy is not paid per add
+            count = min(max(len(message_ids) - limit, limit // 10, 1), len(message_ids))
+            cutoff = int(np.partition(message_ids, count - 1)[count - 1])
+            dropped = sum(index.drop_older(cutoff) for index in indexes)
+        finally:
+            self._evict_lock.release()
+        metrics.incr('llm_semantic_cache_evictions_total', dropped)
+        metrics.set_gauge('llm_semantic_cache_entries', self.size)
+
+    def ensure_loaded(self):
+        """Rebuild the index from the messages table in the background, once"""
+        if self._loaded or self._loading or not has_app_context():
+            return
+        with self._lock:
+            if self._loaded or self._loading:
+                return
+            self._loading = True
+
+        app = current_app._get_current_object()
+        threading.Thread(target=self._rebuild_in_app, args=(app,),
+                         name='semantic-cache-rebuild', daemon=True).start()
+
+    def _rebuild_in_app(self, app):
+        with app.app_context():
+            try:
+                self.rebuild()
+            except Exception as e:
+                logger.error(f"Semantic cache rebuild failed: {str(e)}")
+            finally:
+                self._loading = False
+
+    def rebuild(self):
+        """
+        Rebuild every index from user/bot message pairs in the database,
+        keeping the newest LLM_SEMANTIC_CACHE_MAX_ENTRIES.
+
+        Only plain chats are indexed: answers produced with a prompt template,
+        or themselves served from this cache, are skipped. Answers are indexed
+        under the provider/model that served them (a hedging fallback may have
+        answered for another one).
+        """
+        from app.models.conversation import Conversation
+        from app.models.message import Message
+
+        start = time.perf_counter()
+        limit = self._config('LLM_SEMANTIC_CACHE_MAX_ENTRIES', 100000)
+        with self._lock:
+            self._added_during_rebuild = []
+
+        try:
+            entries = []
+            previous = None
+            query = Message.query \
+                .join(Conversation, Message.conversation_id == Conversation.id) \
+                .add_columns(Conversation.user_id) \
+                .order_by(Message.conversation_id, Message.id).yield_per(1000)
+            for message, user_id in query:
+                if (message.sender == 'bot' and previous is not None
+                        and previous.sender == 'user'
+                        and previous.conversation_id == message.conversation_id):
+                    meta = message.get_metadata()
+                    if meta.get('provider') and not meta.get('template_id') \
+                            and not meta.get('semantic_cache'):
+                        key = (meta.get('served_provider') or meta['provider'],
+                               meta.get('served_model') or meta.get('model'))
+                        entries.append((message.id, key, user_id, previous.content))
+                previous = message
+
+            # Newest answers first when there are more than fit
+            entries.sort(reverse=True)
+            pending = {}
+            for message_id, key, user_id, prompt in entries[:limit]:
+                vectors, message_ids, user_ids = pending.setdefault(key, ([], [], []))
+                vectors.append(self.vectorizer.transform(prompt))
+                message_ids.append(message_id)
+                user_ids.append(user_id)
+
+            indexes = {}
+            for key, (vectors, message_ids, user_ids) in pending.items():
+                index = SemanticIndex(self.vectorizer.dim,
+                                      capacity=max(1024, len(message_ids)))
+                index.add_batch(np.vstack(vectors), np.array(message_ids),
+                                np.array(user_ids))
+                indexes[key] = index
+
+            with self._lock:
+                # Answers saved while the table was read may be missing from it
+                for key, vector, message_id, user_id in self._added_during_rebuild:
+                    index = indexes.setdefault(key, SemanticIndex(self.vectorizer.dim))
+                    if message_id not in index.message_id_array():
+                        index.add(vector, message_id, user_id)
+                self._indexes = indexes
+                self._loaded = True
+        finally:
+            with self._lock:
+                self._added_during_rebuild = None
+
+        self._evict()
+        count = self.size
+        metrics.set_gauge('llm_semantic_cache_entries', count)
+        logger.info(
+            f"Semantic cache rebuilt with {count} entries in {time.perf_counter() - start:.2f}s")
+
+
+# Singleton semantic cache shared by the chat path in this process
+semantic_cache = SemanticCache()
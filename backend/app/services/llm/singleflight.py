@@ -0,0 +1,268 @@
+import asyncio
+import json
+import os
+import threading
+import uuid
+
+import redis
+from flask import current_app, has_app_context
+
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+
+# Marks "no shared result", so the caller makes its own upstream call
+_MISS = object()
+
+# Compare-and-delete, so a leader never releases a lock it no longer owns
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class _ResultListener:
+    """
+    One Redis pattern subscription per process for single-flight results.
+
+    Followers waiting on a leader in another worker register a future here
+    instead of holding a thread on their own subscription.
+    """
+
+    def __init__(self, channel_prefix):
+        self.channel_prefix = channel_prefix
+        self._waiters = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = os.getpid()
+
+    def register(self, key, future, redis_client):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._waiters, self._thread = {}, None
+                self._pid = os.getpid()
+            self._waiters.setdefault(key, []).append(future)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._listen, args=(redis_client,),
+                    name='llm-singleflight', daemon=True)
+                self._thread.start()
+
+    def unregister(self, key, future):
+        with self._lock:
+            futures = self._waiters.get(key, [])
+            if future in futures:
+                futures.remove(future)
+            if not futures:
+                self._waiters.pop(key, None)
+
+    def _listen(self, redis_client):
+        try:
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            pubsub.psubscribe(self.channel_prefix + '*')
+            for message in pubsub.listen():
+                channel = message['channel']
+                if isinstance(channel, bytes):
+                    channel = channel.decode('utf-8')
+                key = channel[len(self.channel_prefix):]
+                with self._lock:
+                    futures = list(self._waiters.get(key, []))
+                for future in futures:
+                    future.get_loop().call_soon_threadsafe(
+                        _resolve, future, message['data'])
+        except (redis.exceptions.RedisError, ValueError) as e:
+            logger.warning(f"Single-flight listener stopped: {str(e)}")
+        finally:
+            # Waiters fall back to polling; the next one restarts the listener
+            with self._lock:
+                self._thread = None
+
+
+def _resolve(future, payload):
+    if not future.done():
+        future.set_result(payload)
+
+
+class SingleFlight:
+    """
+    Coalesce identical concurrent LLM calls into one upstream request.
+
+    Within a worker, callers with the same key await the leader's future on
+    the engine loop. Across workers and nodes, the leader holds a Redis lock
+    (SET NX PX) and publishes its result; followers elsewhere wait for it.
+    Followers only share successful answers: on a leader error, timeout or
+    lost lock they make their own call, so a hung leader cannot stall them.
+    """
+
+    KEY_PREFIX = 'llm:singleflight:'
+
+    def __init__(self, redis_client=None):
+        self.redis = redis_client
+        self._inflight = {}
+        self._listener = _ResultListener(self.KEY_PREFIX + 'done:')
+
+    def _config(self, name, default):
+        if has_app_context():
+            return current_app.config.get(name, default)
+        return default
+
+    def _get_redis(self):
+        """Get Redis client from app or use existing one"""
+        if self.redis:
+            return self.redis
+        if has_app_context():
+            return current_app.extensions.get('redis')
+        return None
+
+    @property
+    def enabled(self):
+        return self._config('LLM_SINGLEFLIGHT_ENABLED', True)
+
+    async def do(self, key, call):
+        """
+        Run `call()` once for all concurrent callers sharing `key`.
+
+        Args:
+            key: Coalescing key (the response cache key)
+            call: Zero-argument coroutine function making the upstream call
+        """
+        loop = asyncio.get_running_loop()
+        timeout = self._config('LLM_SINGLEFLIGHT_TIMEOUT', 35)
+
+        leader = self._inflight.get(key)
+        if leader is not None and leader.get_loop() is loop:
+            metrics.incr('llm_singleflight_coalesced_total', scope='local')
+            try:
+                return await asyncio.wait_for(asyncio.shield(leader), timeout)
+            except asyncio.TimeoutError:
+                metrics.incr('llm_singleflight_timeouts_total', scope='local')
+            except asyncio.CancelledError:
+                if not leader.cancelled():
+                    raise
+            except Exception:
+                pass
+            return await call()
+
+        future = loop.create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._lead(key, call, timeout)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Followers handle the error themselves; avoid "never retrieved"
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    async def _lead(self, key, call, timeout):
+        """Make the call as the local leader, coordinating through Redis"""
+        redis_client = self._get_redis()
+        if not redis_client:
+            metrics.incr('llm_singleflight_leaders_total')
+            return await call()
+
+        loop = asyncio.get_running_loop()
+        token = uuid.uuid4().hex
+        lock_ttl = self._config('LLM_SINGLEFLIGHT_LOCK_TTL', timeout)
+        acquired = await loop.run_in_executor(
+            None, self._acquire, redis_client, key, token, lock_ttl)
+
+        if acquired is False:
+            result = await self._wait_remote(redis_client, key, timeout)
+            if result is not _MISS:
+                metrics.incr('llm_singleflight_coalesced_total', scope='redis')
+                return result
+            return await call()
+
+        metrics.incr('llm_singleflight_leaders_total')
+        result_ttl = self._config('LLM_SINGLEFLIGHT_RESULT_TTL', 10)
+        payload = {'ok': False}
+        try:
+            result = await call()
+            payload = {'ok': True, 'response': result}
+            return result
+        finally:
+            if acquired:
+                await loop.run_in_executor(
+                    None, self._publish, redis_client, key, token, payload, result_ttl)
+
+    async def _wait_remote(self, redis_client, key, timeout):
+        """Wait for the leader in another worker to publish its result"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._listener.register(key, future, redis_client)
+        try:
+            # The leader may have published before we subscribed
+            lock_held, payload = await loop.run_in_executor(
+                None, self._peek, redis_client, key)
+            deadline = loop.time() + timeout
+            poll = self._config('LLM_SINGLEFLIGHT_POLL_INTERVAL', 1.0)
+            while payload is None:
+                if not lock_held:
+                    # Leader finished without a result or its lock expired
+                    return _MISS
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    metrics.incr('llm_singleflight_timeouts_total', scope='redis')
+                    return _MISS
+                try:
+                    payload = await asyncio.wait_for(
+                        asyncio.shield(future), min(remaining, poll))
+                except asyncio.TimeoutError:
+                    lock_held, payload = await loop.run_in_executor(
+                        None, self._peek, redis_client, key)
+        finally:
+            self._listener.unregister(key, future)
+
+        try:
+            payload = json.loads(payload)
+        except ValueError:
+            return _MISS
+        return payload['response'] if payload.get('ok') else _MISS
+
+    def _acquire(self, redis_client, key, token, ttl):
+        """Try to take the leader lock; None means Redis is unavailable"""
+        try:
+            return bool(redis_client.set(self.KEY_PREFIX + 'lock:' + key, token,
+                                         nx=True, px=int(ttl * 1000)))
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Single-flight Redis lock failed: {str(e)}")
+            return None
+
+    def _peek(self, redis_client, key):
+        """Return (lock still held, published payload or None)"""
+        try:
+            pipe = redis_client.pipeline()
+            pipe.exists(self.KEY_PREFIX + 'lock:' + key)
+            pipe.get(self.KEY_PREFIX + 'result:' + key)
+            lock_held, payload = pipe.execute()
+            return bool(lock_held), payload
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Single-flight Redis read failed: {str(e)}")
+            return False, None
+
+    def _publish(self, redis_client, key, token, payload, ttl):
+        """Store and announce the leader's result, then release the lock"""
+        value = json.dumps(payload)
+        try:
+            pipe = redis_client.pipeline()
+            if payload.get('ok'):
+                pipe.setex(self.KEY_PREFIX + 'result:' + key, ttl, value)
+            pipe.publish(self.KEY_PREFIX + 'done:' + key, value)
+            pipe.eval(_RELEASE_SCRIPT, 1, self.KEY_PREFIX + 'lock:' + key, token)
+            pipe.execute()
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Single-flight Redis publish failed: {str(e)}")
+
+
+# Singleton coalescer shared by the async provider services in this process
+single_flight = SingleFlight()
@@ -0,0 +1,245 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, has_app_context
+
+from app.models.conversation import Conversation
+from app.models.database import db, release_connection
+from app.models.message import Message
+from app.services.llm.context import estimate_tokens
+from app.services.llm.deadline import request_deadline
+from app.services.llm.engine import async_engine
+from app.services.llm.providers import LLM_PROVIDERS
+from app.services.llm.scheduler import BACKGROUND
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+
+# Instructions first and unchanged between runs: the provider caches them
+SUMMARY_PROMPT = """Resuma a conversa abaixo entre um usuário e um assistente espiritual cristão,
+em português. Integre o resumo anterior com as novas mensagens e preserve nomes, fatos
+pessoais, preocupações, pedidos de oração e versículos citados. Responda apenas com o
+resumo, em no máximo {words} palavras.
+
+RESUMO ANTERIOR:
+{summary}
+
+NOVAS MENSAGENS:
+{messages}
+"""
+
+
+class ConversationSummarizer:
+    """
+    Rolling per-conversation summaries, updated in the background.
+
+    Conversation.summary covers every message up to summary_message_id (the
+    high-water mark). Once LLM_SUMMARY_EVERY messages beyond the mark are
+    older than the newest LLM_SUMMARY_KEEP_RECENT, a worker thread folds
+    them into the summary with one LLM call on the user's key, reading at
+    most LLM_SUMMARY_MAX_INPUT_TOKENS of messages per run. Prompts then
+    carry the summary plus the recent window, so their size stays flat as
+    the conversation grows.
+
+    The chat path only schedules work: it never waits for a summary. A
+    Redis lock per conversation keeps workers from summarizing the same
+    messages twice, and the mark is advanced with a conditional update.
+    """
+
+    LOCK_PREFIX = 'llm:summary:lock:'
+
+    def __init__(self, redis_client=None):
+        self.redis = redis_client
+        self._executor = None
+        self._pid = None
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def _config(self, name, default):
+        if has_app_context():
+            return current_app.config.get(name, default)
+        return default
+
+    def _get_redis(self):
+        """Get Redis client from app or use existing one"""
+        if self.redis:
+            return self.redis
+        if has_app_context():
+            return current_app.extensions.get('redis')
+        return None
+
+    @property
+    def enabled(self):
+        return self._config('LLM_SUMMARY_ENABLED', True)
+
+    def _get_executor(self):
+        """Worker pool, recreated in forked children"""
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._config('LLM_SUMMARY_WORKERS', 2),
+                    thread_name_prefix='conversation-summary')
+                self._pid = os.getpid()
+                self._pending = set()
+            return self._executor
+
+    def maybe_schedule(self, conversation, provider, model, api_key, api_key_id=None):
+        """
+        Queue a summary update if enough messages are past the mark.
+
+        Returns:
+            True if a background update was queued
+        """
+        if not self.enabled or not api_key:
+            return False
+
+        # One bounded count: are there EVERY summarizable messages beyond
+        # the mark, on top of the recent window that is sent verbatim?
+        threshold = self._config('LLM_SUMMARY_EVERY', 20) + \
+            self._config('LLM_SUMMARY_KEEP_RECENT', 10)
+        query = db.session.query(Message.id).filter(
+            Message.conversation_id == conversation.id)
+        if conversation.summary_message_id is not None:
+            query = query.filter(Message.id > conversation.summary_message_id)
+        if query.limit(threshold).count() < threshold:
+            return False
+
+        executor = self._get_executor()
+        with self._lock:
+            if conversation.id in self._pending:
+                return False
+            self._pending.add(conversation.id)
+
+        app = current_app._get_current_object()
+        executor.submit(self._summarize_in_app, app, conversation.id,
+                        provider, model, api_key, api_key_id)
+        metrics.incr('llm_summary_scheduled_total')
+        return True
+
+    def _summarize_in_app(self, app, conversation_id, provider, model, api_key, api_key_id):
+        with app.app_context():
+            try:
+                self.summarize(conversation_id, provider, model, api_key, api_key_id)
+            except Exception as e:
+                metrics.incr('llm_summary_runs_total', result='error')
+                logger.warning(
+                    f"Summary of conversation {conversation_id} failed: {str(e)}")
+            finally:
+                with self._lock:
+                    self._pending.discard(conversation_id)
+
+    def _acquire(self, conversation_id):
+        """Cross-worker lock; returns its token, None if held, '' without Redis"""
+        redis_client = self._get_redis()
+        if not redis_client:
+            return ''
+        token = uuid.uuid4().hex
+        try:
+            if redis_client.set(self.LOCK_PREFIX + str(conversation_id), token, nx=True,
+                                ex=int(self._config('LLM_SUMMARY_LOCK_TTL', 120))):
+                return token
+            return None
+        except Exception as e:
+            logger.warning(f"Redis summary lock error: {str(e)}")
+            return ''
+
+    def _release(self, conversation_id, token):
+        redis_client = self._get_redis()
+        if not redis_client or not token:
+            return
+        key = self.LOCK_PREFIX + str(conversation_id)
+        try:
+            held = redis_client.get(key)
+            if held is not None and (held.decode() if isinstance(held, bytes) else held) == token:
+                redis_client.delete(key)
+        except Exception as e:
+            logger.warning(f"Redis summary lock error: {str(e)}")
+
+    def summarize(self, conversation_id, provider, model, api_key, api_key_id=None):
+        """
+        Fold the messages after the mark, except the recent window, into the summary.
+
+        Returns:
+            True if the summary was updated
+        """
+        token = self._acquire(conversation_id)
+        if token is None:
+            metrics.incr('llm_summary_runs_total', result='locked')
+            return False
+        try:
+            return self._summarize(conversation_id, provider, model, api_key, api_key_id)
+        finally:
+            self._release(conversation_id, token)
+
+    def _summarize(self, conversation_id, provider, model, api_key, api_key_id):
+        conversation = Conversation.query.get(conversation_id)
+        if conversation is None:
+            return False
+        mark = conversation.summary_message_id
+
+        # Newest message that may be summarized: the recent window stays verbatim
+        cutoff = db.session.query(Message.id) \
+            .filter(Message.conversation_id == conversation_id) \
+            .order_by(Message.id.desc()) \
+            .offset(self._config('LLM_SUMMARY_KEEP_RECENT', 10)).limit(1).scalar()
+        if cutoff is None or (mark is not None and cutoff <= mark):
+            return False
+
+        query = db.session.query(Message.id, Message.content, Message.sender) \
+            .filter(Message.conversation_id == conversation_id, Message.id <= cutoff)
+        if mark is not None:
+            query = query.filter(Message.id > mark)
+
+        # Oldest first, until the input budget is spent (at least one message)
+        max_tokens = self._config('LLM_SUMMARY_MAX_INPUT_TOKENS', 3000)
+        lines = []
+        used = 0
+        last_id = None
+        for row in query.order_by(Message.id).yield_per(50):
+            line = f"{'Usuário' if row.sender == 'user' else 'Assistente'}: {row.content}"
+            tokens = estimate_tokens(line)
+            if lines and used + tokens > max_tokens:
+                break
+            lines.append(line)
+            used += tokens
+            last_id = row.id
+        if not lines:
+            return False
+
+        prompt = SUMMARY_PROMPT.format(
+            words=self._config('LLM_SUMMARY_MAX_WORDS', 250),
+            summary=conversation.summary or '(nenhum)',
+            messages='\n'.join(lines))
+        service = LLM_PROVIDERS[provider](api_key=api_key, api_key_id=api_key_id)
+
+        release_connection()
+        start = time.monotonic()
+        with request_deadline(self._config('LLM_REQUEST_DEADLINE', 30)):
+            summary = async_engine.run(service.get_response(prompt, model, {
+                'raw_prompt': True, 'regenerate': True, 'priority': BACKGROUND,
+                'template': SUMMARY_PROMPT, 'template_id': 'summary'}))
+        metrics.observe('llm_summary_seconds', time.monotonic() - start)
+
+        # Only advance from the mark this run started from
+        query = Conversation.query.filter(Conversation.id == conversation_id)
+        if mark is None:
+            query = query.filter(Conversation.summary_message_id.is_(None))
+        else:
+            query = query.filter(Conversation.summary_message_id == mark)
+        updated = query.update({'summary': summary.strip(), 'summary_message_id': last_id},
+                               synchronize_session=False)
+        db.session.commit()
+
+        metrics.incr('llm_summary_runs_total', result='updated' if updated else 'stale')
+        return bool(updated)
+
+    def wait_idle(self):
+        """Block until queued summaries are done - FOR TESTING ONLY"""
+        while self._pending:
+            time.sleep(0.01)
+
+
+# Singleton summarizer used by the chat endpoints
+conversation_summarizer = ConversationSummarizer()
@@ -1,314 +1,242 @@
-import os
 import json
+import time
 import requests
 from flask import current_app
 import logging
 
+from app.services.llm.adapters import get_adapter, template_prefix, use_mock_llm
+from app.services.llm.breaker import circuit_breaker
+from app.services.llm.bulkhead import bulkhead
+from app.services.llm.cache import response_cache
+from app.services.llm.clients import provider_clients
+from app.services.llm.deadline import request_deadline
+from app.services.llm.providers import LLM_PROVIDERS
+from app.services.llm.retry import retry_policy
+from app.services.llm.scheduler import INTERACTIVE, llm_scheduler
+from app.services.llm.errors import LLMProviderError
+
 # Setup logging
 logger = logging.getLogger(__name__)
 
-# Constants
-DEFAULT_PROMPT_TEMPLATE = """
-Você é um assistente espiritual baseado em ensinamentos bíblicos. Seu objetivo é fornecer
-orientação, conforto e sabedoria inspirada na Bíblia. Por favor, responda à seguinte
-mensagem com uma perspectiva bíblica, citando versículos relevantes quando apropriado:
-
-MENSAGEM DO USUÁRIO: {message}
-"""
-
-# Provider-specific handlers
-
-
-def openai_chat(api_key, model, message):
-    """Get response from OpenAI API"""
-    # Check if we're in development mode and should use mock responses
-    logger.info(
-        f"ENV: {current_app.config.get('ENV')}, USE_MOCK_LLM: {current_app.config.get('USE_MOCK_LLM', False)}")
-    if current_app.config.get('ENV') == 'development' and current_app.config.get('USE_MOCK_LLM', False):
-        logger.info("Using mock response for OpenAI in development mode")
-        return f"Resposta simulada para: '{message}'\n\nComo diz em João 3:16, 'Porque Deus amou o mundo de tal maneira que deu o seu Filho unigênito, para que todo aquele que nele crê não pereça, mas tenha a vida eterna.'"
 
-    url = "https://api.openai.com/v1/chat/completions"
+def provider_chat(provider, api_key, model, message):
+    """Get a response from a provider's API through its adapter"""
+    adapter = get_adapter(provider)
+    if use_mock_llm():
+        logger.debug(f"Using mock response for {provider} in development mode")
+        return adapter.mock_response(message)
 
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}"
-    }
-
-    prompt = DEFAULT_PROMPT_TEMPLATE.format(message=message)
-
-    data = {
-        "model": model,
-        "messages": [
-            {"role": "system", "content": "Você é um assistente espiritual que oferece orientação baseada na Bíblia."},
-            {"role": "user", "content": prompt}
-        ],
-        "temperature": 0.7,
-        "max_tokens": 800
-    }
+    url, headers, data = adapter.build_request(api_key, model, message)
 
+    response = None
     try:
-        response = requests.post(url, headers=headers, json=data, timeout=30)
+        response = provider_clients.get_session(provider).post(
+            url, headers=headers, json=data, timeout=provider_clients.timeout)
         response.raise_for_status()
 
-        result = response.json()
-        return result["choices"][0]["message"]["content"].strip()
+        return adapter.parse_response(response.json())
     except requests.exceptions.RequestException as e:
-        logger.error(f"OpenAI API error: {str(e)}")
-        if response and response.text:
+        logger.error(f"{provider} API error: {str(e)}")
+        if response is not None and response.text:
             logger.error(f"Response: {response.text}")
-        raise Exception(f"Error calling OpenAI API: {str(e)}")
-
+        raise LLMProviderError.from_response(f"Error calling {provider} API: {str(e)}", response)
 
-def anthropic_chat(api_key, model, message):
-    """Get response from Anthropic Claude API"""
-    # Check if we're in development mode and should use mock responses
-    if current_app.config.get('ENV') == 'development' and current_app.config.get('USE_MOCK_LLM', False):
-        logger.info("Using mock response for Anthropic in development mode")
-        return f"Resposta simulada para: '{message}'\n\nComo diz em Salmos 23:1, 'O Senhor é o meu pastor, nada me faltará.'"
 
-    url = "https://api.anthropic.com/v1/messages"
-
-    headers = {
-        "Content-Type": "application/json",
-        "x-api-key": api_key,
-        "anthropic-version": "2023-06-01"
-    }
-
-    prompt = DEFAULT_PROMPT_TEMPLATE.format(message=message)
-
-    data = {
-        "model": model,
-        "messages": [
-            {"role": "user", "content": prompt}
-        ],
-        "max_tokens": 800
-    }
-
-    try:
-        response = requests.post(url, headers=headers, json=data, timeout=30)
-        response.raise_for_status()
-
-        result = response.json()
-        return result["content"][0]["text"].strip()
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Anthropic API error: {str(e)}")
-        if response and response.text:
-            logger.error(f"Response: {response.text}")
-        raise Exception(f"Error calling Anthropic API: {str(e)}")
+def get_llm_response(provider, model, api_key, message, template=None, regenerate=False,
+                     api_key_id=None):
+    """
+    Get response from the specified LLM provider
 
+    Args:
+        provider: The LLM provider (openai, anthropic, google, etc.)
+        model: The model name
+        api_key: The API key for the provider
+        message: The user message to process
+        template: Template text the message was built from (part of the cache key)
+        regenerate: Bypass the response cache lookup
+        api_key_id: APIKey.id, for the per-key circuit breaker
 
-def google_chat(api_key, model, message):
-    """Get response from Google Gemini API"""
-    # Check if we're in development mode and should use mock responses
-    if current_app.config.get('ENV') == 'development' and current_app.config.get('USE_MOCK_LLM', False):
-        logger.info("Using mock response for Google in development mode")
-        return f"Resposta simulada para: '{message}'\n\nComo diz em Provérbios 3:5-6, 'Confia no Senhor de todo o teu coração e não te estribes no teu próprio entendimento. Reconhece-o em todos os teus caminhos, e ele endireitará as tuas veredas.'"
+    Returns:
+        The LLM response as text
+    """
+    provider = provider.lower()
 
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={api_key}"
+    if not response_cache.enabled:
+        return _call_provider(provider, model, api_key, message, api_key_id)
 
-    headers = {
-        "Content-Type": "application/json"
-    }
+    cache_key = response_cache.make_key(provider, model, message, template)
+    if not regenerate:
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return cached
 
-    prompt = DEFAULT_PROMPT_TEMPLATE.format(message=message)
+    start = time.monotonic()
+    response = _call_provider(provider, model, api_key, message, api_key_id)
+    response_cache.set(cache_key, response, time.monotonic() - start)
+    return response
 
-    data = {
-        "contents": [
-            {
-                "role": "user",
-                "parts": [{"text": prompt}]
-            }
-        ],
-        "generationConfig": {
-            "temperature": 0.7,
-            "maxOutputTokens": 800
-        }
-    }
 
-    try:
-        response = requests.post(url, headers=headers, json=data, timeout=30)
-        response.raise_for_status()
+def _call_provider(provider, model, api_key, message, api_key_id=None):
+    """Call the provider handler with retries, behind its circuit breakers and bulkhead"""
+    def attempt():
+        ticket = circuit_breaker.before_call(provider, api_key_id)
+        try:
+            with llm_scheduler.hold(INTERACTIVE), bulkhead.hold(provider, model):
+                try:
+                    response = provider_chat(provider, api_key, model, message)
+                except Exception as e:
+                    circuit_breaker.after_call(ticket, provider, api_key_id, error=e)
+                    raise
+        except BaseException:
+            # No slot, interrupted, or an error that settles no probe: free the probes
+            circuit_breaker.release(ticket)
+            raise
+        circuit_breaker.after_call(ticket, provider, api_key_id)
+        return response
 
-        result = response.json()
-        return result["candidates"][0]["content"]["parts"][0]["text"].strip()
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Google API error: {str(e)}")
-        if response and response.text:
-            logger.error(f"Response: {response.text}")
-        raise Exception(f"Error calling Google API: {str(e)}")
+    return retry_policy.call(provider, attempt)
 
 
-def mistral_chat(api_key, model, message):
-    """Get response from Mistral AI API"""
-    # Check if we're in development mode and should use mock responses
-    if current_app.config.get('ENV') == 'development' and current_app.config.get('USE_MOCK_LLM', False):
-        logger.info("Using mock response for Mistral in development mode")
-        return f"Resposta simulada para: '{message}'\n\nComo diz em Mateus 11:28, 'Vinde a mim, todos os que estais cansados e oprimidos, e eu vos aliviarei.'"
+# Streaming handlers
 
-    url = "https://api.mistral.ai/v1/chat/completions"
 
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}"
-    }
+def _iter_sse_data(response):
+    """Yield the data payload of each Server-Sent Event from a response"""
+    for line in response.iter_lines(decode_unicode=True):
+        if line and line.startswith('data:'):
+            yield line[5:].strip()
 
-    prompt = DEFAULT_PROMPT_TEMPLATE.format(message=message)
 
-    data = {
-        "model": model,
-        "messages": [
-            {"role": "system", "content": "Você é um assistente espiritual que oferece orientação baseada na Bíblia."},
-            {"role": "user", "content": prompt}
-        ],
-        "temperature": 0.7,
-        "max_tokens": 800
-    }
+def _stream_request(provider, url, headers, data, extract_text):
+    """
+    POST a streaming request and yield text deltas.
 
+    Args:
+        provider: Provider name, used to pick the pooled session
+        url: Streaming endpoint URL
+        headers: Request headers
+        data: JSON payload
+        extract_text: Callable mapping a decoded event to a text delta (or None)
+    """
+    response = None
     try:
-        response = requests.post(url, headers=headers, json=data, timeout=30)
+        response = provider_clients.get_session(provider).post(
+            url, headers=headers, json=data, stream=True,
+            timeout=provider_clients.timeout)
         response.raise_for_status()
 
-        result = response.json()
-        return result["choices"][0]["message"]["content"].strip()
+        with response:
+            for payload in _iter_sse_data(response):
+                if payload == '[DONE]':
+                    break
+                try:
+                    event = json.loads(payload)
+                except ValueError:
+                    continue
+                text = extract_text(event)
+                if text:
+                    yield text
     except requests.exceptions.RequestException as e:
-        logger.error(f"Mistral API error: {str(e)}")
-        if response and response.text:
+        logger.error(f"{provider} streaming API error: {str(e)}")
+        if isinstance(e, requests.exceptions.HTTPError):
             logger.error(f"Response: {response.text}")
-        raise Exception(f"Error calling Mistral API: {str(e)}")
-
-
-def generic_chat(api_key, model, message, provider):
-    """Fallback for other providers - tries to use a standard format"""
-    # Check if we're in development mode and should use mock responses
-    if current_app.config.get('ENV') == 'development' and current_app.config.get('USE_MOCK_LLM', False):
-        logger.info(f"Using mock response for {provider} in development mode")
-        return f"Resposta simulada para: '{message}'\n\nComo diz em Filipenses 4:13, 'Posso todas as coisas naquele que me fortalece.'"
+        raise LLMProviderError.from_response(f"Error calling {provider} API: {str(e)}", response)
 
-    logger.warning(f"Using generic handler for provider: {provider}")
 
-    # For demonstration, we'll use a simple approach similar to OpenAI
-    url = f"https://api.{provider}.com/v1/chat/completions"
+def provider_chat_stream(provider, api_key, model, message, cache_prefix=''):
+    """Stream a response from a provider's API through its adapter"""
+    adapter = get_adapter(provider)
+    url, headers, data = adapter.build_request(api_key, model, message, stream=True,
+                                               cache_prefix=cache_prefix)
+    return _stream_request(provider, url, headers, data, adapter.extract_delta)
 
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}"
-    }
 
-    prompt = DEFAULT_PROMPT_TEMPLATE.format(message=message)
+def chunk_text(text, size=3):
+    """Split a finished response into word groups to mimic streaming"""
+    words = text.split(' ')
+    for i in range(0, len(words), size):
+        chunk = ' '.join(words[i:i + size])
+        yield chunk if i + size >= len(words) else chunk + ' '
 
-    data = {
-        "model": model,
-        "messages": [
-            {"role": "system", "content": "Você é um assistente espiritual que oferece orientação baseada na Bíblia."},
-            {"role": "user", "content": prompt}
-        ],
-        "temperature": 0.7,
-        "max_tokens": 800
-    }
 
-    try:
-        response = requests.post(url, headers=headers, json=data, timeout=30)
-        response.raise_for_status()
-
-        result = response.json()
-        # Try to parse the response in a format similar to OpenAI
-        if "choices" in result and len(result["choices"]) > 0:
-            if "message" in result["choices"][0]:
-                return result["choices"][0]["message"]["content"].strip()
-
-        # Fallback to returning the entire response as string
-        return json.dumps(result)
-    except requests.exceptions.RequestException as e:
-        logger.error(f"{provider} API error: {str(e)}")
-        if response and response.text:
-            logger.error(f"Response: {response.text}")
-        raise Exception(f"Error calling {provider} API: {str(e)}")
-
-
-def get_llm_response(provider, model, api_key, message):
+def stream_llm_response(provider, model, api_key, message, api_key_id=None, template=None):
     """
-    Get response from the specified LLM provider
+    Stream a response from the specified LLM provider
 
     Args:
         provider: The LLM provider (openai, anthropic, google, etc.)
         model: The model name
         api_key: The API key for the provider
         message: The user message to process
+        api_key_id: APIKey.id, for the per-key circuit breaker
+        template: Template text the message was built from (its fixed start
+            is marked for the provider's prompt cache)
 
     Returns:
-        The LLM response as text
+        A generator of text deltas, in the order the provider produced them
+
+    Raises:
+        CircuitOpenError: immediately, if the provider or key circuit is open
     """
     provider = provider.lower()
 
-    # Delegate to appropriate provider handler
-    if provider == 'openai':
-        return openai_chat(api_key, model, message)
-    elif provider == 'anthropic':
-        return anthropic_chat(api_key, model, message)
-    elif provider == 'google':
-        return google_chat(api_key, model, message)
-    elif provider == 'mistral':
-        return mistral_chat(api_key, model, message)
-    else:
-        return generic_chat(api_key, model, message, provider)
-
-# Definition of LLM service providers for use in the chat API
-
+    # Mock responses are returned whole, so stream them in small chunks
+    if use_mock_llm():
+        return chunk_text(get_llm_response(provider, model, api_key, message,
+                                           template=template, api_key_id=api_key_id))
 
-class LLMService:
-    def __init__(self, api_key=None):
-        self.api_key = api_key
+    circuit_breaker.check(provider, api_key_id)
+    cache_prefix = template_prefix(template)
+    return _guarded_stream(provider, model, api_key_id,
+                           lambda: provider_chat_stream(provider, api_key, model, message,
+                                                        cache_prefix))
 
-    def get_response(self, message, model=None):
-        raise NotImplementedError("Subclasses must implement this method")
 
-    def format_prompt(self, message, template=None, context=None):
-        if not template:
-            return message
-
-        # Basic template formatting with context
-        formatted = template.format(message=message)
-        if context:
-            # Add any context-specific formatting here if needed
-            pass
-        return formatted
-
-
-class OpenAIService(LLMService):
-    def get_response(self, message, model="gpt-3.5-turbo"):
-        return openai_chat(self.api_key, model, message)
-
-
-class AnthropicService(LLMService):
-    def get_response(self, message, model="claude-3-haiku-20240307"):
-        return anthropic_chat(self.api_key, model, message)
-
-
-class GoogleService(LLMService):
-    def get_response(self, message, model="gemini-pro"):
-        return google_chat(self.api_key, model, message)
-
-
-class MistralService(LLMService):
-    def get_response(self, message, model="mistral-medium"):
-        return mistral_chat(self.api_key, model, message)
-
-
-class GenericService(LLMService):
-    def __init__(self, api_key=None, provider="generic"):
-        super().__init__(api_key)
-        self.provider = provider
-
-    def get_response(self, message, model=None):
-        return generic_chat(self.api_key, model, message, self.provider)
-
-
-# Map of provider names to service classes
-LLM_SERVICES = {
-    'openai': OpenAIService,
-    'anthropic': AnthropicService,
-    'google': GoogleService,
-    'mistral': MistralService,
-    'generic': GenericService
-}
+def _guarded_stream(provider, model, api_key_id, open_stream):
+    """
+    Hold a breaker ticket and a scheduler and bulkhead slot for the whole
+    stream and report its outcome to the circuit breaker. All are taken when
+    the first token is requested, so a stream never iterated holds nothing;
+    opening the stream is retried (within LLM_REQUEST_DEADLINE) until the
+    first token arrives, never after.
+
+    A stream closed early (client disconnected) or cancelled still reports:
+    a success once the provider has answered, otherwise its probe slot is
+    given back without a verdict. So is a stream refused a slot.
+    """
+    answered = False
+    ticket = circuit_breaker.before_call(provider, api_key_id)
+    try:
+        with llm_scheduler.hold(INTERACTIVE), bulkhead.hold(provider, model) as lease:
+            with request_deadline(current_app.config.get('LLM_REQUEST_DEADLINE')):
+                first, tokens = retry_policy.call(
+                    provider, lambda: _first_token(open_stream()))
+            answered = True
+            if first is None:
+                tokens = iter(())
+            else:
+                yield first
+            for token in tokens:
+                if lease:
+                    lease.renew()
+                yield token
+    except Exception as e:
+        circuit_breaker.after_call(ticket, provider, api_key_id, error=e)
+        circuit_breaker.release(ticket)
+        raise
+    except BaseException:
+        if answered:
+            circuit_breaker.after_call(ticket, provider, api_key_id)
+        else:
+            circuit_breaker.release(ticket)
+        raise
+    circuit_breaker.after_call(ticket, provider, api_key_id)
+
+
+def _first_token(tokens):
+    """Start a token generator; return (first token or None, the generator)"""
+    return next(tokens, None), tokens
+
+
+# Older name for the provider service map; the async services are the only implementation
+LLM_SERVICES = LLM_PROVIDERS
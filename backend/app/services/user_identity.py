@@ -0,0 +1,208 @@
+import json
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import redis
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.models.database import db
+from app.models.user import User
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+
+# What the authenticated routes need to know about the caller
+UserIdentity = namedtuple('UserIdentity', 'id is_active is_admin')
+
+_KEY_PREFIX = 'user_identity:'
+# Bumped by every invalidation; a lookup only stores what it loaded if the
+# generation it saw before loading is still current
+_GENERATION_PREFIX = 'user_identity_gen:'
+# Cached "no such user", so unknown ids don't hit the database either
+_MISSING = 'null'
+
+_SET_IF_CURRENT_SCRIPT = """
+if (redis.call('get', KEYS[2]) or '') == ARGV[2] then
+    return redis.call('set', KEYS[1], ARGV[1], 'EX', ARGV[3])
+end
+return 0
+"""
+
+
+class UserIdentityCache:
+    """
+    Existence, is_active and is_admin of users, for the route handlers.
+
+    Looked up in a per-worker LRU (USER_IDENTITY_CACHE_SIZE entries kept
+    USER_IDENTITY_CACHE_TTL seconds), then in Redis (USER_IDENTITY_REDIS_TTL
+    seconds), then with a query for those three columns only. Commits that
+    update or delete a User invalidate both levels; another worker's LRU may
+    still answer from its copy for up to USER_IDENTITY_CACHE_TTL seconds.
+    A lookup racing an invalidation does not store the row it loaded, so
+    the stale copy is never cached. 0 as the local TTL disables the cache.
+    """
+
+    def __init__(self, redis_client=None):
+        self.redis = redis_client
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        # Invalidations seen by this worker, to spot one during a lookup
+        self._invalidations = 0
+
+    def _config(self, name, default):
+        if has_app_context():
+            return current_app.config.get(name, default)
+        return default
+
+    def _get_redis(self):
+        """Get Redis client from app or use existing one"""
+        if self.redis:
+            return self.redis
+        if has_app_context():
+            return current_app.extensions.get('redis')
+        return None
+
+    def get(self, user_id):
+        """
+        Identity of a user.
+
+        Returns:
+            UserIdentity, or None if the user doesn't exist
+        """
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return None
+
+        ttl = self._config('USER_IDENTITY_CACHE_TTL', 10)
+        if ttl <= 0:
+            return self._load(user_id)
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[1] > now:
+                self._entries.move_to_end(user_id)
+                metrics.incr('user_identity_cache_total', result='hit')
+                return entry[0]
+            invalidations = self._invalidations
+
+        identity, found, generation = self._get_shared(user_id)
+        if found:
+            metrics.incr('user_identity_cache_total', result='redis')
+        else:
+            metrics.incr('user_identity_cache_total', result='miss')
+            identity = self._load(user_id)
+            self._set_shared(user_id, identity, generation)
+
+        with self._lock:
+            if self._invalidations != invalidations:
+                # Invalidated meanwhile: what was read may predate the change
+                return identity
+            self._entries[user_id] = (identity, now + ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self._config('USER_IDENTITY_CACHE_SIZE', 10000):
+                self._entries.popitem(last=False)
+        return identity
+
+    def active(self, user_id):
+        """Identity of a user that exists and is active, else None"""
+        identity = self.get(user_id)
+        if identity and identity.is_active:
+            return identity
+        return None
+
+    def _load(self, user_id):
+        row = db.session.query(User.id, User.is_active, User.is_admin) \
+            .filter(User.id == user_id).first()
+        if row is None:
+            return None
+        # NULL (rows older than the columns' defaults) reads as the default
+        return UserIdentity(row.id, row.is_active is not False, bool(row.is_admin))
+
+    def _get_shared(self, user_id):
+        """(identity, found, generation) from Redis; generation is None without it"""
+        redis_client = self._get_redis()
+        if not redis_client:
+            return None, False, None
+        try:
+            value, generation = redis_client.mget(
+                f"{_KEY_PREFIX}{user_id}", f"{_GENERATION_PREFIX}{user_id}")
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Redis user identity error: {str(e)}")
+            return None, False, None
+        # No invalidation seen yet reads as '' (the script's view of a missing key)
+        generation = generation or ''
+        if value is None:
+            return None, False, generation
+        data = json.loads(value)
+        if data is None:
+            return None, True, generation
+        return UserIdentity(user_id, data['is_active'], data['is_admin']), True, generation
+
+    def _set_shared(self, user_id, identity, generation):
+        """Store a loaded identity unless the user was invalidated since `generation`"""
+        redis_client = self._get_redis()
+        if not redis_client or generation is None:
+            return
+        value = _MISSING if identity is None else json.dumps(
+            {'is_active': identity.is_active, 'is_admin': identity.is_admin})
+        try:
+            redis_client.eval(_SET_IF_CURRENT_SCRIPT, 2, f"{_KEY_PREFIX}{user_id}",
+                              f"{_GENERATION_PREFIX}{user_id}", value, generation,
+                              self._config('USER_IDENTITY_REDIS_TTL', 300))
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Redis user identity error: {str(e)}")
+
+    def invalidate(self, user_id):
+        """Forget a user's identity (updated, deactivated or deleted)"""
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._invalidations += 1
+        redis_client = self._get_redis()
+        if redis_client:
+            try:
+                pipe = redis_client.pipeline()
+                pipe.incr(f"{_GENERATION_PREFIX}{user_id}")
+                pipe.expire(f"{_GENERATION_PREFIX}{user_id}",
+                            self._config('USER_IDENTITY_REDIS_TTL', 300))
+                pipe.delete(f"{_KEY_PREFIX}{user_id}")
+                pipe.execute()
+            except redis.exceptions.RedisError as e:
+                logger.warning(f"Redis user identity error: {str(e)}")
+
+    def clear(self):
+        """Drop the per-worker entries - FOR TESTING ONLY"""
+        with self._lock:
+            self._entries.clear()
+
+
+# Singleton cache shared by the request handlers in this worker
+user_identity = UserIdentityCache()
+
+
+# Invalidate on commit: changed users are collected at flush time, because
+# after the commit the session no longer lists them. New users are included
+# since a lookup of their id may have cached "no such user". Only ORM changes
+# are seen; a bulk query.update() on users must call
+# user_identity.invalidate() itself.
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_users(session, flush_context):
+    changed = [obj.id for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+               if isinstance(obj, User) and obj.id is not None]
+    if changed:
+        session.info.setdefault('user_identity_changed', set()).update(changed)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_users(session):
+    for user_id in session.info.pop('user_identity_changed', ()):
+        user_identity.invalidate(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_users(session):
+    session.info.pop('user_identity_changed', None)
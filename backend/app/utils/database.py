@@ -1,7 +1,5 @@
-from flask_sqlalchemy import SQLAlchemy
-
-# SQLAlchemy instance
-db = SQLAlchemy()
+# Shared SQLAlchemy instance (the one the models are bound to)
+from app.models.database import db
 
 
 def init_db(app):
@@ -0,0 +1,61 @@
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+
+from app.utils.metrics import metrics
+
+
+# Time each pooled DB connection spends checked out (all engines in the
+# process): a connection held across a slow call shows up here long before
+# the pool runs out
+
+
+class PoolUsage:
+    """Pooled connections checked out in this process (now and peak)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checked_out = 0
+        self.peak = 0
+
+    def checkout(self):
+        with self._lock:
+            self.checked_out += 1
+            self.peak = max(self.peak, self.checked_out)
+
+    def checkin(self):
+        with self._lock:
+            self.checked_out -= 1
+
+    def reset_peak(self):
+        with self._lock:
+            self.peak = self.checked_out
+
+
+pool_usage = PoolUsage()
+
+
+@event.listens_for(Pool, 'checkout')
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    connection_record.info['checkout_start'] = time.monotonic()
+    pool_usage.checkout()
+
+
+@event.listens_for(Pool, 'checkin')
+def _on_checkin(dbapi_connection, connection_record):
+    start = connection_record.info.pop('checkout_start', None)
+    if start is not None:
+        pool_usage.checkin()
+        metrics.observe('db_pool_checkout_seconds', time.monotonic() - start)
+
+
+def _pool_gauges():
+    return {
+        'db_pool_checked_out': pool_usage.checked_out,
+        'db_pool_checked_out_peak': pool_usage.peak
+    }
+
+
+metrics.register_collector(_pool_gauges)
@@ -0,0 +1,256 @@
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+
+import redis
+from flask import current_app, jsonify, make_response, request, Response
+from flask_jwt_extended import get_jwt_identity
+
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+
+# Compare-and-delete, so a request never releases a claim it no longer owns
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Like 5xx, these mean "try again": not stored, so a retry runs again
+_TRANSIENT_STATUSES = (409, 429)
+
+# Response headers not stored for replay: set again for every response
+_UNSTORED_HEADERS = frozenset(['content-length', 'content-type', 'set-cookie', 'date', 'server'])
+
+
+class _LocalStore:
+    """
+    In-memory stand-in for the few Redis commands used here.
+
+    Only covers duplicates reaching the same worker; used when Redis is
+    not configured. Expired entries are swept on writes and at most
+    IDEMPOTENCY_LOCAL_MAX_ENTRIES are kept (oldest written dropped first),
+    so a fresh key per request doesn't grow the worker's memory for good.
+    """
+
+    # Seconds between sweeps of expired entries
+    SWEEP_INTERVAL = 10
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = OrderedDict()
+        self._next_sweep = 0
+
+    def get(self, key):
+        with self._lock:
+            value, expires = self._values.get(key, (None, 0))
+            return value if expires > time.monotonic() else None
+
+    def set(self, key, value, nx=False, ex=None):
+        now = time.monotonic()
+        with self._lock:
+            current = self._values.get(key)
+            if nx and current and current[1] > now:
+                return None
+            self._values.pop(key, None)
+            self._values[key] = (value, now + ex)
+            self._sweep(now)
+            return True
+
+    def _sweep(self, now):
+        if now >= self._next_sweep:
+            self._next_sweep = now + self.SWEEP_INTERVAL
+            for key in [key for key, (_, expires) in self._values.items() if expires <= now]:
+                del self._values[key]
+        limit = current_app.config.get('IDEMPOTENCY_LOCAL_MAX_ENTRIES', 10000)
+        while len(self._values) > limit:
+            self._values.popitem(last=False)
+
+    def release(self, key, token):
+        with self._lock:
+            if self._values.get(key, (None,))[0] == token:
+                del self._values[key]
+
+    def __len__(self):
+        return len(self._values)
+
+
+class IdempotencyKeys:
+    """
+    Idempotency-Key support for write endpoints.
+
+    The first request with a key claims it (SET NX with
+    IDEMPOTENCY_LOCK_TTL) and runs; its response is stored for
+    IDEMPOTENCY_TTL. A duplicate arriving meanwhile waits for that response
+    (up to IDEMPOTENCY_WAIT_TIMEOUT) instead of running again, and a later
+    duplicate replays it with an Idempotent-Replayed header. Keys are
+    scoped per user; reusing one for a different request is a 422.
+
+    Failed requests (5xx, 409, 429 or an exception) store nothing and drop
+    the claim, so a retry runs again. Without Redis duplicates are only
+    detected within the same worker; on Redis errors requests run as if
+    they had no key.
+    """
+
+    KEY_PREFIX = 'idempotency:'
+    HEADER = 'Idempotency-Key'
+
+    def __init__(self, redis_client=None):
+        self.redis = redis_client
+        self._local = _LocalStore()
+
+    def _get_redis(self):
+        """Get Redis client from app or use existing one"""
+        if self.redis:
+            return self.redis
+        return current_app.extensions.get('redis')
+
+    def idempotent(self, f):
+        """Decorator honouring the Idempotency-Key header on a view"""
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            key = request.headers.get(self.HEADER)
+            if not key or not current_app.config.get('IDEMPOTENCY_ENABLED', True):
+                return f(*args, **kwargs)
+            if len(key) > 255:
+                return jsonify({'error': f'{self.HEADER} must be at most 255 characters'}), 400
+
+            user_id = kwargs.get('user_id') or get_jwt_identity()
+            if user_id is None:
+                return f(*args, **kwargs)
+
+            fingerprint = self._fingerprint()
+            try:
+                response, claim = self._claim(f"{user_id}:{key}", fingerprint)
+            except redis.exceptions.RedisError as e:
+                logger.warning(f"Redis idempotency error: {str(e)}")
+                metrics.incr('idempotency_requests_total', result='unavailable')
+                return f(*args, **kwargs)
+            if response is not None:
+                return response
+            return self._run(claim, fingerprint, f, args, kwargs)
+
+        return decorated
+
+    def _fingerprint(self):
+        """Hash of what makes two requests the same request"""
+        digest = hashlib.sha256()
+        # With the query string: the same key with other arguments is another request
+        digest.update(f"{request.method} {request.full_path}\n".encode('utf-8'))
+        digest.update(request.get_data())
+        return digest.hexdigest()
+
+    def _claim(self, scope, fingerprint):
+        """
+        Claim the key, or get the stored response (waiting for it if the
+        same request is in flight).
+
+        Returns:
+            (response, None) to answer without running the view, or
+            (None, claim) when this request runs it
+        """
+        store = self._get_redis() or self._local
+        config = current_app.config
+        lock_key = self.KEY_PREFIX + 'lock:' + scope
+        result_key = self.KEY_PREFIX + 'result:' + scope
+        deadline = time.monotonic() + config.get('IDEMPOTENCY_WAIT_TIMEOUT', 40)
+        poll = config.get('IDEMPOTENCY_POLL_INTERVAL', 0.1)
+        waited = False
+
+        while True:
+            stored = store.get(result_key)
+            if stored is not None:
+                return self._replay(json.loads(stored), fingerprint, waited), None
+
+            token = uuid.uuid4().hex
+            if store.set(lock_key, token, nx=True, ex=config.get('IDEMPOTENCY_LOCK_TTL', 90)):
+                # The first request may have finished between the two reads
+                stored = store.get(result_key)
+                if stored is not None:
+                    self._release(store, lock_key, token)
+                    return self._replay(json.loads(stored), fingerprint, waited), None
+                return None, (store, lock_key, result_key, token)
+
+            # Same request in flight: wait for its response
+            if time.monotonic() >= deadline:
+                metrics.incr('idempotency_requests_total', result='conflict')
+                response = jsonify({'error': 'A request with this Idempotency-Key is in progress'})
+                response.status_code = 409
+                response.headers['Retry-After'] = '1'
+                return response, None
+            waited = True
+            time.sleep(poll)
+
+    def _run(self, claim, fingerprint, f, args, kwargs):
+        """Run the first request with a key and store its response"""
+        store, lock_key, result_key, token = claim
+        metrics.incr('idempotency_requests_total', result='first')
+        try:
+            response = make_response(f(*args, **kwargs))
+        except Exception:
+            self._release(store, lock_key, token)
+            raise
+
+        if response.is_streamed or response.status_code >= 500 \
+                or response.status_code in _TRANSIENT_STATUSES:
+            self._release(store, lock_key, token)
+            return response
+
+        stored = json.dumps({
+            'fingerprint': fingerprint,
+            'status': response.status_code,
+            'content_type': response.content_type,
+            'headers': [(name, value) for name, value in response.headers
+                        if name.lower() not in _UNSTORED_HEADERS
+                        and not name.lower().startswith('access-control-')],
+            'body': response.get_data(as_text=True)
+        })
+        try:
+            store.set(result_key, stored, ex=current_app.config.get('IDEMPOTENCY_TTL', 86400))
+        except redis.exceptions.RedisError as e:
+            # The response is already made; duplicates will just run again
+            logger.warning(f"Redis idempotency store failed: {str(e)}")
+        self._release(store, lock_key, token)
+        return response
+
+    def _replay(self, stored, fingerprint, waited):
+        if stored['fingerprint'] != fingerprint:
+            metrics.incr('idempotency_requests_total', result='mismatch')
+            return jsonify({
+                'error': f'{self.HEADER} was already used for a different request'
+            }), 422
+
+        metrics.incr('idempotency_requests_total', result='waited' if waited else 'replayed')
+        # Responses stored before headers were kept only have a mimetype
+        response = Response(stored['body'], status=stored['status'],
+                            content_type=stored.get('content_type'),
+                            mimetype=stored.get('mimetype'))
+        for name, value in stored.get('headers', ()):
+            response.headers.add(name, value)
+        response.headers['Idempotent-Replayed'] = 'true'
+        return response
+
+    def _release(self, store, lock_key, token):
+        """Drop a claim; if Redis fails it expires after IDEMPOTENCY_LOCK_TTL"""
+        if store is self._local:
+            store.release(lock_key, token)
+            return
+        try:
+            store.eval(_RELEASE_SCRIPT, 1, lock_key, token)
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Redis idempotency release failed: {str(e)}")
+
+
+# Singleton instance for use in the app
+idempotency = IdempotencyKeys()
+
+
+# Convenience decorator for write routes
+def idempotent(f):
+    """Make a write route safe to retry with an Idempotency-Key header"""
+    return idempotency.idempotent(f)
@@ -0,0 +1,87 @@
+import threading
+from collections import defaultdict
+
+
+def _metric_key(name, labels):
+    """Render a metric name with its labels, e.g. llm_calls{provider=openai}"""
+    if not labels:
+        return name
+    rendered = ','.join(f"{k}={labels[k]}" for k in sorted(labels))
+    return f"{name}{{{rendered}}}"
+
+
+class MetricsRegistry:
+    """
+    In-process counters, gauges and timings.
+
+    Values are per worker process; the /metrics endpoint exposes the
+    snapshot of the worker that serves the request.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._gauges = {}
+        self._timings = {}
+        self._collectors = []
+
+    def incr(self, name, value=1, **labels):
+        """Increment a counter"""
+        key = _metric_key(name, labels)
+        with self._lock:
+            self._counters[key] += value
+
+    def set_gauge(self, name, value, **labels):
+        """Set a gauge to an absolute value"""
+        key = _metric_key(name, labels)
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name, value, **labels):
+        """Record a timing/size sample (count, sum and max are kept)"""
+        key = _metric_key(name, labels)
+        with self._lock:
+            timing = self._timings.setdefault(
+                key, {'count': 0, 'sum': 0.0, 'max': 0.0})
+            timing['count'] += 1
+            timing['sum'] += value
+            timing['max'] = max(timing['max'], value)
+
+    def register_collector(self, collector):
+        """Register a callable returning extra gauges at snapshot time"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def counter(self, name, **labels):
+        """Current value of a counter"""
+        with self._lock:
+            return self._counters.get(_metric_key(name, labels), 0)
+
+    def snapshot(self):
+        """Return all metrics as a JSON-serialisable dict"""
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            timings = {key: dict(value)
+                       for key, value in self._timings.items()}
+            collectors = list(self._collectors)
+
+        for collector in collectors:
+            gauges.update(collector())
+
+        return {
+            'counters': counters,
+            'gauges': gauges,
+            'timings': timings
+        }
+
+    def reset(self):
+        """Clear all recorded values - FOR TESTING ONLY"""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._timings.clear()
+
+
+# Singleton registry for use in the app
+metrics = MetricsRegistry()
@@ -1,5 +1,6 @@
 import re
 import os
+from functools import lru_cache
 from cryptography.fernet import Fernet
 from flask import current_app
 import base64
@@ -95,11 +96,17 @@ def token_required(f):
 
 def get_encryption_key():
     """Get or generate the AES-256 encryption key from environment"""
-    key = current_app.config.get('ENCRYPTION_KEY')
+    return _derive_encryption_key(
+        current_app.config.get('ENCRYPTION_KEY'),
+        current_app.config.get('SECRET_KEY', 'fallback_secret_key'))
+
+
+@lru_cache(maxsize=8)
+def _derive_encryption_key(key, base_key):
+    """The key bytes for the configured values, computed once per worker"""
     if not key:
         # If no key is set, use a derived key from the SECRET_KEY
         # This is not ideal for production, but works for development
-        base_key = current_app.config.get('SECRET_KEY', 'fallback_secret_key')
         # Ensure the key is 32 bytes (256 bits) for AES-256
         key = base_key.ljust(32)[:32].encode('utf-8')
     else:
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""
+Benchmark: auth plus API key lookup cost per chat request.
+
+Repeats what every chat request does before calling the provider: verify
+the JWT, load the user's APIKey row and decrypt the key. Reports the mean
+cost per request, and of the decrypt alone, with:
+
+  uncached - key derived from config on every request (previous behaviour)
+  cached   - derived key computed once per worker
+
+Usage: python benchmarks/bench_api_key_lookup.py [requests]
+"""
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token, decode_token  # noqa: E402
+
+from app import create_app  # noqa: E402
+from app.models.api_key import APIKey  # noqa: E402
+from app.models.database import db  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.utils.security import _derive_encryption_key  # noqa: E402
+
+
+def run(label, token, requests, cached):
+    total = decrypt = 0.0
+    for _ in range(requests):
+        if not cached:
+            _derive_encryption_key.cache_clear()
+        start = time.perf_counter()
+        user_id = decode_token(token)['sub']
+        api_key = APIKey.query.filter_by(
+            user_id=user_id, provider='openai', is_active=True).first()
+        middle = time.perf_counter()
+        assert api_key.get_api_key() == 'sk-bench'
+        end = time.perf_counter()
+        total += end - start
+        decrypt += end - middle
+        # A new request starts with a fresh session
+        db.session.remove()
+    print(f"{label:<9} requests={requests:<6} per_request={total / requests * 1e6:8.1f} us "
+          f"decrypt={decrypt / requests * 1e6:7.1f} us")
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+        'REDIS_URL': None,
+        'JWT_SECRET_KEY': 'bench_jwt_key'
+    })
+    with app.app_context():
+        db.create_all()
+        user = User(email='bench@example.com', password='password123')
+        user.save()
+        APIKey(user.id, 'openai', 'sk-bench').save()
+        token = create_access_token(identity=user.id)
+
+        run('uncached', token, requests, cached=False)
+        run('cached', token, requests, cached=True)
+
+
+if __name__ == '__main__':
+    main()
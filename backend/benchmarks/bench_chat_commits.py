@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""
+Benchmark: database commits and DB time per chat request.
+
+Sends chat messages through POST /api/chat/message (new conversations and
+follow-ups) against a local stand-in provider, on a file SQLite database
+so every commit is a real fsync. Counts COMMITs per request and reports
+the mean and p95 time spent in the database (statements plus commits),
+separately from the upstream call.
+
+Usage: python benchmarks/bench_chat_commits.py [requests]
+"""
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from sqlalchemy import event
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token  # noqa: E402
+
+from app import create_app  # noqa: E402
+from app.models.api_key import APIKey  # noqa: E402
+from app.models.database import db  # noqa: E402
+from app.models.user import User  # noqa: E402
+from benchmarks.standin_server import StandInServer  # noqa: E402
+
+
+class DBTimer:
+    """Commits and time spent in the database, per request"""
+
+    def __init__(self, engine):
+        self.commits = 0
+        self.seconds = 0.0
+        self._local = threading.local()
+        event.listen(engine, 'before_cursor_execute', self._before)
+        event.listen(engine, 'after_cursor_execute', self._after)
+        # The COMMIT itself (the fsync) is not a cursor execute: time the dialect call
+        self._do_commit = engine.dialect.do_commit
+        engine.dialect.do_commit = self._commit
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        self._local.start = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        self.seconds += time.perf_counter() - self._local.start
+
+    def _commit(self, dbapi_connection):
+        self.commits += 1
+        start = time.perf_counter()
+        self._do_commit(dbapi_connection)
+        self.seconds += time.perf_counter() - start
+
+    def reset(self):
+        self.commits = 0
+        self.seconds = 0.0
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    server = StandInServer().start()
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+        'REDIS_URL': None,
+        'JWT_SECRET_KEY': 'bench_jwt_key',
+        'LLM_CACHE_ENABLED': False,
+        'LLM_SUMMARY_ENABLED': False,
+        'LLM_BASE_URL': server.base_url
+    })
+    try:
+        with app.app_context():
+            db.create_all()
+            user = User(email='bench@example.com', password='password123')
+            user.save()
+            APIKey(user.id, 'openai', 'sk-bench').save()
+            headers = {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+            timer = DBTimer(db.engine)
+
+        client = app.test_client()
+        commits = []
+        db_times = []
+        conversation_id = None
+        for i in range(requests):
+            payload = {'message': f'pergunta {i}', 'provider': 'openai', 'model': 'gpt'}
+            # Every other request continues the previous conversation
+            if i % 2 and conversation_id:
+                payload['conversation_id'] = conversation_id
+            timer.reset()
+            response = client.post('/api/chat/message', json=payload, headers=headers)
+            assert response.status_code == 200, response.get_json()
+            conversation_id = response.get_json()['conversation_id']
+            commits.append(timer.commits)
+            db_times.append(timer.seconds)
+
+        p95 = statistics.quantiles(db_times, n=20)[-1]
+        print(f"requests={requests} commits/request={statistics.mean(commits):.2f} "
+              f"db_mean={statistics.mean(db_times) * 1000:.2f} ms "
+              f"db_p95={p95 * 1000:.2f} ms")
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""
+Benchmark: bare requests.post vs the pooled provider session.
+
+Sends the same chat payload to a local stand-in server and reports how many
+TCP connections each strategy opened and the mean latency per call.
+
+Usage: python benchmarks/bench_connection_reuse.py [calls]
+"""
+import os
+import sys
+import time
+
+import requests
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.llm.clients import ProviderClientRegistry  # noqa: E402
+from benchmarks.standin_server import StandInServer  # noqa: E402
+
+PAYLOAD = {
+    'model': 'gpt-3.5-turbo',
+    'messages': [{'role': 'user', 'content': 'como vencer a ansiedade?'}]
+}
+
+
+def run(label, post, server, calls):
+    server.reset_stats()
+    start = time.perf_counter()
+    for _ in range(calls):
+        response = post(server.url, json=PAYLOAD, timeout=(5, 30))
+        response.raise_for_status()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<16} calls={calls:<5} connections={server.stats['connections']:<5} "
+          f"mean={elapsed / calls * 1000:.2f} ms")
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    server = StandInServer().start()
+    try:
+        run('requests.post', requests.post, server, calls)
+
+        registry = ProviderClientRegistry()
+        run('pooled session', registry.get_session('openai').post,
+            server, calls)
+        registry.close_all()
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
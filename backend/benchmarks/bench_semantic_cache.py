@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""
+Benchmark: semantic cache lookup latency at large index sizes.
+
+Fills one SemanticIndex with random unit vectors (plus a few real prompts)
+and measures nearest-neighbour lookup latency for paraphrased questions.
+
+Usage: python benchmarks/bench_semantic_cache.py [entries] [dim]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.llm.semantic_cache import HashedNgramVectorizer, SemanticIndex  # noqa: E402
+
+PROMPTS = [
+    ('como vencer a ansiedade?', 'como posso vencer minha ansiedade?'),
+    ('o que a bíblia diz sobre o perdão?', 'o que a biblia fala sobre perdão'),
+    ('como orar melhor', 'como eu posso orar melhor?'),
+]
+
+
+def main():
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    dim = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+    vectorizer = HashedNgramVectorizer(dim=dim)
+    index = SemanticIndex(dim, capacity=entries + len(PROMPTS))
+
+    start = time.perf_counter()
+    rng = np.random.default_rng(42)
+    batch = 100000
+    for offset in range(0, entries, batch):
+        size = min(batch, entries - offset)
+        vectors = rng.standard_normal((size, dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        index.add_batch(vectors, np.arange(offset, offset + size))
+    for i, (cached, _) in enumerate(PROMPTS):
+        index.add(vectorizer.transform(cached), entries + i)
+    print(f"index: {index.size} entries, dim={dim}, "
+          f"{(index.vectors.nbytes + index.message_ids.nbytes) / 2 ** 20:.0f} MiB, "
+          f"built in {time.perf_counter() - start:.1f}s")
+
+    samples = []
+    for _ in range(20):
+        for i, (_, paraphrase) in enumerate(PROMPTS):
+            start = time.perf_counter()
+            score, message_id = index.nearest(vectorizer.transform(paraphrase))
+            samples.append(time.perf_counter() - start)
+            assert message_id == entries + i
+
+    samples = np.array(samples) * 1000
+    print(f"lookup (vectorize + scan): p50={np.percentile(samples, 50):.1f} ms "
+          f"p99={np.percentile(samples, 99):.1f} ms")
+    for cached, paraphrase in PROMPTS:
+        score = float(vectorizer.transform(cached) @ vectorizer.transform(paraphrase))
+        print(f"  cos={score:.2f}  '{paraphrase}' -> '{cached}'")
+
+
+if __name__ == '__main__':
+    main()
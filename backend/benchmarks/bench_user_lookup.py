@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""
+Benchmark: user existence check per authenticated request.
+
+Repeats the check the conversation/notes/chat handlers make before doing
+any work, each "request" starting with a fresh session. Reports the mean
+cost per request and the queries sent to the database with:
+
+  query  - User.query.get(user_id) (previous behaviour)
+  cached - user_identity.active(user_id)
+
+Usage: python benchmarks/bench_user_lookup.py [requests]
+"""
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event  # noqa: E402
+
+from app import create_app  # noqa: E402
+from app.models.database import db  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.services.user_identity import user_identity  # noqa: E402
+
+
+def run(label, check, user_id, requests):
+    queries = []
+
+    def count(*args):
+        queries.append(1)
+
+    user_identity.clear()
+    event.listen(db.engine, 'before_cursor_execute', count)
+    total = 0.0
+    for _ in range(requests):
+        start = time.perf_counter()
+        assert check(user_id)
+        total += time.perf_counter() - start
+        db.session.remove()
+    event.remove(db.engine, 'before_cursor_execute', count)
+    print(f"{label:<7} requests={requests:<6} per_request={total / requests * 1e6:7.1f} us "
+          f"queries={len(queries)}")
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+        'REDIS_URL': None
+    })
+    with app.app_context():
+        db.create_all()
+        user = User(email='bench@example.com', password='password123')
+        user.save()
+        user_id = user.id
+
+        run('query', User.query.get, user_id, requests)
+        run('cached', user_identity.active, user_id, requests)
+
+
+if __name__ == '__main__':
+    main()
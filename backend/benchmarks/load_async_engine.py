@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""
+Load test: blocking workers vs the async LLM engine.
+
+A stand-in provider answers every call after a fixed artificial latency.
+For growing numbers of concurrent chat requests this compares:
+
+  sync     - a fixed pool of blocking workers (one upstream call each)
+  engine   - all calls awaited concurrently on the per-process async engine
+
+Usage: python benchmarks/load_async_engine.py [latency_seconds] [sync_workers]
+"""
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.llm.clients import ProviderClientRegistry  # noqa: E402
+from app.services.llm.engine import AsyncLLMEngine  # noqa: E402
+from benchmarks.standin_server import StandInServer  # noqa: E402
+
+PAYLOAD = {
+    'model': 'gpt-3.5-turbo',
+    'messages': [{'role': 'user', 'content': 'como vencer a ansiedade?'}]
+}
+CONCURRENCY = [1, 10, 50, 100, 200]
+
+
+def run_sync(server, workers, calls):
+    session = ProviderClientRegistry().get_session('openai')
+
+    def call(_):
+        session.post(server.url, json=PAYLOAD, timeout=(5, 30)).raise_for_status()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(call, range(calls)))
+    return time.perf_counter() - start
+
+
+def run_engine(server, engine, calls):
+    async def burst():
+        await asyncio.gather(*[
+            engine.post_json('openai', server.url, {}, PAYLOAD)
+            for _ in range(calls)
+        ])
+
+    start = time.perf_counter()
+    engine.run(burst())
+    return time.perf_counter() - start
+
+
+def main():
+    latency = float(sys.argv[1]) if len(sys.argv) > 1 else 0.2
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+    server = StandInServer(latency=latency).start()
+    engine = AsyncLLMEngine()
+    try:
+        print(f"upstream latency={latency * 1000:.0f} ms, sync workers={workers}")
+        print(f"{'concurrent':>10} {'sync s':>8} {'sync rps':>9} "
+              f"{'engine s':>9} {'engine rps':>11}")
+        for calls in CONCURRENCY:
+            sync_elapsed = run_sync(server, workers, calls)
+            engine_elapsed = run_engine(server, engine, calls)
+            print(f"{calls:>10} {sync_elapsed:>8.2f} {calls / sync_elapsed:>9.1f} "
+                  f"{engine_elapsed:>9.2f} {calls / engine_elapsed:>11.1f}")
+    finally:
+        engine.close()
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
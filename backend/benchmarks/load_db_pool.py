@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+"""
+Load test: DB pool usage of concurrent chats as LLM latency grows.
+
+Concurrent clients send chat messages through POST /api/chat/message to a
+stand-in provider whose latency grows each round. The app runs on a
+QueuePool of 5 connections plus 15 overflow, as in production Postgres.
+For each latency this reports the average number of connections in use
+(total check-out time / wall time), the peak, the mean time a connection
+stayed checked out, and how many requests failed (e.g. pool timeouts).
+
+  release  - the connection goes back to the pool during the upstream call
+  hold     - the connection stays checked out through the call (previous
+             behaviour)
+
+Usage: python benchmarks/load_db_pool.py [clients] [requests_per_client]
+"""
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy.pool import QueuePool
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token  # noqa: E402
+
+import app.api.chat as chat_api  # noqa: E402
+from app import create_app  # noqa: E402
+from app.models.api_key import APIKey  # noqa: E402
+from app.models.database import db  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.utils.db_pool import pool_usage  # noqa: E402
+from app.utils.metrics import metrics  # noqa: E402
+from benchmarks.standin_server import StandInServer  # noqa: E402
+
+LATENCIES = [0.05, 0.2, 0.5, 1.0]
+POOL_SIZE = 5
+MAX_OVERFLOW = 15
+
+
+def run(app, headers, clients, requests):
+    def client_loop(_):
+        client = app.test_client()
+        failed = 0
+        for i in range(requests):
+            response = client.post('/api/chat/message', headers=headers, json={
+                'message': f'pergunta {i}', 'provider': 'openai', 'model': 'gpt'})
+            failed += response.status_code != 200
+        return failed
+
+    metrics.reset()
+    pool_usage.reset_peak()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        failed = sum(pool.map(client_loop, range(clients)))
+    elapsed = time.perf_counter() - start
+    checkout = metrics.snapshot()['timings']['db_pool_checkout_seconds']
+    return (checkout['sum'] / elapsed, pool_usage.peak,
+            checkout['sum'] / checkout['count'], failed)
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+    server = StandInServer().start()
+    path = os.path.join(tempfile.mkdtemp(), 'load.db')
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+        'SQLALCHEMY_ENGINE_OPTIONS': {
+            'poolclass': QueuePool, 'pool_size': POOL_SIZE, 'max_overflow': MAX_OVERFLOW,
+            'pool_timeout': 5, 'connect_args': {'check_same_thread': False, 'timeout': 30}},
+        'REDIS_URL': None,
+        'JWT_SECRET_KEY': 'bench_jwt_key',
+        'LLM_CACHE_ENABLED': False,
+        'LLM_SUMMARY_ENABLED': False,
+        'LLM_BASE_URL': server.base_url
+    })
+    with app.app_context():
+        db.create_all()
+        user = User(email='load@example.com', password='password123')
+        user.save()
+        APIKey(user.id, 'openai', 'sk-load').save()
+        headers = {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+
+    release = chat_api.release_connection
+    print(f"clients={clients} requests/client={requests} "
+          f"pool_size={POOL_SIZE} max_overflow={MAX_OVERFLOW}")
+    print(f"{'mode':<8} {'latency':>8} {'in_use':>7} {'peak':>5} {'mean_out':>10} {'failed':>7}")
+    try:
+        for mode in ('release', 'hold'):
+            chat_api.release_connection = release if mode == 'release' else (lambda: None)
+            for latency in LATENCIES:
+                server.latency = latency
+                in_use, peak, mean, failed = run(app, headers, clients, requests)
+                print(f"{mode:<8} {latency:>7.2f}s {in_use:>7.2f} {peak:>5} "
+                      f"{mean * 1000:>8.1f}ms {failed:>7}")
+    finally:
+        chat_api.release_connection = release
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
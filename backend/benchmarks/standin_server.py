@@ -0,0 +1,443 @@
+#!/usr/bin/env python
+"""
+Local stand-in for the LLM provider APIs.
+
+Speaks the OpenAI/Mistral chat completions, Anthropic messages and Gemini
+generateContent wire formats, streaming included, on their usual paths, so
+the real HTTP path of the app (pooling, timeouts, JSON/SSE parsing) can be
+exercised without touching a provider. It counts accepted TCP connections
+and requests, and can add:
+
+- a latency distribution (log-normal, fitted to a p50 and a p99),
+- a token rate (tokens per second while generating the reply),
+- random errors and 429s at a given rate,
+- one-off faults (error statuses with an optional Retry-After, latency
+  spikes) for the next requests.
+
+It also emulates prompt prefix caching and reports cached prompt tokens in
+each format's usage fields: Anthropic prefixes up to a cache_control
+breakpoint (malformed markers are rejected with a 400), and for OpenAI
+(per prompt_cache_key) and Gemini (per model) the prefix shared with the
+previous prompt.
+
+Point the app at it with LLM_BASE_URL (all providers) or
+LLM_PROVIDER_BASE_URLS (per provider).
+
+Usage: python benchmarks/standin_server.py [--port 8900] [--p50 0.3]
+       [--p99 1.5] [--token-rate 40] [--error-rate 0.01]
+       [--rate-limit-rate 0.05]
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import socket
+import threading
+import os
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# z-score of the 99th percentile of a standard normal
+_Z99 = 2.3263
+
+_GEMINI_PATH = re.compile(r'/models/(?P<model>[^/:]+):(?P<method>\w+)')
+
+
+def _estimate_tokens(payload):
+    """Rough prompt size, ~4 characters per token"""
+    return max(1, len(json.dumps(payload, ensure_ascii=False)) // 4)
+
+
+def _blocks(content):
+    """Content blocks of an Anthropic system prompt or message"""
+    if isinstance(content, list):
+        return content
+    return [{'type': 'text', 'text': content}] if content else []
+
+
+def _prompt_text(wire, payload):
+    """The prompt text in send order (for prefix matching)"""
+    if wire == 'gemini':
+        return ''.join(part.get('text', '') for content in payload.get('contents', [])
+                       for part in content.get('parts', []))
+    return ''.join(message['content'] if isinstance(message['content'], str) else
+                   ''.join(block.get('text', '') for block in message['content'])
+                   for message in payload.get('messages', []))
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.server.count('connections')
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        self.server.count('requests')
+        self.server.last_payload = payload
+
+        path = self.path.split('?', 1)[0]
+        gemini = _GEMINI_PATH.search(path)
+        if path.endswith('/chat/completions'):
+            wire, stream = 'openai', bool(payload.get('stream'))
+        elif path.endswith('/messages'):
+            wire, stream = 'anthropic', bool(payload.get('stream'))
+        elif gemini:
+            wire, stream = 'gemini', gemini.group('method') == 'streamGenerateContent'
+        else:
+            self._send_json(404, {'error': {'message': f'unknown path {path}'}})
+            return
+
+        markers = self._cache_markers(wire, payload)
+        if markers is None:
+            self._send_json(400, {'type': 'error', 'error': {
+                'type': 'invalid_request_error',
+                'message': 'cache_control must be {"type": "ephemeral"}, at most 4 blocks'}})
+            return
+
+        fault = self.server.next_fault()
+        delay = self.server.sample_latency() + fault.get('latency', 0)
+        if delay:
+            time.sleep(delay)
+        if fault.get('status'):
+            self._error(wire, fault['status'], fault.get('retry_after'))
+            return
+
+        prompt_tokens = _estimate_tokens(payload)
+        cache = self.server.prompt_cache(wire, payload, markers)
+        if stream:
+            getattr(self, f'_stream_{wire}')(prompt_tokens, cache)
+            return
+
+        tokens = self.server.reply.split()
+        self.server.generate(len(tokens))
+        self._send_json(200, getattr(self, f'_reply_{wire}')(
+            payload, self.server.reply, prompt_tokens, len(tokens), cache))
+
+    def _cache_markers(self, wire, payload):
+        """Prompt prefixes ending at Anthropic cache breakpoints; None if malformed"""
+        if wire != 'anthropic':
+            return []
+        text = ''
+        markers = []
+        blocks = _blocks(payload.get('system'))
+        for message in payload.get('messages', []):
+            blocks = blocks + _blocks(message.get('content'))
+        for block in blocks:
+            text += block.get('text', '')
+            marker = block.get('cache_control')
+            if marker is not None:
+                if marker != {'type': 'ephemeral'}:
+                    return None
+                markers.append(text)
+        return markers if len(markers) <= 4 else None
+
+    # Non-streaming bodies
+
+    def _reply_openai(self, payload, text, prompt_tokens, completion_tokens, cache):
+        return {
+            'id': 'chatcmpl-standin',
+            'object': 'chat.completion',
+            'model': payload.get('model'),
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': text}}],
+            'usage': {'prompt_tokens': prompt_tokens,
+                      'completion_tokens': completion_tokens,
+                      'total_tokens': prompt_tokens + completion_tokens,
+                      'prompt_tokens_details': {'cached_tokens': cache['read']}}
+        }
+
+    def _reply_anthropic(self, payload, text, prompt_tokens, completion_tokens, cache):
+        return {
+            'id': 'msg_standin',
+            'type': 'message',
+            'role': 'assistant',
+            'model': payload.get('model'),
+            'content': [{'type': 'text', 'text': text}],
+            'stop_reason': 'end_turn',
+            'usage': self._anthropic_usage(prompt_tokens, completion_tokens, cache)
+        }
+
+    def _anthropic_usage(self, prompt_tokens, completion_tokens, cache):
+        # input_tokens excludes the tokens read from or written to the cache
+        return {'input_tokens': max(0, prompt_tokens - cache['read'] - cache['written']),
+                'cache_read_input_tokens': cache['read'],
+                'cache_creation_input_tokens': cache['written'],
+                'output_tokens': completion_tokens}
+
+    def _reply_gemini(self, payload, text, prompt_tokens, completion_tokens, cache):
+        return {
+            'candidates': [{'content': {'role': 'model', 'parts': [{'text': text}]},
+                            'finishReason': 'STOP'}],
+            'usageMetadata': {'promptTokenCount': prompt_tokens,
+                              'cachedContentTokenCount': cache['read'],
+                              'candidatesTokenCount': completion_tokens,
+                              'totalTokenCount': prompt_tokens + completion_tokens}
+        }
+
+    # Streaming bodies (SSE over chunked encoding)
+
+    def _stream_openai(self, prompt_tokens, cache):
+        self._start_stream()
+        for token in self.server.tokens:
+            self.server.generate(1)
+            self._event({'choices': [{'index': 0, 'delta': {'content': token}}]})
+        self._write_chunk('data: [DONE]\n\n')
+        self._end_stream()
+
+    def _stream_anthropic(self, prompt_tokens, cache):
+        self._start_stream()
+        self._event({'type': 'message_start', 'message': {
+            'type': 'message', 'role': 'assistant', 'content': [],
+            'usage': self._anthropic_usage(prompt_tokens, 0, cache)}},
+            'message_start')
+        self._event({'type': 'content_block_start', 'index': 0,
+                     'content_block': {'type': 'text', 'text': ''}},
+                    'content_block_start')
+        for token in self.server.tokens:
+            self.server.generate(1)
+            self._event({'type': 'content_block_delta', 'index': 0,
+                         'delta': {'type': 'text_delta', 'text': token}},
+                        'content_block_delta')
+        self._event({'type': 'content_block_stop', 'index': 0}, 'content_block_stop')
+        self._event({'type': 'message_delta', 'delta': {'stop_reason': 'end_turn'},
+                     'usage': {'output_tokens': len(self.server.tokens)}},
+                    'message_delta')
+        self._event({'type': 'message_stop'}, 'message_stop')
+        self._end_stream()
+
+    def _stream_gemini(self, prompt_tokens, cache):
+        self._start_stream()
+        for token in self.server.tokens:
+            self.server.generate(1)
+            self._event({'candidates': [{'content': {
+                'role': 'model', 'parts': [{'text': token}]}}]})
+        self._end_stream()
+
+    # Errors, in each provider's error shape
+
+    def _error(self, wire, status, retry_after=None):
+        message = 'injected fault'
+        if wire == 'anthropic':
+            kind = 'rate_limit_error' if status == 429 else 'api_error'
+            body = {'type': 'error', 'error': {'type': kind, 'message': message}}
+        elif wire == 'gemini':
+            body = {'error': {'code': status, 'message': message,
+                              'status': 'RESOURCE_EXHAUSTED' if status == 429 else 'UNAVAILABLE'}}
+        else:
+            body = {'error': {'message': message, 'type': 'server_error'}}
+        headers = {'Retry-After': str(retry_after)} if retry_after is not None else {}
+        self._send_json(status, body, headers)
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _start_stream(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+    def _event(self, event, name=None):
+        prefix = f"event: {name}\n" if name else ''
+        self._write_chunk(f"{prefix}data: {json.dumps(event)}\n\n")
+
+    def _end_stream(self):
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _write_chunk(self, text):
+        data = text.encode('utf-8')
+        self.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b'\r\n')
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    Args:
+        latency: Fixed delay added to every request, in seconds
+        latency_p50: Median of the random delay; None for no distribution
+        latency_p99: 99th percentile of the random delay (default: p50)
+        token_rate: Tokens generated per second; None for instant replies
+        error_rate: Fraction of requests failing with `error_status`
+        rate_limit_rate: Fraction of requests rejected with a 429
+        retry_after: Retry-After sent with random 429s
+        seed: Seed for the random latency and faults
+    """
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, latency=0.0, port=0, latency_p50=None, latency_p99=None,
+                 token_rate=None, error_rate=0.0, rate_limit_rate=0.0,
+                 error_status=500, retry_after=1, seed=None):
+        super().__init__(('127.0.0.1', port), StandInHandler)
+        self.latency = latency
+        self.latency_p50 = latency_p50
+        self.latency_p99 = latency_p99 or latency_p50
+        self.token_rate = token_rate
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.reply = 'Amém.'
+        self.tokens = ['Deus ', 'é ', 'amor.']
+        # Body of the latest request, for assertions
+        self.last_payload = None
+        self.stats = self._empty_stats()
+        self._stats_lock = threading.Lock()
+        self._faults = deque()
+        self._random = random.Random(seed)
+        # Cached prefix hashes (Anthropic) and previous prompt per cache key
+        self._cached_prefixes = set()
+        self._last_prompts = {}
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    @property
+    def url(self):
+        """OpenAI-format endpoint"""
+        return f"{self.base_url}/v1/chat/completions"
+
+    @staticmethod
+    def _empty_stats():
+        return {'connections': 0, 'requests': 0, 'errors': 0, 'rate_limited': 0,
+                'cached_tokens': 0}
+
+    def count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def sample_latency(self):
+        """Fixed latency plus a log-normal sample matching p50/p99"""
+        if not self.latency_p50:
+            return self.latency
+        sigma = math.log(self.latency_p99 / self.latency_p50) / _Z99
+        with self._stats_lock:
+            sample = self._random.lognormvariate(math.log(self.latency_p50), sigma)
+        return self.latency + sample
+
+    def prompt_cache(self, wire, payload, markers):
+        """
+        Emulate the provider's prompt cache for one request.
+
+        Returns:
+            {'read': tokens served from the cache, 'written': tokens cached}
+        """
+        read = written = 0
+        with self._stats_lock:
+            if wire == 'anthropic':
+                for prefix in markers:
+                    key = hashlib.sha256(prefix.encode('utf-8')).hexdigest()
+                    tokens = len(prefix) // 4
+                    if key in self._cached_prefixes:
+                        read = tokens
+                    else:
+                        self._cached_prefixes.add(key)
+                        written = tokens
+                written = max(0, written - read)
+            else:
+                key = (wire, payload.get('prompt_cache_key') if wire == 'openai'
+                       else payload.get('model'))
+                prompt = _prompt_text(wire, payload)
+                previous = self._last_prompts.get(key)
+                if previous is not None:
+                    read = len(os.path.commonprefix([previous, prompt])) // 4
+                self._last_prompts[key] = prompt
+            self.stats['cached_tokens'] += read
+        return {'read': read, 'written': written}
+
+    def generate(self, tokens):
+        """Spend the time `tokens` take at the configured token rate"""
+        if self.token_rate:
+            time.sleep(tokens / self.token_rate)
+
+    def inject(self, status=None, retry_after=None, latency=0.0, count=1):
+        """Make the next `count` requests fail with `status` and/or stall"""
+        with self._stats_lock:
+            for _ in range(count):
+                self._faults.append({'status': status, 'retry_after': retry_after,
+                                     'latency': latency})
+
+    def next_fault(self):
+        """The injected fault for this request, else a random one, else {}"""
+        with self._stats_lock:
+            if self._faults:
+                fault = self._faults.popleft()
+            else:
+                roll = self._random.random()
+                if roll < self.rate_limit_rate:
+                    fault = {'status': 429, 'retry_after': self.retry_after}
+                elif roll < self.rate_limit_rate + self.error_rate:
+                    fault = {'status': self.error_status}
+                else:
+                    return {}
+            if fault.get('status') == 429:
+                self.stats['rate_limited'] += 1
+            elif fault.get('status'):
+                self.stats['errors'] += 1
+            return fault
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self.stats = self._empty_stats()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--p50', type=float, default=None)
+    parser.add_argument('--p99', type=float, default=None)
+    parser.add_argument('--token-rate', type=float, default=None)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--error-status', type=int, default=500)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--retry-after', type=float, default=1)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    server = StandInServer(
+        latency=args.latency, port=args.port, latency_p50=args.p50,
+        latency_p99=args.p99, token_rate=args.token_rate,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+        error_status=args.error_status, retry_after=args.retry_after,
+        seed=args.seed)
+    print(f"Stand-in LLM server on {server.base_url}")
+    print(f"Run the app with LLM_BASE_URL={server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+#!/usr/bin/env python
+"""
+Chat job worker: consumes asynchronous chat requests from RabbitMQ.
+
+Scale it independently of the web workers (more processes, or
+CHAT_WORKER_CONCURRENCY / CHAT_WORKER_PREFETCH per process). Each worker
+also runs the daily message scheduler; one of them is elected to generate.
+
+Usage: python chat_worker.py
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app  # noqa: E402
+from app.services.chat_queue import chat_queue  # noqa: E402
+from app.services.daily_messages import daily_message_generator  # noqa: E402
+
+
+if __name__ == '__main__':
+    app = create_app()
+    daily_message_generator.start(app)
+    chat_queue.consume(app)
@@ -0,0 +1,33 @@
+"""
+Gunicorn configuration.
+
+Run with: gunicorn -c gunicorn.conf.py app:application
+
+Chat requests spend most of their time waiting on the async LLM engine, so
+workers use threads: each waiting request costs a thread, not a process.
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 100))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+
+
+def post_fork(server, worker):
+    """Make sure the worker never reuses upstream sockets from the master"""
+    from app.services.llm.clients import provider_clients
+    from app.services.llm.engine import async_engine
+    provider_clients.reset_after_fork()
+    async_engine.reset_after_fork()
+
+
+def worker_exit(server, worker):
+    """Close pooled upstream connections and flush usage counters on shutdown"""
+    from app.services.api_key_usage import api_key_usage
+    from app.services.llm.clients import provider_clients
+    from app.services.llm.engine import async_engine
+    api_key_usage.close()
+    provider_clients.close_all()
+    async_engine.close()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+"""
+Migration to add the rolling summary columns to the conversations table.
+"""
+from sqlalchemy import text
+from app import create_app, db
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run_migration():
+    """
+    Add summary and summary_message_id columns to conversations if they don't exist.
+    """
+    app = create_app()
+    with app.app_context():
+        # Check which columns exist
+        inspector = db.inspect(db.engine)
+        columns = [col['name'] for col in inspector.get_columns('conversations')]
+
+        with db.engine.connect() as conn:
+            if 'summary' not in columns:
+                print("Adding summary column to conversations table...")
+                conn.execute(text('ALTER TABLE conversations ADD COLUMN summary TEXT'))
+                print("Column added successfully!")
+            else:
+                print("Column summary already exists in conversations table.")
+
+            if 'summary_message_id' not in columns:
+                print("Adding summary_message_id column to conversations table...")
+                conn.execute(text(
+                    'ALTER TABLE conversations ADD COLUMN summary_message_id INTEGER'))
+                print("Column added successfully!")
+            else:
+                print("Column summary_message_id already exists in conversations table.")
+
+
+if __name__ == "__main__":
+    run_migration()
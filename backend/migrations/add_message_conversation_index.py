@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+"""
+Migration to add a (conversation_id, created_at) index to the messages table.
+"""
+from sqlalchemy import text
+from app import create_app, db
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run_migration():
+    """
+    Create ix_messages_conversation_created if it doesn't exist.
+    """
+    app = create_app()
+    with app.app_context():
+        # Check if index exists
+        inspector = db.inspect(db.engine)
+        indexes = [index['name'] for index in inspector.get_indexes('messages')]
+
+        if 'ix_messages_conversation_created' not in indexes:
+            print("Adding ix_messages_conversation_created index to messages table...")
+            with db.engine.connect() as conn:
+                conn.execute(text(
+                    'CREATE INDEX ix_messages_conversation_created '
+                    'ON messages (conversation_id, created_at)'))
+            print("Index added successfully!")
+        else:
+            print("Index ix_messages_conversation_created already exists on messages table.")
+
+
+if __name__ == "__main__":
+    run_migration()
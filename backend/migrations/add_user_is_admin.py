@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+"""
+Migration to add the is_admin column to the users table.
+"""
+from sqlalchemy import text
+from app import create_app, db
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run_migration():
+    """
+    Add is_admin column to users if it doesn't exist.
+    """
+    app = create_app()
+    with app.app_context():
+        # Check if column exists
+        inspector = db.inspect(db.engine)
+        columns = [col['name'] for col in inspector.get_columns('users')]
+
+        with db.engine.connect() as conn:
+            if 'is_admin' not in columns:
+                print("Adding is_admin column to users table...")
+                conn.execute(text(
+                    'ALTER TABLE users ADD COLUMN is_admin BOOLEAN DEFAULT FALSE'))
+                print("Column added successfully!")
+            else:
+                print("Column is_admin already exists in users table.")
+
+
+if __name__ == "__main__":
+    run_migration()
@@ -15,6 +15,9 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 try:
     from migrations.add_prompt_templates import run_migration as run_add_prompt_templates
     from migrations.add_use_count_to_api_keys import run_migration as run_add_use_count_to_api_keys
+    from migrations.add_message_conversation_index import run_migration as run_add_message_conversation_index
+    from migrations.add_conversation_summary import run_migration as run_add_conversation_summary
+    from migrations.add_user_is_admin import run_migration as run_add_user_is_admin
 except ImportError as e:
     print(f"Error importing migration module: {e}")
     sys.exit(1)
@@ -37,6 +40,18 @@ def run_migrations():
         {
             "name": "Add use_count to API Keys",
             "function": run_add_use_count_to_api_keys
+        },
+        {
+            "name": "Add conversation index to Messages",
+            "function": run_add_message_conversation_index
+        },
+        {
+            "name": "Add rolling summary to Conversations",
+            "function": run_add_conversation_summary
+        },
+        {
+            "name": "Add is_admin to Users",
+            "function": run_add_user_is_admin
         }
         # Add more migrations here as they are created
     ]
@@ -0,0 +1,92 @@
+import pytest
+from flask_jwt_extended import create_access_token
+from app import create_app
+from app.models.api_key import APIKey
+from app.models.database import db
+from app.models.user import User
+from app.services.api_key_usage import api_key_usage
+from app.services.llm.breaker import circuit_breaker
+from app.services.llm.bulkhead import bulkhead
+from app.services.llm.hedging import provider_latency
+from app.services.llm.retry import retry_policy
+from app.services.llm.scheduler import llm_scheduler
+from app.services.user_identity import user_identity
+from app.utils.metrics import metrics
+from app.utils.rate_limit import rate_limiter
+from benchmarks.standin_server import StandInServer
+
+# What every test app runs with; a module adds its own settings by
+# overriding the app_config fixture
+TEST_CONFIG = {
+    'TESTING': True,
+    'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+    'JWT_SECRET_KEY': 'test_jwt_key',
+    'REDIS_URL': None
+}
+
+
+def reset_shared_state():
+    """Forget what earlier tests left in the per-process singletons"""
+    metrics.reset()
+    circuit_breaker.reset()
+    bulkhead.reset()
+    llm_scheduler.reset()
+    retry_policy.budget.reset()
+    provider_latency.reset()
+    api_key_usage.reset()
+    user_identity.clear()
+
+
+@pytest.fixture
+def server_options():
+    """StandInServer arguments (latency, seed...), overridden per module"""
+    return {}
+
+
+@pytest.fixture
+def server(server_options):
+    """Local stand-in provider server"""
+    server = StandInServer(**server_options).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def app_config():
+    """Settings on top of TEST_CONFIG, overridden per module"""
+    return {}
+
+
+@pytest.fixture
+def app(app_config, monkeypatch):
+    """App context with the tables created and the shared state reset"""
+    app = create_app({**TEST_CONFIG, **app_config})
+    # An app created with REDIS_URL leaves its client on the shared limiter
+    monkeypatch.setattr(rate_limiter, 'redis', None)
+    with app.app_context():
+        db.create_all()
+        reset_shared_state()
+        yield app
+        reset_shared_state()
+        db.drop_all()
+
+
+@pytest.fixture
+def api_keys():
+    """Provider API keys of the `headers` user, overridden per module"""
+    return {'openai': 'sk-openai'}
+
+
+@pytest.fixture
+def user(app):
+    user = User(email='test@example.com', password='password123')
+    user.save()
+    return user
+
+
+@pytest.fixture
+def headers(user, api_keys):
+    """Authorization of a user holding `api_keys`"""
+    for provider, key in api_keys.items():
+        APIKey(user.id, provider, key).save()
+    return {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
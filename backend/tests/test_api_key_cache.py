@@ -0,0 +1,20 @@
+import pytest
+from app.models.api_key import APIKey
+from app.utils.security import _derive_encryption_key
+
+
+@pytest.fixture(autouse=True)
+def derived_keys():
+    _derive_encryption_key.cache_clear()
+
+
+def test_encryption_key_derived_once(app, user):
+    """Test that lookups reuse the derived key, and follow a config change"""
+    api_key = APIKey(user.id, 'openai', 'sk-one').save()
+    assert [api_key.get_api_key() for _ in range(3)] == ['sk-one'] * 3
+    assert _derive_encryption_key.cache_info().misses == 1
+
+    app.config['SECRET_KEY'] = 'another_secret_key'
+    other = APIKey(user.id, 'anthropic', 'sk-two').save()
+    assert other.get_api_key() == 'sk-two'
+    assert _derive_encryption_key.cache_info().misses == 2
@@ -0,0 +1,107 @@
+import pytest
+import threading
+from datetime import datetime, timedelta
+from app.models.api_key import APIKey
+from app.models.database import db
+from app.services import api_key_usage as usage
+from app.services.api_key_usage import APIKeyUsage
+
+
+class FakeRedis:
+    """Hashes and strings with the semantics of the usage scripts"""
+
+    def __init__(self):
+        self.hashes = {}
+        self.strings = {}
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.strings:
+            return None
+        self.strings[key] = value
+        return True
+
+    def hgetall(self, key):
+        return {k.encode(): str(v).encode() for k, v in self.hashes.get(key, {}).items()}
+
+    def delete(self, *keys):
+        for key in keys:
+            self.hashes.pop(key, None)
+            self.strings.pop(key, None)
+
+    def eval(self, script, numkeys, *args):
+        keys, argv = args[:numkeys], args[numkeys:]
+        if script == usage._RECORD_SCRIPT:
+            counts = self.hashes.setdefault(keys[0], {})
+            last = self.hashes.setdefault(keys[1], {})
+            field = str(argv[0])
+            counts[field] = counts.get(field, 0) + argv[1]
+            last[field] = max(last.get(field, 0), argv[2])
+        elif script == usage._TAKE_SCRIPT:
+            if keys[2] not in self.hashes and keys[0] in self.hashes:
+                self.hashes[keys[2]] = self.hashes.pop(keys[0])
+                if keys[1] in self.hashes:
+                    self.hashes[keys[3]] = self.hashes.pop(keys[1])
+            return int(keys[2] in self.hashes)
+        elif script == usage._RELEASE_SCRIPT:
+            if self.strings.get(keys[0]) == argv[0]:
+                del self.strings[keys[0]]
+        return 1
+
+
+@pytest.fixture
+def key_ids(user):
+    return [APIKey(user.id, provider, 'sk').save().id for provider in ('openai', 'anthropic')]
+
+
+def test_concurrent_uses_are_not_lost(app, key_ids):
+    """Test that concurrent uses all reach api_keys in one flush"""
+    counters = APIKeyUsage()
+    start = datetime(2024, 3, 10, 12, 0)
+
+    def use(i):
+        for j in range(50):
+            counters.record(key_ids[j % 2], used_at=start + timedelta(seconds=i))
+
+    threads = [threading.Thread(target=use, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert APIKey.query.get(key_ids[0]).use_count == 0
+    assert counters.flush() == 2
+    assert counters.flush() == 0
+    db.session.expire_all()
+    for key_id in key_ids:
+        api_key = APIKey.query.get(key_id)
+        assert api_key.use_count == 200
+        assert api_key.last_used == start + timedelta(seconds=7)
+
+
+def test_interrupted_flush_is_resumed(app, key_ids, monkeypatch):
+    """Test that counters taken by a failed flush are written by the next one"""
+    redis_client = FakeRedis()
+    counters = APIKeyUsage(redis_client=redis_client)
+    for _ in range(3):
+        counters.record(key_ids[0])
+
+    write = counters._write
+
+    def crash(usage):
+        raise RuntimeError('worker died')
+
+    monkeypatch.setattr(counters, '_write', crash)
+    with pytest.raises(RuntimeError):
+        counters.flush()
+    assert usage._FLUSHING_COUNTS in redis_client.hashes
+
+    # Uses keep counting meanwhile; the leftover batch goes first
+    monkeypatch.setattr(counters, '_write', write)
+    counters.record(key_ids[0])
+    counters.record(key_ids[1])
+    assert counters.flush() == 1
+    assert counters.flush() == 2
+    assert redis_client.hashes == {} and redis_client.strings == {}
+
+    db.session.expire_all()
+    assert [APIKey.query.get(key_id).use_count for key_id in key_ids] == [4, 1]
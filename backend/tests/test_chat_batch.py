@@ -0,0 +1,78 @@
+import pytest
+import time
+from app.models.api_key import APIKey
+from app.models.message import Message
+from app.services.api_key_usage import api_key_usage
+
+
+@pytest.fixture
+def server_options():
+    return {'latency': 0.2}
+
+
+@pytest.fixture
+def app_config(server):
+    """Providers all point at the stand-in server"""
+    return {
+        'LLM_CACHE_ENABLED': False,
+        'LLM_BASE_URL': server.base_url,
+        'CHAT_BATCH_CONCURRENCY': 8
+    }
+
+
+@pytest.fixture
+def api_keys():
+    return {'openai': 'sk-openai', 'anthropic': 'sk-anthropic'}
+
+
+def batch(n):
+    return [{'message': f'pergunta {i}', 'model': 'm',
+             'provider': 'openai' if i % 2 == 0 else 'anthropic'} for i in range(n)]
+
+
+def test_batch_results_and_errors(app, headers):
+    """Test per-item results, per-item errors and a single saved conversation"""
+    items = batch(3) + [{'message': 'x', 'provider': 'google', 'model': 'gemini'},
+                        {'message': 'y', 'provider': 'nope', 'model': 'm'}]
+    response = app.test_client().post('/api/chat/batch', json={'items': items},
+                                      headers=headers)
+
+    assert response.status_code == 200
+    results = response.json['results']
+    assert [r['index'] for r in results] == [0, 1, 2, 3, 4]
+    assert [r.get('response') for r in results[:3]] == ['Amém.'] * 3
+    assert 'API key' in results[3]['error']
+    assert 'not supported' in results[4]['error']
+
+    messages = Message.query.filter_by(
+        conversation_id=response.json['conversation_id']).order_by(Message.id).all()
+    assert [m.content for m in messages[::2]] == ['pergunta 0', 'pergunta 1', 'pergunta 2']
+    assert [m.id for m in messages[1::2]] == [r['message_id'] for r in results[:3]]
+    api_key_usage.flush()
+    assert APIKey.query.filter_by(provider='openai').first().use_count == 2
+
+
+def test_batch_scales_with_parallelism(app, headers):
+    """Test that 8 prompts take about one upstream latency, not eight"""
+    client = app.test_client()
+
+    start = time.perf_counter()
+    response = client.post('/api/chat/batch', json={'items': batch(8)}, headers=headers)
+    parallel = time.perf_counter() - start
+
+    start = time.perf_counter()
+    client.post('/api/chat/batch', json={'items': batch(8), 'concurrency': 1},
+                headers=headers)
+    serial = time.perf_counter() - start
+
+    assert all(r['response'] == 'Amém.' for r in response.json['results'])
+    assert parallel < 0.8
+    assert serial >= 8 * 0.2
+
+
+def test_batch_size_is_limited(app, headers):
+    """Test that batches above CHAT_BATCH_MAX_ITEMS are rejected"""
+    app.config['CHAT_BATCH_MAX_ITEMS'] = 2
+    response = app.test_client().post('/api/chat/batch', json={'items': batch(3)},
+                                      headers=headers)
+    assert response.status_code == 400
@@ -0,0 +1,61 @@
+import pytest
+from app.models.database import db
+from app.models.conversation import Conversation
+from app.models.message import Message
+from app.services.llm.context import context_builder, estimate_tokens
+
+
+@pytest.fixture
+def app_config():
+    """A small context window"""
+    return {
+        'LLM_CONTEXT_DEFAULT_WINDOW': 1000,
+        'LLM_CONTEXT_RESPONSE_RESERVE': 200,
+        'LLM_CONTEXT_WINDOWS': {'anthropic': 100000}
+    }
+
+
+@pytest.fixture
+def conversation(user):
+    """Conversation with 40 messages of ~50 tokens each"""
+    conversation = Conversation(user_id=user.id)
+    db.session.add(conversation)
+    db.session.commit()
+    for i in range(40):
+        db.session.add(Message(conversation.id, f"mensagem {i:02d} " + 'a' * 190,
+                               'user' if i % 2 == 0 else 'bot'))
+    db.session.commit()
+    return conversation
+
+
+def test_estimate_tokens():
+    """Test the estimate against a few known shapes"""
+    assert estimate_tokens('') == 0
+    assert estimate_tokens('a' * 400) == 100
+    assert estimate_tokens('e o a ' * 10) == 30
+
+
+def test_history_fits_the_budget(app, conversation):
+    """Test that only the newest messages that fit are kept, oldest first"""
+    prompt = 'Responda: {message}'
+    context = context_builder.build(conversation, 'openai', 'gpt', prompt)
+    history = context['conversation_history']
+
+    budget = 1000 - 200 - estimate_tokens(prompt)
+    assert sum(estimate_tokens(m['content']) for m in history) <= budget
+    assert len(history) == budget // estimate_tokens(history[0]['content'])
+    assert history[-1]['content'].startswith('mensagem 39')
+    assert history == sorted(history, key=lambda m: m['content'])
+
+
+def test_query_is_bounded(app, conversation):
+    """Test that large windows still read at most LLM_CONTEXT_MAX_MESSAGES rows"""
+    app.config['LLM_CONTEXT_MAX_MESSAGES'] = 25
+    last = Message.query.filter_by(conversation_id=conversation.id) \
+        .order_by(Message.id.desc()).first()
+
+    history = context_builder.build(
+        conversation, 'anthropic', 'claude', 'x', exclude_id=last.id)['conversation_history']
+
+    assert len(history) == 25
+    assert history[-1]['content'].startswith('mensagem 38')
@@ -0,0 +1,107 @@
+import pytest
+from flask_jwt_extended import create_access_token
+from app.models.conversation import Conversation
+from app.models.message import Message
+from app.models.user import User
+from app.services.chat_queue import DONE, FAILED, chat_queue
+
+
+@pytest.fixture
+def app_config(tmp_path):
+    """Simulated chat with the in-process queue, on a file database"""
+    return {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'chat.db'}",
+        'LLM_SIMULATION_MODE': True,
+        'CHAT_QUEUE_BACKEND': 'local'
+    }
+
+
+@pytest.fixture(autouse=True)
+def jobs(app):
+    chat_queue.store.reset()
+
+
+@pytest.fixture
+def api_keys():
+    """Simulated answers need no provider key"""
+    return {}
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def auth(email):
+    user = User(email=email, password='password123')
+    user.save()
+    return {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+
+
+def test_async_message(client, headers):
+    """Test that the request is queued and the reply is delivered to the job"""
+    response = client.post('/api/chat/message', json={
+        'message': 'como vencer a ansiedade?',
+        'provider': 'openai',
+        'model': 'gpt-3.5-turbo',
+        'async': True
+    }, headers=headers)
+
+    assert response.status_code == 202
+    job_id = response.json['job_id']
+    assert response.headers['Location'].endswith(f'/api/chat/jobs/{job_id}')
+
+    job = client.get(f'/api/chat/jobs/{job_id}?wait=5', headers=headers).json
+    assert job['status'] == DONE
+    assert 'como vencer a ansiedade?' in job['response']
+    bot_msg = Message.query.get(job['message_id'])
+    assert bot_msg.sender == 'bot'
+    assert bot_msg.conversation_id == response.json['conversation_id']
+
+    # Jobs are private to their user
+    other = auth('other@example.com')
+    assert client.get(f'/api/chat/jobs/{job_id}', headers=other).status_code == 404
+
+
+def test_job_events(client, headers):
+    """Test that subscribers get a single done event"""
+    job_id = client.post('/api/chat/message', json={
+        'message': 'Olá', 'provider': 'openai', 'model': 'gpt', 'async': True
+    }, headers=headers).json['job_id']
+
+    body = client.get(f'/api/chat/jobs/{job_id}/events', headers=headers).get_data(as_text=True)
+    assert body.startswith('event: done\n')
+
+
+def test_redelivered_job_runs_once(client, headers):
+    """Test that a job finished before redelivery is not answered twice"""
+    job_id = client.post('/api/chat/message', json={
+        'message': 'Olá', 'provider': 'openai', 'model': 'gpt', 'async': True
+    }, headers=headers).json['job_id']
+    chat_queue.store.wait(job_id, 5)
+
+    job = chat_queue.process({'id': job_id, 'user_id': None, 'payload': {}})
+    assert job['status'] == DONE
+    assert Message.query.filter_by(sender='bot').count() == 1
+
+
+def test_job_fails_when_rows_are_gone(user):
+    """Test that a job whose template or conversation was deleted is marked failed"""
+    conversation = Conversation(user_id=user.id, title='Olá')
+    conversation.save()
+    user_msg = Message(conversation.id, 'Olá', 'user').save()
+    payload = {
+        'message': 'Olá', 'provider': 'openai', 'model': 'gpt', 'template_id': 999,
+        'regenerate': False, 'hedge': None, 'conversation_id': conversation.id,
+        'user_message_id': user_msg.id, 'api_key_id': None
+    }
+
+    job = chat_queue.process({'id': 'deleted-template', 'user_id': user.id, 'payload': payload})
+    assert job['status'] == FAILED
+    assert Message.query.get(user_msg.id).get_metadata() == {
+        'status': 'failed', 'error': 'template_not_found'}
+
+    payload = dict(payload, template_id=None, conversation_id=999)
+    job = chat_queue.process({'id': 'deleted-conversation', 'user_id': user.id, 'payload': payload})
+    assert job['status'] == FAILED
+    assert Message.query.filter_by(sender='bot').count() == 0
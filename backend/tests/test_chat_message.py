@@ -0,0 +1,71 @@
+import pytest
+from sqlalchemy import event
+from app.models.database import db, release_connection
+from app.models.api_key import APIKey
+from app.models.message import Message
+from app.services.api_key_usage import api_key_usage
+from app.services.llm.engine import async_engine
+from app.utils.db_pool import pool_usage
+
+
+@pytest.fixture
+def app_config(server):
+    """Providers all point at the stand-in server"""
+    return {
+        'LLM_CACHE_ENABLED': False,
+        'LLM_SUMMARY_ENABLED': False,
+        'LLM_BREAKER_ENABLED': False,
+        'LLM_BASE_URL': server.base_url
+    }
+
+
+def test_two_commits_per_chat(app, headers):
+    """Test one commit before the upstream call and one after, new or not"""
+    commits = []
+    event.listen(db.engine, 'commit', lambda conn: commits.append(1))
+    client = app.test_client()
+    payload = {'message': 'Olá', 'provider': 'openai', 'model': 'gpt'}
+
+    response = client.post('/api/chat/message', json=payload, headers=headers)
+    assert response.status_code == 200
+    assert len(commits) == 2
+
+    payload['conversation_id'] = response.json['conversation_id']
+    assert client.post('/api/chat/message', json=payload, headers=headers).status_code == 200
+    assert len(commits) == 4
+    api_key_usage.flush()
+    assert APIKey.query.first().use_count == 2
+
+
+def test_failure_is_recorded(app, server, headers):
+    """Test that a chat without reply keeps the user message marked as failed"""
+    server.inject(status=400, count=10)
+    response = app.test_client().post(
+        '/api/chat/message', json={'message': 'Olá', 'provider': 'openai', 'model': 'gpt'},
+        headers=headers)
+
+    assert response.status_code != 200
+    messages = Message.query.all()
+    assert [m.sender for m in messages] == ['user']
+    assert messages[0].get_metadata() == {'status': 'failed', 'error': 'llm_error'}
+
+
+def test_no_connection_held_during_llm_call(app, headers, monkeypatch):
+    """Test that the pooled connection is back in the pool while the provider answers"""
+    held = []
+    run = async_engine.run
+
+    def spy(coro):
+        held.append(pool_usage.checked_out)
+        return run(coro)
+
+    monkeypatch.setattr(async_engine, 'run', spy)
+    release_connection()
+    before = pool_usage.checked_out
+    response = app.test_client().post(
+        '/api/chat/message', json={'message': 'Olá', 'provider': 'openai', 'model': 'gpt'},
+        headers=headers)
+
+    assert response.status_code == 200
+    assert held == [before]
+    assert Message.query.count() == 2
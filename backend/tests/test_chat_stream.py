@@ -0,0 +1,94 @@
+import pytest
+import json
+from app.models.message import Message
+from app.services.llm.adapters import get_adapter
+from app.services import llm_service
+from app.services.llm_service import _stream_request
+
+
+@pytest.fixture
+def app_config():
+    """The chat runs in simulation mode"""
+    return {'SECRET_KEY': 'test_key', 'LLM_SIMULATION_MODE': True}
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def api_keys():
+    """Simulated answers need no provider key"""
+    return {}
+
+
+def parse_events(body):
+    """Split an SSE body into (event, data) pairs"""
+    events = []
+    for block in body.strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+def test_stream_message(client, headers):
+    """Test that tokens are streamed and the bot message saved at the end"""
+    response = client.post('/api/chat/message/stream', json={
+        'message': 'como vencer a ansiedade?',
+        'provider': 'openai',
+        'model': 'gpt-3.5-turbo'
+    }, headers=headers)
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+
+    events = parse_events(response.get_data(as_text=True))
+    names = [name for name, _ in events]
+    assert names[0] == 'start'
+    assert names[-1] == 'done'
+    assert names.count('token') > 1
+
+    text = ''.join(data['token'] for name, data in events if name == 'token')
+    bot_msg = Message.query.get(events[-1][1]['message_id'])
+    assert bot_msg.sender == 'bot'
+    assert bot_msg.content == text.strip()
+    assert 'como vencer a ansiedade?' in bot_msg.content
+
+
+def test_stream_unsupported_provider(client, headers):
+    """Test that validation errors are returned before the stream starts"""
+    response = client.post('/api/chat/message/stream', json={
+        'message': 'Olá',
+        'provider': 'unknown',
+        'model': 'x'
+    }, headers=headers)
+
+    assert response.status_code == 400
+
+
+def test_stream_request_parses_openai_events(app, server):
+    """Test that OpenAI-style SSE deltas are relayed in order"""
+    tokens = list(_stream_request(
+        'openai', server.url, {}, {'stream': True}, get_adapter('openai').extract_delta))
+    assert tokens == ['Deus ', 'é ', 'amor.']
+
+
+def test_stream_marks_template_prefix(app, monkeypatch):
+    """Test that streamed templated prompts carry the prompt cache markers too"""
+    sent = []
+
+    def fake_stream(provider, url, headers, data, extract_text):
+        sent.append(data)
+        return iter(['Amém.'])
+
+    monkeypatch.setattr(llm_service, '_stream_request', fake_stream)
+    app.config['LLM_BREAKER_ENABLED'] = False
+    template = "Instruções fixas.\n\n{message}"
+    tokens = llm_service.stream_llm_response(
+        'anthropic', 'claude', 'k', template.format(message='Olá'), template=template)
+    assert list(tokens) == ['Amém.']
+
+    prefix, suffix = sent[0]['messages'][0]['content']
+    assert prefix['cache_control'] == {'type': 'ephemeral'}
+    assert prefix['text'].endswith("Instruções fixas.\n\n")
@@ -0,0 +1,75 @@
+import pytest
+import time
+from app.models.database import db
+from app.models.conversation import Conversation
+from app.models.message import Message
+from app.services.llm.context import context_builder
+from app.services.llm.summary import conversation_summarizer
+
+
+@pytest.fixture
+def app_config(server, tmp_path):
+    """File database, so worker threads see the same data"""
+    return {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'chat.db'}",
+        'LLM_CACHE_ENABLED': False,
+        'LLM_BASE_URL': server.base_url,
+        'LLM_SUMMARY_EVERY': 10,
+        'LLM_SUMMARY_KEEP_RECENT': 4
+    }
+
+
+@pytest.fixture
+def conversation(user):
+    conversation = Conversation(user_id=user.id)
+    db.session.add(conversation)
+    db.session.commit()
+    return conversation
+
+
+def add_messages(conversation, count, start=0):
+    for i in range(start, start + count):
+        db.session.add(Message(conversation.id, f"mensagem {i}",
+                               'user' if i % 2 == 0 else 'bot'))
+    db.session.commit()
+
+
+def test_summary_folds_old_messages(app, server, conversation):
+    """Test that all but the recent window go into the summary"""
+    add_messages(conversation, 20)
+
+    assert conversation_summarizer.summarize(conversation.id, 'openai', 'gpt', 'key')
+
+    db.session.refresh(conversation)
+    assert conversation.summary == 'Amém.'
+    prompt = server.last_payload['messages'][-1]['content']
+    assert prompt.startswith('Resuma a conversa')
+    assert 'Usuário: mensagem 0' in prompt and 'mensagem 15' in prompt
+    assert 'mensagem 16' not in prompt
+
+    context = context_builder.build(conversation, 'openai', 'gpt', 'x')
+    assert context['conversation_summary'] == 'Amém.'
+    assert [m['content'] for m in context['conversation_history']] == \
+        ['mensagem 16', 'mensagem 17', 'mensagem 18', 'mensagem 19']
+
+    # Nothing new past the window: no second call
+    assert not conversation_summarizer.summarize(conversation.id, 'openai', 'gpt', 'key')
+    assert server.stats['requests'] == 1
+
+
+def test_scheduling_never_blocks(app, server, conversation):
+    """Test that the chat path only queues the update"""
+    server.latency = 0.5
+    add_messages(conversation, 13)
+    assert not conversation_summarizer.maybe_schedule(conversation, 'openai', 'gpt', 'key')
+
+    add_messages(conversation, 1, start=13)
+    start = time.perf_counter()
+    assert conversation_summarizer.maybe_schedule(conversation, 'openai', 'gpt', 'key')
+    assert time.perf_counter() - start < 0.2
+    # A second trigger while the first runs is absorbed
+    assert not conversation_summarizer.maybe_schedule(conversation, 'openai', 'gpt', 'key')
+
+    conversation_summarizer.wait_idle()
+    db.session.expire_all()
+    assert Conversation.query.get(conversation.id).summary == 'Amém.'
@@ -0,0 +1,92 @@
+import pytest
+from datetime import date, timedelta
+from app.models.bible_verse import BibleVerse
+from app.models.daily_message import DailyMessage
+from app.services.daily_messages import DailyMessageGenerator, daily_message_generator
+
+TODAY = date(2024, 3, 10)
+
+
+class FakeRedis:
+    """String keys with the semantics of SET NX and the renew script"""
+
+    def __init__(self):
+        self.values = {}
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    def eval(self, script, numkeys, key, token, ttl):
+        return 1 if self.values.get(key) == token else 0
+
+
+@pytest.fixture
+def app_config(server):
+    """Generating 3 days ahead and backfilling 1, on the stand-in server"""
+    return {
+        'LLM_CACHE_ENABLED': False,
+        'LLM_BREAKER_ENABLED': False,
+        'LLM_BASE_URL': server.base_url,
+        'DAILY_MESSAGE_API_KEY': 'sk-daily',
+        'DAILY_MESSAGE_DAYS_AHEAD': 3,
+        'DAILY_MESSAGE_BACKFILL_DAYS': 1
+    }
+
+
+@pytest.fixture(autouse=True)
+def verses(app):
+    for verse in (1, 2, 3):
+        BibleVerse('Salmos', 23, verse, f'Texto do versículo {verse}').save()
+
+
+def test_fills_missing_dates_once(app, server):
+    """Test that gaps in the window are generated once, keeping existing rows"""
+    DailyMessage('manual', 'v', 'Salmos 23:1', date=TODAY + timedelta(days=1)).save()
+
+    assert daily_message_generator.run_once(TODAY) == 4
+    assert daily_message_generator.run_once(TODAY) == 0
+
+    messages = DailyMessage.query.order_by(DailyMessage.date).all()
+    assert [m.date for m in messages] == [TODAY + timedelta(days=i) for i in range(-1, 4)]
+    assert messages[2].message == 'manual'
+    assert {m.message for m in messages} == {'manual', 'Amém.'}
+    # Verses come from bible_verses and are not repeated back to back
+    assert all(m.bible_reference.startswith('Salmos 23:') for m in messages)
+    assert messages[0].bible_reference != messages[1].bible_reference
+    assert 'Texto do versículo' in server.last_payload['messages'][-1]['content']
+
+
+def test_failed_dates_are_backfilled(app, server):
+    """Test that a date that failed is generated on the next run"""
+    server.inject(status=400, count=2)
+    assert daily_message_generator.run_once(TODAY) == 3
+    assert daily_message_generator.run_once(TODAY) == 2
+
+
+def test_only_the_leader_generates(app):
+    """Test that a second node does nothing while the leader holds the lease"""
+    shared = FakeRedis()
+    leader = DailyMessageGenerator(redis_client=shared)
+    follower = DailyMessageGenerator(redis_client=shared)
+
+    assert leader.is_leader()
+    assert follower.run_once(TODAY) == 0
+    assert leader.is_leader()
+    assert DailyMessage.query.count() == 0
+
+
+def test_not_started_without_an_api_key(app, monkeypatch):
+    """Test that the scheduler only runs with a key (or mock responses)"""
+    generator = DailyMessageGenerator()
+    runs = []
+    monkeypatch.setattr(generator, '_loop', runs.append)
+    app.config['DAILY_MESSAGE_API_KEY'] = ''
+
+    assert generator.start(app) is None
+
+    app.config.update(ENV='development', USE_MOCK_LLM=True)
+    generator.start(app).join(5)
+    assert runs == [app]
@@ -0,0 +1,134 @@
+import pytest
+import threading
+import time
+import uuid
+from flask import jsonify, request
+from flask_jwt_extended import jwt_required as flask_jwt_required
+from app.models.conversation import Conversation
+from app.models.message import Message
+from app.utils.idempotency import _LocalStore, idempotent
+
+CHAT = {'message': 'Olá', 'provider': 'openai', 'model': 'gpt'}
+
+
+@pytest.fixture
+def server_options():
+    return {'latency': 0.3}
+
+
+@pytest.fixture
+def app_config(server, tmp_path):
+    """File database, so concurrent requests share it"""
+    return {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+        'LLM_CACHE_ENABLED': False,
+        'LLM_SEMANTIC_CACHE_ENABLED': False,
+        'LLM_SUMMARY_ENABLED': False,
+        'LLM_BREAKER_ENABLED': False,
+        'LLM_BASE_URL': server.base_url
+    }
+
+
+@pytest.fixture
+def user_headers(headers):
+    # Stored keys outlive the app (per process): keep each test's keys apart
+    run = uuid.uuid4().hex
+    return lambda key: dict(headers, **{'Idempotency-Key': f'{run}-{key}'})
+
+
+def test_later_duplicate_replays(app, server, user_headers):
+    """Test that a retried chat replays the first response without a new call"""
+    client = app.test_client()
+    first = client.post('/api/chat/message', json=CHAT, headers=user_headers('k1'))
+    retry = client.post('/api/chat/message', json=CHAT, headers=user_headers('k1'))
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.json == first.json
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert 'Idempotent-Replayed' not in first.headers
+    assert server.stats['requests'] == 1
+    assert Conversation.query.count() == 1
+    assert Message.query.count() == 2
+
+    # Another key is another request; the same key with another body is refused
+    assert 'Idempotent-Replayed' not in client.post(
+        '/api/chat/message', json=CHAT, headers=user_headers('k2')).headers
+    other = client.post('/api/chat/message', json=dict(CHAT, message='Paz'),
+                        headers=user_headers('k1'))
+    assert other.status_code == 422
+
+
+def test_concurrent_duplicate_waits(app, server, user_headers):
+    """Test that a duplicate sent while the first is in flight gets its response"""
+    responses = []
+
+    def send():
+        response = app.test_client().post('/api/chat/message', json=CHAT,
+                                          headers=user_headers('k1'))
+        responses.append((response.status_code, response.get_json()))
+
+    threads = [threading.Thread(target=send) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [status for status, _ in responses] == [200] * 3
+    assert len({body['conversation_id'] for _, body in responses}) == 1
+    assert server.stats['requests'] == 1
+
+
+def test_failures_are_not_replayed(app, server, user_headers):
+    """Test that a retry after a failed request runs again"""
+    server.inject(status=400)
+    client = app.test_client()
+    assert client.post('/api/chat/message', json=CHAT,
+                       headers=user_headers('k1')).status_code == 500
+
+    retry = client.post('/api/chat/message', json=CHAT, headers=user_headers('k1'))
+    assert retry.status_code == 200
+    assert 'Idempotent-Replayed' not in retry.headers
+
+
+def test_query_string_and_headers(app, user_headers):
+    """Test that query args are part of the request and headers are replayed"""
+    calls = []
+
+    @flask_jwt_required()
+    @idempotent
+    def create():
+        calls.append(request.args.get('n'))
+        return jsonify({'n': request.args.get('n')}), 201, {
+            'Location': f'/things/{len(calls)}', 'Content-Type': 'application/vnd.test+json'}
+
+    app.add_url_rule('/test/things', 'create_thing', create, methods=['POST'])
+    client = app.test_client()
+
+    first = client.post('/test/things?n=1', headers=user_headers('k1'))
+    retry = client.post('/test/things?n=1', headers=user_headers('k1'))
+    assert calls == ['1']
+    assert retry.status_code == 201
+    assert retry.headers['Location'] == first.headers['Location']
+    assert first.headers['Location'].endswith('/things/1')
+    assert retry.headers['Content-Type'] == 'application/vnd.test+json'
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+
+    assert client.post('/test/things?n=2', headers=user_headers('k1')).status_code == 422
+    assert calls == ['1']
+
+
+def test_local_store_is_bounded(app, monkeypatch):
+    """Test that the Redis-less store drops expired and excess entries"""
+    store = _LocalStore()
+    monkeypatch.setattr(store, 'SWEEP_INTERVAL', 0)
+    for i in range(5):
+        store.set(f'short-{i}', 'body', ex=0.01)
+    time.sleep(0.02)
+    store.set('long-0', 'body', ex=60)
+    assert len(store) == 1
+
+    app.config['IDEMPOTENCY_LOCAL_MAX_ENTRIES'] = 3
+    for i in range(1, 6):
+        store.set(f'long-{i}', 'body', ex=60)
+    assert len(store) == 3
+    assert store.get('long-5') == 'body' and store.get('long-2') is None
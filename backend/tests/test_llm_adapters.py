@@ -0,0 +1,68 @@
+from app.services.llm.adapters import (
+    ADAPTERS, DEFAULT_PROMPT_TEMPLATE, PROMPT_CACHING, STREAMING, build_prompt,
+    get_adapter, template_prefix)
+from app.services.llm.providers import LLM_PROVIDERS, GenericProvider
+from app.services.llm_service import LLM_SERVICES
+
+
+def test_request_matches_template():
+    """Test that skeleton-built requests carry the formatted prompt and key"""
+    url, headers, data = get_adapter('openai').build_request('sk-1', 'gpt', 'Olá')
+
+    assert url == "https://api.openai.com/v1/chat/completions"
+    assert headers['Authorization'] == 'Bearer sk-1'
+    assert data['model'] == 'gpt'
+    assert data['messages'][1]['content'] == DEFAULT_PROMPT_TEMPLATE.format(message='Olá')
+    assert 'stream' not in data
+
+
+def test_calls_do_not_share_state():
+    """Test that per-call fields never leak into the precomputed skeletons"""
+    adapter = get_adapter('anthropic')
+    adapter.build_request('sk-1', 'claude', 'Olá', stream=True)
+    _, headers, data = adapter.build_request('sk-2', 'claude', 'Paz')
+
+    assert 'x-api-key' not in adapter.headers
+    assert 'model' not in adapter.skeleton
+    assert headers['x-api-key'] == 'sk-2'
+    assert 'stream' not in data
+
+
+def test_google_streams_on_its_own_method():
+    """Test that Gemini streaming uses streamGenerateContent with SSE"""
+    url, _, _ = get_adapter('google').build_request('k', 'gemini-pro', 'Olá', stream=True)
+    assert url.endswith('/gemini-pro:streamGenerateContent?alt=sse&key=k')
+
+
+def test_registry_and_capabilities():
+    """Test lookups, generic fallback caching and declared capabilities"""
+    assert get_adapter('deepseek') is get_adapter('deepseek')
+    assert get_adapter('deepseek').url == "https://api.deepseek.com/v1/chat/completions"
+    assert GenericProvider(provider='deepseek').adapter is ADAPTERS['deepseek']
+
+    assert get_adapter('anthropic').supports(PROMPT_CACHING)
+    assert all(adapter.supports(STREAMING) for adapter in ADAPTERS.values())
+    assert LLM_SERVICES is LLM_PROVIDERS
+
+
+def test_stable_prefix_is_marked():
+    """Test that the template's fixed head is sent first and marked for caching"""
+    template = "Instruções fixas.\n\n{message}\n\nHistórico: {conversation_history}"
+    assert template_prefix(template) == "Instruções fixas.\n\n"
+    assert template_prefix("{{literal}} {message}") == "{literal} "
+    message = template.format(message='Olá', conversation_history='[]')
+
+    _, _, data = get_adapter('anthropic').build_request(
+        'k', 'claude', message, cache_prefix=template_prefix(template))
+    prefix, suffix = data['messages'][0]['content']
+    assert prefix['cache_control'] == {'type': 'ephemeral'}
+    assert prefix['text'].endswith("Instruções fixas.\n\n")
+    assert 'cache_control' not in suffix
+    assert prefix['text'] + suffix['text'] == build_prompt(message)
+
+    # OpenAI caches prefixes on its own; calls sharing one get the same key
+    keys = {get_adapter('openai').build_request(
+        'k', 'gpt', template.format(message=m, conversation_history=''),
+        cache_prefix=template_prefix(template))[2]['prompt_cache_key'] for m in ('a', 'b')}
+    assert len(keys) == 1
+    assert 'prompt_cache_key' not in get_adapter('mistral').build_request('k', 'm', 'Olá')[2]
@@ -0,0 +1,174 @@
+import pytest
+import time
+from app.models.api_key import APIKey
+from app.services.llm.breaker import CircuitBreaker, circuit_breaker
+from app.services.llm.bulkhead import bulkhead
+from app.services.llm.engine import async_engine
+from app.services.llm.errors import BulkheadFullError, CircuitOpenError, LLMProviderError
+from app.services.llm.providers import OpenAIProvider
+from app.services import llm_service
+from app.utils.metrics import metrics
+from benchmarks.standin_server import StandInServer
+
+DOWN_URL = 'http://127.0.0.1:9/v1/chat/completions'
+
+
+@pytest.fixture
+def app_config():
+    """A small breaker threshold and short reset timeout"""
+    return {
+        'LLM_CACHE_ENABLED': False,
+        'LLM_BREAKER_FAILURE_THRESHOLD': 3,
+        'LLM_BREAKER_RESET_TIMEOUT': 0.2
+    }
+
+
+def test_breaker_opens_and_recovers(app):
+    """Test open -> fail fast -> half-open probe -> closed"""
+    provider = OpenAIProvider(api_key='test', api_key_id=1)
+    provider.url = DOWN_URL
+
+    for _ in range(3):
+        with pytest.raises(LLMProviderError):
+            async_engine.run(provider.get_response('Olá'))
+
+    with pytest.raises(CircuitOpenError) as excinfo:
+        async_engine.run(provider.get_response('Olá'))
+    assert excinfo.value.retry_after <= 0.2
+    assert metrics.counter('llm_breaker_transitions_total',
+                           breaker='openai', **{'from': 'closed', 'to': 'open'}) == 1
+
+    server = StandInServer().start()
+    try:
+        provider.url = server.url
+        time.sleep(0.25)
+        assert async_engine.run(provider.get_response('Olá')) == 'Amém.'
+    finally:
+        server.stop()
+
+    assert metrics.counter('llm_breaker_transitions_total',
+                           breaker='openai', **{'from': 'half_open', 'to': 'closed'}) == 1
+
+
+def test_key_errors_only_open_the_key_breaker(app):
+    """Test that a rejected API key does not open the provider's circuit"""
+    breaker = CircuitBreaker()
+    for _ in range(3):
+        ticket = breaker.before_call('openai', 7)
+        breaker.after_call(ticket, 'openai', 7,
+                           error=LLMProviderError('unauthorized', status_code=401))
+
+    with pytest.raises(CircuitOpenError) as excinfo:
+        breaker.before_call('openai', 7)
+    assert excinfo.value.breaker == 'openai:key:7'
+    breaker.before_call('openai', 8)
+
+    # Client errors are the caller's fault and never count
+    for _ in range(3):
+        ticket = breaker.before_call('google', 1)
+        breaker.after_call(ticket, 'google', 1,
+                           error=LLMProviderError('bad request', status_code=400))
+    breaker.before_call('google', 1)
+
+
+def test_send_message_returns_503_when_open(app, headers):
+    """Test that an open circuit is an immediate 503 with Retry-After"""
+    for _ in range(3):
+        ticket = circuit_breaker.before_call('openai')
+        circuit_breaker.after_call(ticket, 'openai', error=LLMProviderError('down'))
+
+    response = app.test_client().post('/api/chat/message', json={
+        'message': 'Olá',
+        'provider': 'openai',
+        'model': 'gpt-3.5-turbo'
+    }, headers=headers)
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+
+
+def test_legacy_and_stream_paths_use_the_key_breaker(app, headers, monkeypatch):
+    """Test that get_llm_response and the stream pre-check pass the key id"""
+    def rejected(provider, api_key, model, message):
+        raise LLMProviderError('unauthorized', status_code=401)
+
+    monkeypatch.setattr(llm_service, 'provider_chat', rejected)
+    for _ in range(3):
+        with pytest.raises(LLMProviderError):
+            llm_service.get_llm_response('openai', 'gpt', 'sk', 'Olá', api_key_id=7)
+
+    with pytest.raises(CircuitOpenError) as excinfo:
+        circuit_breaker.check('openai', 7)
+    assert excinfo.value.breaker == 'openai:key:7'
+    circuit_breaker.check('openai', 8)
+
+    api_key = APIKey.query.filter_by(provider='openai').first()
+    for _ in range(3):
+        ticket = circuit_breaker.before_call('openai', api_key.id)
+        circuit_breaker.after_call(ticket, 'openai', api_key.id,
+                                   error=LLMProviderError('unauthorized', status_code=401))
+
+    response = app.test_client().post('/api/chat/message/stream', json={
+        'message': 'Olá', 'provider': 'openai', 'model': 'gpt-3.5-turbo'
+    }, headers=headers)
+    assert response.status_code == 503
+
+
+def trip_to_half_open(provider):
+    """Open the provider's breaker, then let it go half-open"""
+    for _ in range(3):
+        ticket = circuit_breaker.before_call(provider)
+        circuit_breaker.after_call(ticket, provider, error=LLMProviderError('down'))
+    time.sleep(0.25)
+
+
+def test_abandoned_stream_reports_to_the_breaker(app):
+    """Test that a closed, cancelled or never started stream never keeps the probe slot"""
+    class Cancelled(BaseException):
+        pass
+
+    def cancelled():
+        raise Cancelled()
+
+    trip_to_half_open('openai')
+
+    # Never iterated: nothing is taken
+    llm_service._guarded_stream('openai', 'gpt', None, cancelled).close()
+
+    # Cancelled before the provider answered: the slot is free for the next probe
+    stream = llm_service._guarded_stream('openai', 'gpt', None, cancelled)
+    with pytest.raises(Cancelled):
+        next(stream)
+
+    # Client gone after the first token: the provider answered, so it closes
+    stream = llm_service._guarded_stream('openai', 'gpt', None, lambda: iter(['Amém', '.']))
+    assert next(stream) == 'Amém'
+    stream.close()
+    assert circuit_breaker.before_call('openai')['probes'] == []
+
+
+def test_refused_calls_free_the_probe(app, monkeypatch):
+    """Test that a probe refused a slot, or by the key breaker, is given back"""
+    trip_to_half_open('openai')
+    circuit_breaker._local.open('openai:key:7', 10)
+    with pytest.raises(CircuitOpenError) as excinfo:
+        circuit_breaker.before_call('openai', 7)
+    assert excinfo.value.breaker == 'openai:key:7'
+    # The provider probe taken before the key's breaker refused is free again
+    circuit_breaker.release(circuit_breaker.before_call('openai'))
+
+    app.config['LLM_CONCURRENCY_LIMITS'] = {'openai:gpt': 1}
+    app.config['LLM_CONCURRENCY_QUEUE_TIMEOUT'] = 0
+    monkeypatch.setattr(llm_service, 'provider_chat', lambda *args: 'Amém.')
+    with bulkhead.hold('openai', 'gpt'):
+        with pytest.raises(BulkheadFullError):
+            llm_service.get_llm_response('openai', 'gpt', 'sk', 'Olá')
+        with pytest.raises(BulkheadFullError):
+            next(llm_service._guarded_stream('openai', 'gpt', None, lambda: iter(['Amém.'])))
+
+        provider = OpenAIProvider(api_key='test')
+        with pytest.raises(BulkheadFullError):
+            async_engine.run(provider.get_response('Olá', model='gpt'))
+
+    assert llm_service.get_llm_response('openai', 'gpt', 'sk', 'Olá') == 'Amém.'
+    assert circuit_breaker.before_call('openai')['probes'] == []
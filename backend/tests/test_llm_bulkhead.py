@@ -0,0 +1,147 @@
+import pytest
+import asyncio
+import threading
+import time
+from app.services.llm.bulkhead import Bulkhead, bulkhead
+from app.services.llm.deadline import request_deadline
+from app.services.llm.engine import async_engine
+from app.services.llm.errors import BulkheadFullError
+from app.services.llm.providers import OpenAIProvider
+from app.utils.metrics import metrics
+
+
+class FakeRedis:
+    """Sorted-set semaphore with the semantics of the acquire script"""
+
+    def __init__(self):
+        self.leases = {}
+
+    def eval(self, script, numkeys, key, now, limit, expiry, token, px):
+        leases = self.leases.setdefault(key, {})
+        for stale in [t for t, score in leases.items() if score <= now]:
+            del leases[stale]
+        if len(leases) < limit:
+            leases[token] = expiry
+            return 1
+        return 0
+
+    def zrem(self, key, token):
+        self.leases.get(key, {}).pop(token, None)
+
+
+@pytest.fixture
+def app_config():
+    """A tight per-model limit"""
+    return {
+        'LLM_CACHE_ENABLED': False,
+        'LLM_SINGLEFLIGHT_ENABLED': False,
+        'LLM_CONCURRENCY_LIMITS': {'openai:gpt': 2},
+        'LLM_CONCURRENCY_QUEUE_TIMEOUT': 2
+    }
+
+
+@pytest.fixture
+def server_options():
+    return {'latency': 0.2}
+
+
+def test_calls_over_the_limit_queue(app, server):
+    """Test that only `limit` calls are in flight and the rest wait"""
+    provider = OpenAIProvider(api_key='test')
+    provider.url = server.url
+
+    async def burst():
+        return await asyncio.gather(*[
+            provider.get_response('Olá', model='gpt') for _ in range(6)
+        ])
+
+    start = time.perf_counter()
+    assert async_engine.run(burst()) == ['Amém.'] * 6
+    # Three waves of two calls
+    assert time.perf_counter() - start >= 0.55
+
+    timings = metrics.snapshot()['timings']
+    assert timings['llm_bulkhead_queue_wait_seconds{bulkhead=openai:gpt}']['count'] == 6
+    # Upstream latency excludes the time spent queued
+    assert timings['llm_upstream_latency_seconds{provider=openai}']['max'] < 0.4
+
+
+def test_queue_deadline(app, server):
+    """Test that a call fails once its queue deadline passes"""
+    app.config['LLM_CONCURRENCY_QUEUE_TIMEOUT'] = 0.1
+    provider = OpenAIProvider(api_key='test')
+    provider.url = server.url
+
+    async def burst():
+        return await asyncio.gather(*[
+            provider.get_response(f'Pergunta {i}', model='gpt') for i in range(3)
+        ], return_exceptions=True)
+
+    results = async_engine.run(burst())
+    assert results.count('Amém.') == 2
+    assert isinstance(results[2], BulkheadFullError)
+    assert metrics.counter('llm_bulkhead_rejected_total', bulkhead='openai:gpt') == 1
+
+
+def test_queue_wait_stops_at_request_deadline(app):
+    """Test that a queued call gives up when the request deadline passes"""
+    with bulkhead.hold('openai', 'gpt'), bulkhead.hold('openai', 'gpt'):
+        start = time.perf_counter()
+        with request_deadline(0.1):
+            with pytest.raises(BulkheadFullError) as error:
+                with bulkhead.hold('openai', 'gpt'):
+                    pass
+        # Well short of the 2s queue timeout
+        assert time.perf_counter() - start < 0.5
+    assert error.value.status_code == 503
+
+
+def test_cancelled_acquire_does_not_leak(app):
+    """Test that a slot granted after its caller was cancelled is given back"""
+    class SlowRedis(FakeRedis):
+        def __init__(self):
+            super().__init__()
+            self.started, self.proceed = threading.Event(), threading.Event()
+
+        def eval(self, *args):
+            self.started.set()
+            self.proceed.wait(5)
+            return super().eval(*args)
+
+    shared = SlowRedis()
+    worker = Bulkhead(redis_client=shared)
+
+    async def hold():
+        async with worker.acquire('openai', 'gpt'):
+            pass
+
+    async def cancel_while_acquiring():
+        task = asyncio.ensure_future(hold())
+        while not shared.started.is_set():
+            await asyncio.sleep(0.01)
+        task.cancel()
+        shared.proceed.set()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # The abandoned attempt finishes and its slot is released off the loop
+        await asyncio.sleep(0.2)
+
+    async_engine.run(cancel_while_acquiring())
+    assert shared.leases[Bulkhead.KEY_PREFIX + 'openai:gpt'] == {}
+    assert worker.in_flight('openai:gpt') == 0
+
+
+def test_expired_leases_are_reclaimed(app):
+    """Test that slots held by a crashed worker free up after their lease"""
+    shared = FakeRedis()
+    app.config['LLM_CONCURRENCY_QUEUE_TIMEOUT'] = 0.05
+    key = Bulkhead.KEY_PREFIX + 'openai:gpt'
+    shared.leases[key] = {'crashed': time.time() - 1, 'alive': time.time() + 60}
+
+    worker = Bulkhead(redis_client=shared)
+    with worker.hold('openai', 'gpt'):
+        assert 'crashed' not in shared.leases[key]
+        with pytest.raises(BulkheadFullError):
+            with Bulkhead(redis_client=shared).hold('openai', 'gpt'):
+                pass
+    assert list(shared.leases[key]) == ['alive']
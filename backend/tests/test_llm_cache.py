@@ -0,0 +1,80 @@
+import pytest
+from app.services.llm.cache import ResponseCache
+from app.services.llm.engine import async_engine
+from app.services.llm.providers import OpenAIProvider
+from app.utils.metrics import metrics
+
+
+class DictRedis:
+    """Minimal in-memory stand-in for the two Redis calls the cache uses"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def setex(self, key, ttl, value):
+        self.data[key] = value
+
+
+@pytest.fixture
+def app_config():
+    """A small local cache tier"""
+    return {'LLM_CACHE_MAX_ENTRIES': 2}
+
+
+def test_key_normalizes_prompt():
+    """Test that whitespace and case differences share a key"""
+    key = ResponseCache.make_key('openai', 'gpt', 'Como vencer a ansiedade?')
+
+    assert key == ResponseCache.make_key(
+        'OpenAI', 'gpt', '  como vencer   a ansiedade? ')
+    assert key != ResponseCache.make_key(
+        'openai', 'gpt-4', 'Como vencer a ansiedade?')
+    assert key != ResponseCache.make_key(
+        'openai', 'gpt', 'Como vencer a ansiedade?', template='{message}')
+
+
+def test_local_tier_is_bounded(app):
+    """Test that the least recently used entry is evicted"""
+    cache = ResponseCache()
+    cache.set('a', 'A', 0.1)
+    cache.set('b', 'B', 0.1)
+    cache.get('a')
+    cache.set('c', 'C', 0.1)
+
+    assert cache.get('a') == 'A'
+    assert cache.get('b') is None
+    assert cache.get('c') == 'C'
+
+
+def test_redis_tier_shared_between_workers(app):
+    """Test that a hit in Redis is served and promoted to the local tier"""
+    shared = DictRedis()
+    ResponseCache(redis_client=shared).set('k', 'Amém.', 1.5)
+    other_worker = ResponseCache(redis_client=shared)
+
+    assert other_worker.get('k') == 'Amém.'
+    assert metrics.counter('llm_cache_hits_total', tier='redis') == 1
+    assert metrics.counter('llm_cache_latency_saved_seconds_total') == 1.5
+
+    shared.data.clear()
+    assert other_worker.get('k') == 'Amém.'
+
+
+def test_provider_uses_cache_unless_regenerating(app, server):
+    """Test that repeated prompts skip the upstream call"""
+    provider = OpenAIProvider(api_key='test', cache=ResponseCache())
+    provider.url = server.url
+
+    for _ in range(3):
+        assert async_engine.run(
+            provider.get_response('Olá')) == 'Amém.'
+    assert server.stats['requests'] == 1
+
+    async_engine.run(provider.get_response(
+        'Olá', options={'regenerate': True}))
+    assert server.stats['requests'] == 2
+
+    assert metrics.snapshot()['gauges']['llm_cache_hit_ratio'] == 2 / 3
@@ -0,0 +1,38 @@
+from app.services.llm.clients import ProviderClientRegistry
+
+
+def test_one_session_per_provider():
+    """Test that each provider gets a single long-lived session"""
+    registry = ProviderClientRegistry()
+
+    assert registry.get_session('openai') is registry.get_session('openai')
+    assert registry.get_session('openai') is not registry.get_session(
+        'anthropic')
+    registry.close_all()
+
+
+def test_sessions_dropped_after_fork():
+    """Test that sessions inherited from a parent process are not reused"""
+    registry = ProviderClientRegistry()
+    session = registry.get_session('openai')
+
+    # Simulate running in a forked child
+    registry._pid = -1
+
+    assert registry.get_session('openai') is not session
+    registry.close_all()
+
+
+def test_connection_reuse(server):
+    """Test that repeated calls share one upstream connection"""
+    registry = ProviderClientRegistry()
+    session = registry.get_session('openai')
+
+    for _ in range(20):
+        response = session.post(server.url, json={'model': 'test'},
+                                timeout=registry.timeout)
+        assert response.status_code == 200
+
+    assert server.stats['requests'] == 20
+    assert server.stats['connections'] == 1
+    registry.close_all()
@@ -0,0 +1,39 @@
+import pytest
+import asyncio
+import time
+from app.services.llm.engine import async_engine
+from app.services.llm.providers import OpenAIProvider
+
+
+@pytest.fixture
+def server_options():
+    """Stand-in provider with artificial latency"""
+    return {'latency': 0.2}
+
+
+def test_async_get_response(app, server):
+    """Test that the async provider returns the parsed completion"""
+    provider = OpenAIProvider(api_key='test')
+    provider.url = server.url
+
+    assert async_engine.run(provider.get_response('Olá')) == 'Amém.'
+
+
+def test_concurrent_calls_share_engine(app, server):
+    """Test that in-flight calls overlap instead of queueing"""
+    provider = OpenAIProvider(api_key='test')
+    provider.url = server.url
+
+    async def burst():
+        return await asyncio.gather(*[
+            provider.get_response(f'Pergunta {i}') for i in range(50)
+        ])
+
+    start = time.perf_counter()
+    responses = async_engine.run(burst())
+    elapsed = time.perf_counter() - start
+
+    assert len(responses) == 50
+    assert server.stats['requests'] == 50
+    # 50 sequential calls would take 10 s
+    assert elapsed < 2
@@ -0,0 +1,112 @@
+import pytest
+import time
+from app.models.api_key import APIKey
+from app.models.message import Message
+from app.models.prompt_template import PromptTemplate
+from app.services.api_key_usage import api_key_usage
+from app.services.llm.engine import async_engine
+from app.services.llm.hedging import hedged_response
+from app.services.llm.providers import OpenAIProvider, MistralProvider
+from app.services.llm.summary import conversation_summarizer
+from benchmarks.standin_server import StandInServer
+
+
+@pytest.fixture
+def app_config():
+    """A short hedging delay and no response cache"""
+    return {
+        'LLM_CACHE_ENABLED': False,
+        'LLM_HEDGING_DEFAULT_DELAY': 0.1
+    }
+
+
+@pytest.fixture
+def api_keys():
+    return {'openai': 'sk-openai', 'mistral': 'sk-mistral'}
+
+
+@pytest.fixture
+def slow_server():
+    server = StandInServer(latency=1.0).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def fast_server():
+    server = StandInServer(latency=0.05).start()
+    yield server
+    server.stop()
+
+
+def test_slow_primary_is_hedged(app, slow_server, fast_server):
+    """Test that the secondary answers when the primary is slow"""
+    primary = OpenAIProvider(api_key='test')
+    primary.url = slow_server.url
+    secondary = MistralProvider(api_key='test')
+    secondary.url = fast_server.url
+
+    start = time.perf_counter()
+    response, index = async_engine.run(hedged_response(
+        [(primary, 'gpt'), (secondary, 'mistral-medium')], 'Olá'))
+
+    assert (response, index) == ('Amém.', 1)
+    assert time.perf_counter() - start < 0.8
+
+
+def test_failed_primary_fails_over(app, fast_server):
+    """Test that an error from the primary goes to the next provider"""
+    primary = OpenAIProvider(api_key='test')
+    primary.url = 'http://127.0.0.1:9/v1/chat/completions'
+    secondary = MistralProvider(api_key='test')
+    secondary.url = fast_server.url
+
+    response, index = async_engine.run(hedged_response(
+        [(primary, 'gpt'), (secondary, 'mistral-medium')], 'Olá'))
+
+    assert (response, index) == ('Amém.', 1)
+
+
+def test_send_message_records_served_provider(app, headers, slow_server, fast_server,
+                                              monkeypatch):
+    """Test that the hedged answer is saved with the provider that served it"""
+    monkeypatch.setattr(OpenAIProvider, 'url', slow_server.url)
+    monkeypatch.setattr(MistralProvider, 'url', fast_server.url)
+
+    response = app.test_client().post('/api/chat/message', json={
+        'message': 'Olá',
+        'provider': 'openai',
+        'model': 'gpt-3.5-turbo',
+        'hedge': True
+    }, headers=headers)
+
+    assert response.status_code == 200
+    bot_msg = Message.query.filter_by(sender='bot').one()
+    metadata = bot_msg.get_metadata()
+    assert metadata['provider'] == 'openai'
+    assert metadata['served_provider'] == 'mistral'
+    assert metadata['served_model'] == 'mistral-medium'
+    api_key_usage.flush()
+    assert APIKey.query.filter_by(provider='mistral').one().use_count == 1
+
+
+def test_summary_uses_the_chat_key_after_failover(app, user, headers, slow_server,
+                                                  fast_server, monkeypatch):
+    """Test that a hedged templated chat schedules its summary with its own key"""
+    monkeypatch.setattr(OpenAIProvider, 'url', slow_server.url)
+    monkeypatch.setattr(MistralProvider, 'url', fast_server.url)
+    scheduled = []
+    monkeypatch.setattr(conversation_summarizer, 'maybe_schedule',
+                        lambda *args: scheduled.append(args[1:]))
+    template = PromptTemplate(name='t', template='Responda: {message}',
+                              is_system=False, user_id=user.id)
+    template.save()
+
+    response = app.test_client().post('/api/chat/message', json={
+        'message': 'Olá', 'provider': 'openai', 'model': 'gpt-3.5-turbo',
+        'template_id': template.id, 'hedge': True
+    }, headers=headers)
+
+    assert response.status_code == 200
+    openai_key = APIKey.query.filter_by(provider='openai').one()
+    assert scheduled == [('openai', 'gpt-3.5-turbo', 'sk-openai', openai_key.id)]
@@ -0,0 +1,118 @@
+import pytest
+import requests
+import statistics
+import time
+from app.services.llm.engine import async_engine
+from app.services.llm.errors import LLMProviderError
+from app.services.llm.providers import LLM_PROVIDERS
+from app.services.llm_service import provider_chat, provider_chat_stream
+from app.utils.metrics import metrics
+from benchmarks.standin_server import StandInServer
+
+PROVIDERS = ['openai', 'anthropic', 'google', 'mistral']
+
+
+@pytest.fixture
+def server_options():
+    return {'seed': 1}
+
+
+@pytest.fixture
+def app_config(server):
+    """Every provider pointed at the stand-in"""
+    return {
+        'LLM_CACHE_ENABLED': False,
+        'LLM_BASE_URL': server.base_url
+    }
+
+
+@pytest.mark.parametrize('provider', PROVIDERS)
+def test_wire_formats(app, server, provider):
+    """Test each provider's request and response format over real HTTP"""
+    assert provider_chat(provider, 'key', 'model', 'Olá') == 'Amém.'
+    assert list(provider_chat_stream(provider, 'key', 'model', 'Olá')) == \
+        ['Deus ', 'é ', 'amor.']
+
+    service = LLM_PROVIDERS[provider](api_key='key')
+    assert async_engine.run(service.get_response('Olá', model='model')) == 'Amém.'
+    assert server.stats['requests'] == 3
+
+
+def test_per_provider_base_url(app, server):
+    """Test that a per-provider override wins over LLM_BASE_URL"""
+    app.config['LLM_BASE_URL'] = 'http://127.0.0.1:9'
+    app.config['LLM_PROVIDER_BASE_URLS'] = {'anthropic': server.base_url}
+
+    assert provider_chat('anthropic', 'key', 'model', 'Olá') == 'Amém.'
+    with pytest.raises(LLMProviderError):
+        provider_chat('openai', 'key', 'model', 'Olá')
+
+
+def test_injected_rate_limits(app):
+    """Test the random 429 rate and its Retry-After"""
+    server = StandInServer(rate_limit_rate=0.5, retry_after=2, seed=7).start()
+    app.config['LLM_BASE_URL'] = server.base_url
+    statuses = []
+    for _ in range(40):
+        try:
+            provider_chat('openai', 'key', 'model', 'Olá')
+            statuses.append(200)
+        except LLMProviderError as e:
+            assert e.retry_after == 2
+            statuses.append(e.status_code)
+    server.stop()
+
+    assert set(statuses) == {200, 429}
+    assert server.stats['rate_limited'] == statuses.count(429)
+
+
+def test_latency_distribution():
+    """Test that sampled latency follows the configured p50 and p99"""
+    server = StandInServer(latency_p50=0.1, latency_p99=0.5, seed=3)
+    samples = sorted(server.sample_latency() for _ in range(5000))
+    server.server_close()
+
+    assert statistics.median(samples) == pytest.approx(0.1, rel=0.1)
+    assert samples[int(len(samples) * 0.99)] == pytest.approx(0.5, rel=0.2)
+
+
+def test_token_rate(app):
+    """Test that streamed tokens are paced at the token rate"""
+    server = StandInServer(token_rate=30).start()
+    app.config['LLM_BASE_URL'] = server.base_url
+
+    start = time.perf_counter()
+    tokens = list(provider_chat_stream('anthropic', 'key', 'model', 'Olá'))
+    server.stop()
+
+    assert len(tokens) == 3
+    assert time.perf_counter() - start >= 0.09
+
+
+@pytest.mark.parametrize('provider', ['openai', 'anthropic', 'google'])
+def test_cached_prompt_tokens_per_template(app, server, provider):
+    """Test that repeated template prefixes are reported as cached, per template"""
+    metrics.reset()
+    template = 'Você é um conselheiro cristão. ' * 20 + '\n\n{message}'
+    service = LLM_PROVIDERS[provider](api_key='key')
+    labels = {'provider': provider, 'template': '7'}
+
+    for message in ('Olá', 'Paz'):
+        async_engine.run(service.get_response(template.format(message=message), 'model', {
+            'template': template, 'template_id': 7}))
+        if message == 'Olá':
+            assert metrics.counter('llm_prompt_cached_tokens_total', **labels) == 0
+
+    assert metrics.counter('llm_prompt_cached_tokens_total', **labels) >= 150
+    assert metrics.counter('llm_prompt_tokens_total', **labels) > \
+        metrics.counter('llm_prompt_cached_tokens_total', **labels)
+
+
+def test_malformed_cache_markers_are_rejected(app, server):
+    """Test that the stand-in checks Anthropic cache_control markers"""
+    service = LLM_PROVIDERS['anthropic'](api_key='key')
+    url, headers, data = service.build_request('Olá', 'claude', {'template': 'Fixo {message}'})
+    data['messages'][0]['content'][0]['cache_control'] = {'type': 'forever'}
+
+    response = requests.post(url, headers=headers, json=data)
+    assert response.status_code == 400
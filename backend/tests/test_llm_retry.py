@@ -0,0 +1,80 @@
+import pytest
+import time
+from app.services.llm.deadline import request_deadline
+from app.services.llm.engine import async_engine
+from app.services.llm.errors import LLMProviderError, parse_retry_after
+from app.services.llm.providers import OpenAIProvider
+from app.services.llm.retry import RetryBudget
+from app.utils.metrics import metrics
+
+
+@pytest.fixture
+def app_config():
+    """Fast backoff and no caching in the way"""
+    return {
+        'LLM_CACHE_ENABLED': False,
+        'LLM_RETRY_BASE_DELAY': 0.01
+    }
+
+
+@pytest.fixture
+def provider(server):
+    provider = OpenAIProvider(api_key='test')
+    provider.url = server.url
+    provider.server = server
+    return provider
+
+
+def test_retry_after_is_honoured(app, provider):
+    """Test that 429s are retried no sooner than Retry-After"""
+    provider.server.inject(status=429, retry_after=0.2, count=2)
+
+    start = time.perf_counter()
+    assert async_engine.run(provider.get_response('Olá')) == 'Amém.'
+
+    assert time.perf_counter() - start >= 0.4
+    assert provider.server.stats['requests'] == 3
+    assert metrics.counter('llm_retries_total', provider='openai', status=429) == 2
+
+
+def test_retry_never_waits_past_the_deadline(app, provider):
+    """Test that a Retry-After beyond the deadline fails fast"""
+    provider.server.inject(status=503, retry_after=5)
+
+    start = time.perf_counter()
+    with request_deadline(1):
+        with pytest.raises(LLMProviderError) as excinfo:
+            async_engine.run(provider.get_response('Olá'))
+
+    assert excinfo.value.status_code == 503
+    assert time.perf_counter() - start < 1
+    assert metrics.counter('llm_retry_giveups_total',
+                           provider='openai', reason='deadline') == 1
+
+
+def test_latency_spike_is_cut_at_the_deadline(app, provider):
+    """Test that a stalled upstream call is abandoned at the deadline"""
+    provider.server.inject(latency=2)
+
+    start = time.perf_counter()
+    with request_deadline(0.3):
+        with pytest.raises(LLMProviderError):
+            async_engine.run(provider.get_response('Olá'))
+    assert time.perf_counter() - start < 1
+
+
+def test_retry_budget_caps_retries():
+    """Test that retries are limited to a fraction of calls"""
+    budget = RetryBudget()
+    for _ in range(20):
+        budget.record_call()
+
+    spent = [budget.try_spend(ratio=0.1, min_retries=0) for _ in range(5)]
+    assert spent == [True, True, False, False, False]
+
+
+def test_parse_retry_after():
+    """Test both Retry-After formats"""
+    assert parse_retry_after('2') == 2
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0
+    assert parse_retry_after(None) is None
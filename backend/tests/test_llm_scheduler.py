@@ -0,0 +1,146 @@
+import asyncio
+import pytest
+import threading
+import time
+from app.services.llm.engine import async_engine
+from app.services.llm.errors import SchedulerBusyError
+from app.services.llm.providers import OpenAIProvider
+from app.services.llm.scheduler import BACKGROUND, INTERACTIVE, llm_scheduler
+from app.utils.metrics import metrics
+
+
+@pytest.fixture
+def app_config():
+    """A small scheduler: 4 slots, 2 reserved for interactive calls"""
+    return {
+        'LLM_CACHE_ENABLED': False,
+        'LLM_SCHEDULER_ENABLED': True,
+        'LLM_SCHEDULER_CAPACITY': 4,
+        'LLM_SCHEDULER_LIMITS': {'interactive': 0, 'background': 0},
+        'LLM_SCHEDULER_INTERACTIVE_RESERVE': 2,
+        'LLM_SCHEDULER_STARVATION_AGE': 10,
+        'LLM_SCHEDULER_QUEUE_TIMEOUTS': {'interactive': 2, 'background': 2}
+    }
+
+
+@pytest.fixture
+def server_options():
+    return {'latency': 0.2}
+
+
+def hold_in_thread(app, priority, order, release):
+    """Take a slot in a new thread, record it in `order`, keep it until `release`"""
+    def run():
+        with app.app_context():
+            with llm_scheduler.hold(priority):
+                order.append(priority)
+                release.wait(5)
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_background_leaves_the_reserve(app):
+    """Test that background calls stop at the interactive reserve"""
+    order = []
+    release = threading.Event()
+    threads = [hold_in_thread(app, BACKGROUND, order, release) for _ in range(3)]
+    wait_for(lambda: llm_scheduler.stats()[BACKGROUND]['queued'] == 1)
+    assert order == [BACKGROUND, BACKGROUND]
+
+    # The reserved slots are still free for live chat
+    with llm_scheduler.hold(INTERACTIVE):
+        assert llm_scheduler.stats()[INTERACTIVE]['in_flight'] == 1
+
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert order == [BACKGROUND] * 3
+    assert metrics.snapshot()['gauges']['llm_scheduler_queue_depth{priority=background}'] == 0
+
+
+def test_interactive_is_served_first(app):
+    """Test that a freed slot goes to the queued interactive call"""
+    app.config['LLM_SCHEDULER_INTERACTIVE_RESERVE'] = 0
+    order = []
+    holds = [threading.Event() for _ in range(4)]
+    holders = [hold_in_thread(app, INTERACTIVE, order, hold) for hold in holds]
+    wait_for(lambda: len(order) == 4)
+
+    release = threading.Event()
+    waiters = [hold_in_thread(app, BACKGROUND, order, release)]
+    wait_for(lambda: llm_scheduler.stats()[BACKGROUND]['queued'] == 1)
+    waiters.append(hold_in_thread(app, INTERACTIVE, order, release))
+    wait_for(lambda: llm_scheduler.stats()[INTERACTIVE]['queued'] == 1)
+
+    holds[0].set()
+    wait_for(lambda: len(order) == 5)
+    assert order[4] == INTERACTIVE
+    assert llm_scheduler.stats()[BACKGROUND]['queued'] == 1
+
+    for hold in holds:
+        hold.set()
+    release.set()
+    for thread in holders + waiters:
+        thread.join()
+    assert order[5:] == [BACKGROUND]
+
+
+def test_starved_background_is_promoted(app):
+    """Test that a background call queued past the starvation age takes the reserve"""
+    app.config['LLM_SCHEDULER_STARVATION_AGE'] = 0.2
+    order = []
+    release = threading.Event()
+    holders = [hold_in_thread(app, INTERACTIVE, order, release) for _ in range(2)]
+    wait_for(lambda: len(order) == 2)
+
+    start = time.monotonic()
+    with llm_scheduler.hold(BACKGROUND):
+        waited = time.monotonic() - start
+    release.set()
+    for thread in holders:
+        thread.join()
+
+    assert 0.15 < waited < 1.0
+    assert metrics.counter('llm_scheduler_promoted_total') == 1
+
+
+def test_queue_timeout(app):
+    """Test that a call queued past its class timeout fails fast"""
+    app.config['LLM_SCHEDULER_LIMITS'] = {'background': 1}
+    app.config['LLM_SCHEDULER_QUEUE_TIMEOUTS'] = {'background': 0.1}
+    with llm_scheduler.hold(BACKGROUND):
+        with pytest.raises(SchedulerBusyError):
+            with llm_scheduler.hold(BACKGROUND):
+                pass
+    assert metrics.counter('llm_scheduler_rejected_total', priority=BACKGROUND) == 1
+    assert llm_scheduler.stats()[BACKGROUND] == {'queued': 0, 'in_flight': 0, 'oldest_wait': 0.0}
+
+
+def test_background_flood_does_not_delay_chat(app, server):
+    """Test that live chat answers in one upstream latency under a background flood"""
+    service = OpenAIProvider(api_key='test')
+    service.url = server.url
+
+    async def flood():
+        return await asyncio.gather(*(
+            service.get_response(f'resumo {i}', 'gpt', {'priority': BACKGROUND})
+            for i in range(10)))
+
+    background = async_engine.submit(flood())
+    wait_for(lambda: llm_scheduler.stats()[BACKGROUND]['queued'] > 0)
+
+    start = time.monotonic()
+    assert async_engine.run(service.get_response('Olá', 'gpt')) == 'Amém.'
+    assert time.monotonic() - start < 0.35
+
+    assert background.result(5) == ['Amém.'] * 10
+    timings = metrics.snapshot()['timings']
+    assert timings['llm_scheduler_wait_seconds{priority=interactive}']['max'] < 0.05
+    assert timings['llm_scheduler_wait_seconds{priority=background}']['max'] >= 0.2
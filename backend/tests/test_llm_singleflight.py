@@ -0,0 +1,148 @@
+import pytest
+import asyncio
+import json
+import threading
+import redis
+from app.services.llm.engine import async_engine
+from app.services.llm.providers import OpenAIProvider
+from app.services.llm.singleflight import SingleFlight
+from app.utils.metrics import metrics
+
+
+class FakeRedis:
+    """In-memory stand-in for the Redis calls the coalescer makes"""
+
+    def __init__(self):
+        self.data = {}
+
+    def set(self, key, value, nx=False, px=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def exists(self, key):
+        return int(key in self.data)
+
+    def setex(self, key, ttl, value):
+        self.data[key] = value
+
+    def publish(self, channel, value):
+        return 0
+
+    def eval(self, script, numkeys, key, token):
+        if self.data.get(key) == token:
+            del self.data[key]
+
+    def pubsub(self, **kwargs):
+        raise redis.exceptions.ConnectionError('no pubsub in tests')
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    """Queue calls and run them against the FakeRedis on execute()"""
+
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+        return lambda *args, **kwargs: self.calls.append((method, args, kwargs))
+
+    def execute(self):
+        return [method(*args, **kwargs) for method, args, kwargs in self.calls]
+
+
+@pytest.fixture
+def app_config():
+    """Short single-flight timeouts"""
+    return {
+        'LLM_CACHE_ENABLED': False,
+        'LLM_SINGLEFLIGHT_TIMEOUT': 0.5,
+        'LLM_SINGLEFLIGHT_POLL_INTERVAL': 0.05
+    }
+
+
+@pytest.fixture
+def server_options():
+    return {'latency': 0.2}
+
+
+def test_identical_prompts_share_one_call(app, server):
+    """Test that a burst of identical prompts makes one upstream call"""
+    provider = OpenAIProvider(api_key='test')
+    provider.url = server.url
+
+    async def burst():
+        return await asyncio.gather(*[
+            provider.get_response('Como vencer a ansiedade?') for _ in range(20)
+        ])
+
+    assert async_engine.run(burst()) == ['Amém.'] * 20
+    assert server.stats['requests'] == 1
+    assert metrics.counter(
+        'llm_singleflight_coalesced_total', scope='local') == 19
+
+
+def test_hung_leader_does_not_stall_followers(app):
+    """Test that followers make their own call after the timeout"""
+    flight = SingleFlight()
+
+    async def hung():
+        await asyncio.sleep(5)
+        return 'leader'
+
+    async def fast():
+        return 'follower'
+
+    async def race():
+        leader = asyncio.ensure_future(flight.do('k', hung))
+        await asyncio.sleep(0)
+        try:
+            return await flight.do('k', fast)
+        finally:
+            leader.cancel()
+
+    assert async_engine.run(race(), timeout=2) == 'follower'
+    assert metrics.counter(
+        'llm_singleflight_timeouts_total', scope='local') == 1
+
+
+def test_follower_in_other_worker_gets_published_result(app):
+    """Test that a worker waits for the lock holder's result in Redis"""
+    shared = FakeRedis()
+    flight = SingleFlight(redis_client=shared)
+    # Another worker is the leader for this key
+    shared.set(flight.KEY_PREFIX + 'lock:k', 'other-worker')
+
+    def leader_finishes():
+        shared.setex(flight.KEY_PREFIX + 'result:k', 10,
+                     json.dumps({'ok': True, 'response': 'Amém.'}))
+        del shared.data[flight.KEY_PREFIX + 'lock:k']
+    threading.Timer(0.1, leader_finishes).start()
+
+    async def upstream():
+        raise AssertionError('follower must not call upstream')
+
+    assert async_engine.run(flight.do('k', upstream), timeout=2) == 'Amém.'
+    assert metrics.counter(
+        'llm_singleflight_coalesced_total', scope='redis') == 1
+
+
+def test_follower_calls_upstream_when_leader_fails(app):
+    """Test that a failed remote leader does not fail its followers"""
+    shared = FakeRedis()
+    flight = SingleFlight(redis_client=shared)
+    shared.set(flight.KEY_PREFIX + 'lock:k', 'other-worker')
+    threading.Timer(0.1, shared.data.clear).start()
+
+    async def upstream():
+        return 'own call'
+
+    assert async_engine.run(flight.do('k', upstream), timeout=2) == 'own call'
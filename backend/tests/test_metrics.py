@@ -0,0 +1,22 @@
+import pytest
+from app.utils.metrics import metrics
+
+
+@pytest.fixture
+def app_config():
+    return {'METRICS_TOKEN': 'scrape-token'}
+
+
+def test_metrics_require_the_token(app):
+    """Test that /metrics answers only scrapers holding METRICS_TOKEN"""
+    metrics.incr('llm_cache_hits_total', tier='local')
+    client = app.test_client()
+
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    response = client.get('/metrics', headers={'Authorization': 'Bearer scrape-token'})
+    assert response.status_code == 200
+    assert response.json['counters']['llm_cache_hits_total{tier=local}'] == 1
+
+    app.config['METRICS_TOKEN'] = None
+    assert client.get('/metrics', headers={'Authorization': 'Bearer None'}).status_code == 404
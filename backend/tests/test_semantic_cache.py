@@ -0,0 +1,128 @@
+import pytest
+from app.models.database import db
+from app.models.user import User
+from app.models.conversation import Conversation
+from app.models.message import Message
+from app.services.llm.semantic_cache import (
+    HashedNgramVectorizer, SemanticCache, SemanticIndex)
+
+
+@pytest.fixture
+def app_config():
+    """The semantic cache enabled"""
+    return {'LLM_SEMANTIC_CACHE_ENABLED': True}
+
+
+def test_paraphrases_are_close():
+    """Test that paraphrases score above unrelated questions"""
+    vectorizer = HashedNgramVectorizer()
+    question = vectorizer.transform('O que a Bíblia diz sobre o perdão?')
+
+    paraphrase = vectorizer.transform('o que a biblia fala sobre perdao')
+    other = vectorizer.transform('o que a bíblia diz sobre o casamento?')
+
+    assert question @ paraphrase > 0.9
+    assert question @ other < 0.6
+
+
+def test_index_grows_and_finds_nearest():
+    """Test that the index keeps every entry across growth"""
+    vectorizer = HashedNgramVectorizer(dim=64)
+    index = SemanticIndex(64, capacity=2)
+    prompts = ['como orar melhor', 'como vencer o medo',
+               'estou triste', 'como lidar com o luto']
+    for message_id, prompt in enumerate(prompts, start=1):
+        index.add(vectorizer.transform(prompt), message_id)
+
+    assert index.size == 4
+    score, message_id = index.nearest(vectorizer.transform('como lidar com luto'))
+    assert message_id == 4
+    assert score > 0.9
+
+
+def _chat(user, pairs, **meta):
+    """Save user/bot message pairs in a new conversation of the user"""
+    conversation = Conversation(user_id=user.id, title='teste')
+    conversation.save()
+    bot_ids = []
+    for prompt, answer in pairs:
+        db.session.add(Message(conversation.id, prompt, 'user'))
+        bot = Message(conversation.id, answer, 'bot', metadata=dict(
+            {'provider': 'openai', 'model': 'gpt'}, **meta))
+        db.session.add(bot)
+        db.session.flush()
+        bot_ids.append(bot.id)
+    db.session.commit()
+    return bot_ids
+
+
+def test_rebuild_indexes_plain_chats_only(user):
+    """Test that templated answers are not served from the cache"""
+    _chat(user, [('como vencer a ansiedade?', 'Entregue a Deus.')])
+    _chat(user, [('como orar melhor', 'Ore com o coração.')], template_id=3)
+    # A hedging fallback answered: indexed under the provider that served it
+    _chat(user, [('como vencer o medo?', 'Não temas.')],
+          served_provider='anthropic', served_model='claude')
+
+    cache = SemanticCache()
+    cache.rebuild()
+
+    message_id, score = cache.lookup(
+        'openai', 'gpt', 'Como posso vencer minha ansiedade', user.id)
+    assert Message.query.get(message_id).content == 'Entregue a Deus.'
+    assert cache.lookup('openai', 'gpt', 'como orar melhor', user.id) is None
+    assert cache.lookup('anthropic', 'gpt', 'como vencer a ansiedade?', user.id) is None
+    assert cache.lookup('openai', 'gpt', 'como vencer o medo?', user.id) is None
+    assert cache.lookup('anthropic', 'claude', 'como vencer o medo?', user.id)
+
+
+def test_answers_are_not_shared(app):
+    """Test that users are only served their own answers, and near misses miss"""
+    alice = User(email='alice@example.com', password='password123')
+    alice.save()
+    bob = User(email='bob@example.com', password='password123')
+    bob.save()
+    _chat(alice, [('meu pai morreu ontem, como lidar?', 'Sinto muito pelo seu pai.')])
+
+    cache = SemanticCache()
+    cache.rebuild()
+
+    assert cache.lookup('openai', 'gpt', 'meu pai morreu ontem, como lidar?', alice.id)
+    assert cache.lookup('openai', 'gpt', 'meu pai morreu ontem, como lidar?', bob.id) is None
+    # Same words but another person: below the default threshold
+    assert cache.lookup('openai', 'gpt', 'minha mãe morreu ontem, como lidar?', alice.id) is None
+
+
+def test_add_keeps_newest_within_cap(app):
+    """Test that add() evicts the oldest answers above the cap"""
+    app.config['LLM_SEMANTIC_CACHE_MAX_ENTRIES'] = 10
+    cache = SemanticCache()
+    prompts = [f'pergunta numero {i} sobre {word}' for i, word in
+               enumerate(['fé', 'amor', 'medo', 'luto', 'paz', 'graça'] * 3)]
+    for message_id, prompt in enumerate(prompts, start=1):
+        cache.add('openai', 'gpt', prompt, message_id, 1)
+
+    assert cache.size <= 10
+    assert cache.lookup('openai', 'gpt', prompts[-1], 1)[0] == len(prompts)
+    assert cache.lookup('openai', 'gpt', prompts[0], 1) is None
+
+
+def test_adds_during_rebuild_are_kept(user):
+    """Test that an answer indexed while the table is read survives the swap"""
+    _chat(user, [('como vencer a ansiedade?', 'Entregue a Deus.')])
+
+    cache = SemanticCache()
+    transform = cache.vectorizer.transform
+    added = []
+
+    def add_meanwhile(text):
+        if not added:
+            added.append(True)
+            cache.add('openai', 'gpt', 'como perdoar alguém?', 999, user.id)
+        return transform(text)
+
+    cache.vectorizer.transform = add_meanwhile
+    cache.rebuild()
+
+    assert cache.lookup('openai', 'gpt', 'como perdoar alguém?', user.id)[0] == 999
+    assert cache.lookup('openai', 'gpt', 'como vencer a ansiedade?', user.id)
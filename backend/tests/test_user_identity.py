@@ -0,0 +1,136 @@
+import pytest
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+from app.models.database import db
+from app.services import user_identity as identities
+from app.services.user_identity import UserIdentity, UserIdentityCache, user_identity
+
+
+class FakeRedis:
+    """String keys with MGET, INCR and the set-if-current script"""
+
+    def __init__(self):
+        self.values = {}
+
+    def mget(self, *keys):
+        return [self.values.get(key) for key in keys]
+
+    def eval(self, script, numkeys, key, generation_key, value, generation, ttl):
+        assert script == identities._SET_IF_CURRENT_SCRIPT
+        if self.values.get(generation_key, '') == generation:
+            self.values[key] = value
+            return 1
+        return 0
+
+    def pipeline(self):
+        return self
+
+    def incr(self, key):
+        self.values[key] = str(int(self.values.get(key, 0)) + 1)
+
+    def expire(self, key, ttl):
+        pass
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+    def execute(self):
+        pass
+
+
+@pytest.fixture
+def queries(app):
+    """Count the statements sent to the database"""
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', count)
+    yield statements
+    event.remove(db.engine, 'before_cursor_execute', count)
+
+
+def test_lookup_is_cached(app, user, queries):
+    """Test that authenticated requests check the user without a query each"""
+    headers = {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+    client = app.test_client()
+    del queries[:]
+    assert client.get('/api/conversations/', headers=headers).status_code == 200
+    first = len(queries)
+    assert client.get('/api/conversations/', headers=headers).status_code == 200
+    assert len(queries) - first == first - 1
+    assert not any('FROM users' in statement for statement in queries[first:])
+
+    assert user_identity.get(user.id) == UserIdentity(user.id, True, False)
+    # Unknown ids are cached too
+    assert user_identity.get(999) is None
+    count = len(queries)
+    assert user_identity.get(999) is None
+    assert len(queries) == count
+
+
+def test_commits_invalidate(app, user):
+    """Test that updates, deactivation and deletion are seen at once"""
+    user_identity.get(user.id)
+    user.is_admin = True
+    db.session.commit()
+    assert user_identity.get(user.id).is_admin
+
+    # Rolled back changes keep the cached identity
+    user.is_active = False
+    db.session.flush()
+    db.session.rollback()
+    assert user_identity.active(user.id)
+
+    user.is_active = False
+    db.session.commit()
+    assert user_identity.get(user.id) == UserIdentity(user.id, False, True)
+    assert user_identity.active(user.id) is None
+
+    user_id = user.id
+    user.delete()
+    assert user_identity.get(user_id) is None
+
+
+def test_inactive_and_admin_checks(app, user):
+    """Test that inactive users are refused and system templates need an admin"""
+    headers = {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+    client = app.test_client()
+    template = {'name': 'Oração', 'template': 'Ore por {tema}'}
+    assert client.post('/api/prompts/system', json=template,
+                       headers=headers).status_code == 403
+
+    user.is_admin = True
+    db.session.commit()
+    assert client.post('/api/prompts/system', json=template,
+                       headers=headers).status_code != 403
+
+    user.is_active = False
+    db.session.commit()
+    assert client.get('/api/conversations/', headers=headers).status_code == 404
+    assert client.post('/api/prompts/system', json=template,
+                       headers=headers).status_code == 403
+
+
+def test_invalidation_during_a_load_is_not_overwritten(app, user):
+    """Test that a row loaded before a deactivation is not cached after it"""
+    shared = FakeRedis()
+    cache = UserIdentityCache(redis_client=shared)
+    load = cache._load
+
+    def deactivated_meanwhile(user_id):
+        identity = load(user_id)
+        # The deactivation commits (and invalidates) before the lookup stores
+        user.is_active = False
+        db.session.commit()
+        cache.invalidate(user_id)
+        return identity
+
+    cache._load = deactivated_meanwhile
+    assert cache.get(user.id).is_active
+    assert f'user_identity:{user.id}' not in shared.values
+
+    cache._load = load
+    assert cache.active(user.id) is None
+    assert UserIdentityCache(redis_client=shared).active(user.id) is None
@@ -30,6 +30,7 @@ import axios from '../services/axios';
 import LLMSelector from './LLMSelector';
 import ConversationList from './ConversationList';
 import conversationService from '../services/conversationService';
+import chatService from '../services/chatService';
 import PromptTemplateManager from './PromptTemplateManager';
 
 const Chat = () => {
@@ -141,34 +142,51 @@ const Chat = () => {
     setLoading(true);
     
     try {
-      // Call chat API with selected provider and model
-      const response = await axios.post('/api/chat/message', 
+      // Stream the reply from the chat API with selected provider and model
+      const botMessage = {
+        text: '',
+        sender: 'bot',
+        timestamp: new Date().toISOString(),
+        provider,
+        model
+      };
+      setConversation(prev => [...prev, botMessage]);
+
+      await chatService.streamMessage(
         { 
           message: userMessage.text,
           provider,
           model,
           conversation_id: currentConversationId,
           template_id: selectedTemplate ? selectedTemplate.id : null
+        },
+        {
+          onStart: (data) => {
+            // If this is a new conversation, set the conversation ID
+            if (!currentConversationId && data.conversation_id) {
+              setCurrentConversationId(data.conversation_id);
+            }
+          },
+          onToken: (token) => {
+            // Append each token to the bot message as it arrives
+            setLoading(false);
+            setConversation(prev => {
+              const updated = [...prev];
+              const last = updated[updated.length - 1];
+              updated[updated.length - 1] = { ...last, text: last.text + token };
+              return updated;
+            });
+          }
         }
       );
-      
-      // If this is a new conversation, set the conversation ID
-      if (!currentConversationId && response.data.conversation_id) {
-        setCurrentConversationId(response.data.conversation_id);
-      }
-      
-      // Add bot response to conversation
-      const botMessage = {
-        text: response.data.response,
-        sender: 'bot',
-        timestamp: new Date().toISOString(),
-        provider,
-        model
-      };
-      
-      setConversation(prev => [...prev, botMessage]);
     } catch (err) {
       console.error('Error sending message:', err);
+
+      // Drop the bot placeholder if nothing was streamed into it
+      setConversation(prev => {
+        const last = prev[prev.length - 1];
+        return last && last.sender === 'bot' && !last.text ? prev.slice(0, -1) : prev;
+      });
       
       // Show appropriate error message
       if (err.response?.status === 403) {
@@ -10,6 +10,12 @@ const axiosInstance = axios.create({
   withCredentials: true
 });
 
+const newIdempotencyKey = () => (
+  window.crypto && window.crypto.randomUUID
+    ? window.crypto.randomUUID()
+    : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`
+);
+
 // Interceptor para adicionar token de autenticação às requisições
 axiosInstance.interceptors.request.use(
   config => {
@@ -20,6 +26,12 @@ axiosInstance.interceptors.request.use(
     } else {
       console.log('No token available for request:', config.url);
     }
+    // Uma chave por escrita: se a requisição for refeita (timeout, token
+    // renovado), o backend devolve a resposta da primeira em vez de repetir
+    const method = (config.method || 'get').toLowerCase();
+    if (['post', 'put', 'patch', 'delete'].includes(method) && !config.headers['Idempotency-Key']) {
+      config.headers['Idempotency-Key'] = newIdempotencyKey();
+    }
     return config;
   },
   error => {
@@ -0,0 +1,66 @@
+/**
+ * Serviço para o chat com streaming (Server-Sent Events)
+ */
+const chatService = {
+  /**
+   * Enviar uma mensagem e receber a resposta token a token
+   * @param {object} payload - Mensagem, provedor, modelo, conversa e template
+   * @param {object} handlers - Callbacks onStart, onToken e onDone
+   * @returns {Promise} - Promise resolvida quando o streaming termina
+   */
+  streamMessage: async (payload, { onStart, onToken, onDone } = {}) => {
+    const token = localStorage.getItem('accessToken');
+    const response = await fetch('/api/chat/message/stream', {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        'Accept': 'text/event-stream',
+        ...(token ? { Authorization: `Bearer ${token}` } : {})
+      },
+      credentials: 'include',
+      body: JSON.stringify(payload)
+    });
+
+    if (!response.ok) {
+      const error = new Error(`Request failed with status ${response.status}`);
+      error.response = { status: response.status };
+      throw error;
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    const handleEvent = (block) => {
+      let event = 'message';
+      let data = '';
+      block.split('\n').forEach(line => {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        if (line.startsWith('data:')) data += line.slice(5).trim();
+      });
+      if (!data) return;
+
+      const parsed = JSON.parse(data);
+      if (event === 'start' && onStart) onStart(parsed);
+      if (event === 'token' && onToken) onToken(parsed.token);
+      if (event === 'done' && onDone) onDone(parsed);
+      if (event === 'error') throw new Error(parsed.error);
+    };
+
+    // eslint-disable-next-line no-constant-condition
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+
+      buffer += decoder.decode(value, { stream: true });
+      let separator = buffer.indexOf('\n\n');
+      while (separator !== -1) {
+        handleEvent(buffer.slice(0, separator));
+        buffer = buffer.slice(separator + 2);
+        separator = buffer.indexOf('\n\n');
+      }
+    }
+  }
+};
+
+export default chatService;